@@ -1,9 +1,27 @@
 from motif_generation_tool.key_payload_builder import KeyPayloadBuilder
 from motif_generation_tool.constraints.constraints import Constraints
 from motif_generation_tool.hyperparameters.hyperparameters import Hyperparameters
-import re
+from motif_generation_tool.result_cache import get_cache_key
+from motif_generation_tool.generation_stats import GenerationStats
+import asyncio
 
-async def generate_keys_and_payloads(constraints, with_constraints):
+# Opt-in cache of seeded generations, see set_result_cache
+result_cache = None
+
+def set_result_cache(cache):
+    # `cache` is an LRUResultCache, a SQLiteResultCache, or None to turn caching off
+    global result_cache
+    result_cache = cache
+
+# Opt-in statistics of the generations, see set_generation_stats
+generation_stats = None
+
+def set_generation_stats(stats):
+    # `stats` is a GenerationStats, or None to turn instrumentation off
+    global generation_stats
+    generation_stats = stats
+
+def get_constraints(constraints):
     # Get user input
     key_size = constraints['keySize']
     payload_size = constraints['payloadSize']
@@ -17,31 +35,151 @@ async def generate_keys_and_payloads(constraints, with_constraints):
                 else constraints['gcContentMinPercentage']
     max_gc = 65 if not 'gcContentMaxPercentage' in constraints \
                 else constraints['gcContentMaxPercentage']
-    
+
     # Verify input data is valid
     if max_hairpin <= 0 or max_hom <= 0 or loop_size_min > loop_size_max or loop_size_min < 0 or \
         payload_size <= 0 or key_size <= 0 or key_num <= 0 or payload_num <= 0 or min_gc > max_gc \
         or min_gc < 0 or max_gc > 100:
-        return "", "", "", False
+        return False
 
-    constraints = Constraints(payload_size=payload_size, payload_num=payload_num, \
-                             max_hom=max_hom, max_hairpin=max_hairpin, \
-                             loop_size_min=loop_size_min, loop_size_max=loop_size_max,\
-                             min_gc=min_gc, max_gc=max_gc, key_size=key_size, key_num=key_num)
+    return Constraints(payload_size=payload_size, payload_num=payload_num, \
+                       max_hom=max_hom, max_hairpin=max_hairpin, \
+                       loop_size_min=loop_size_min, loop_size_max=loop_size_max,\
+                       min_gc=min_gc, max_gc=max_gc, key_size=key_size, key_num=key_num)
 
+def get_hyperparameters():
     shapes = {'hom': 70, 'gcContent': 20, 'hairpin': 8, 'similarity': 50}
     weights = {'hom': 1, 'gcContent': 1, 'hairpin': 1, 'similarity': 1}
-    hyperparams = Hyperparameters(shapes, weights)
+    return Hyperparameters(shapes, weights)
+
+def get_result_cache_key(constraints, with_constraints, seed):
+    # Key of a generation in result_cache, None if it is not seeded or its constraints are
+    # invalid
+    constraints = get_constraints(constraints)
+    if not constraints or seed is None:
+        return None
+    return get_cache_key(constraints, get_hyperparameters(), with_constraints, seed)
+
+async def build_keys_and_payloads(constraints, with_constraints, seed=None, stats=None, \
+                                  use_cache=True):
+    constraints = get_constraints(constraints)
+    if not constraints:
+        return False, False, False
+
+    hyperparams = get_hyperparameters()
+
+    if stats is None:
+        stats = generation_stats
+    key_payload_builder = KeyPayloadBuilder(constraints, hyperparams, seed, stats)
+
+    # A seeded generation always builds the same keys and payloads, so it can be cached
+    cache_key = None
+    if use_cache and result_cache is not None and seed is not None:
+        cache_key = get_cache_key(constraints, hyperparams, with_constraints, seed)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return key_payload_builder, cached['keys'] or False, set(cached['payloads']) or False
 
-    generate_keys_and_payloads = KeyPayloadBuilder(constraints, hyperparams)
-    keys, payloads = await generate_keys_and_payloads.build_keys_and_payloads(with_constraints)
-    motifs = generate_keys_and_payloads.get_motifs(keys, payloads)
+    keys, payloads = await key_payload_builder.build_keys_and_payloads(with_constraints)
+    if cache_key is not None:
+        result_cache.put(cache_key, {'keys': list(keys) if keys else [], \
+                                     'payloads': sorted(payloads) if payloads else []})
+    return key_payload_builder, keys, payloads
+
+async def generate_keys_and_payloads(constraints, with_constraints, seed=None):
+    key_payload_builder, keys, payloads = await build_keys_and_payloads(constraints, \
+                                                                        with_constraints, seed)
     if not (keys and payloads):
         return "", "", "", False
+    # Sorted, so that a replayed or cached generation is displayed in the same order
+    payloads = sorted(payloads)
+    motifs = key_payload_builder.iter_motifs(keys, payloads)
     return format_data(keys), format_data(payloads), format_data(motifs), True
 
+async def generate_motif_set(constraints, with_constraints, seed=None, stats=None, \
+                             use_cache=True):
+    # Structured result, for the JSON API
+    key_payload_builder, keys, payloads = await build_keys_and_payloads(constraints, \
+                                                    with_constraints, seed, stats, use_cache)
+    if not (keys and payloads):
+        return {'keys': [], 'payloads': [], 'motifs': [], 'isValid': False}
+    payloads = sorted(payloads)
+    return {'keys': list(keys),
+            'payloads': payloads,
+            'motifs': list(key_payload_builder.iter_motifs(keys, payloads)),
+            'isValid': True
+            }
+
+def generate_motif_set_task(constraints, with_constraints, seed=None, record_stats=False):
+    # Entry point of the worker processes, which have no event loop of their own. Their
+    # statistics are sent back with the result, see collect_stats. Only a cache shared by
+    # all processes is used here. Otherwise the result is cached by the server once it is
+    # collected, see collect_result, as the worker's own copy of the cache is thrown away.
+    stats = GenerationStats() if record_stats else None
+    use_cache = result_cache is not None and result_cache.shared
+    motif_set = asyncio.run(generate_motif_set(constraints, with_constraints, seed, stats, \
+                                               use_cache))
+    if stats is not None:
+        motif_set['stats'] = stats.to_dict()
+    if not use_cache:
+        cache_key = get_result_cache_key(constraints, with_constraints, seed)
+        if cache_key is not None:
+            motif_set['cacheKey'] = cache_key
+    return motif_set
+
+def collect_stats(motif_set):
+    # Moves the statistics recorded by a worker process into generation_stats
+    stats = motif_set.pop('stats', None)
+    if stats is not None and generation_stats is not None:
+        generation_stats.merge_dict(stats)
+    return motif_set
+
+def collect_result(motif_set):
+    # Collects a result of generate_motif_set_task in the server process: its statistics,
+    # and the keys and payloads for result_cache if the worker could not cache them
+    motif_set = collect_stats(motif_set)
+    cache_key = motif_set.pop('cacheKey', None)
+    if cache_key is not None and result_cache is not None:
+        result_cache.put(cache_key, {'keys': motif_set['keys'], \
+                                     'payloads': motif_set['payloads']})
+    return motif_set
+
+def generate_motif_sets(specs, job_queue):
+    """This function generates a motif set for every spec of `specs` on the worker pool of
+    `job_queue`, within the limits it sets on pending jobs. Results are yielded as they
+    complete.
+
+    Parameters
+    ----------
+    specs: list of (dict, set of str, int or None)
+        Constraints, constraints to conform to and seed of every generation, as taken by
+        `generate_motif_set`.
+    job_queue: JobQueue
+        Queue of the server, running `generate_motif_set_task` and collecting the results
+        with `collect_result`.
+
+    Returns
+    ----------
+    results: generator of (int, dict)
+        Index of the spec, with its result in the format of `generate_motif_set`, and the
+        'error' of the generation if it failed.
+
+    Raises
+    ----------
+    QueueFullError
+        If the job queue has no place left for the batch.
+    """
+    results = job_queue.submit_batch([tuple(spec) + (generation_stats is not None,) \
+                                      for spec in specs])
+    return ((i, result if error is None else {'keys': [], 'payloads': [], 'motifs': [], \
+                                              'isValid': False, 'error': error}) \
+            for i, result, error in results)
+
+def format_motif_set(motif_set):
+    # Same output as generate_keys_and_payloads, for a result of generate_motif_set
+    return format_data(motif_set['keys']), format_data(motif_set['payloads']), \
+           format_data(motif_set['motifs']), motif_set['isValid']
+
 def format_data(data):
     # Reformat data to website style
-    data = str(data)
-    data = re.sub(r"[^ATCG ]+", "", data)
-    return data
+    return ' '.join(data)
@@ -1,72 +1,177 @@
-from flask import Flask, render_template, request, redirect, url_for, make_response
+from flask import Flask, render_template, request, redirect, url_for, make_response, Response, \
+                  jsonify
+from motif_generation_tool import motif_writer
+from motif_generation_tool.result_cache import LRUResultCache, SQLiteResultCache
+from motif_generation_tool.generation_stats import GenerationStats
+from job_queue import JobQueue, QueueFullError
+from preset_pool import PresetPool
 import analyse_input
 import asyncio
+import json
+import os
+import secrets
 
 app = Flask(__name__)
 
+# Generations submitted through /api/jobs run on a pool of JOB_WORKERS processes (one per
+# processor by default), with at most JOB_QUEUE_DEPTH of them waiting for a worker
+job_queue = JobQueue(analyse_input.generate_motif_set_task, \
+                     workers=int(os.environ.get('JOB_WORKERS', 0)) or None, \
+                     max_queued=int(os.environ.get('JOB_QUEUE_DEPTH', 16)), \
+                     on_result=analyse_input.collect_result)
+
+# If GENERATION_STATS is set, every generation records per-constraint timings and dead
+# ends, served by /metrics
+if os.environ.get('GENERATION_STATS'):
+    analyse_input.set_generation_stats(GenerationStats())
+
+# Seeded generations are cached if RESULT_CACHE_SIZE is set, in the memory of the server
+# process, or in the SQLite file RESULT_CACHE_PATH, which all server and worker processes
+# share
+result_cache_size = int(os.environ.get('RESULT_CACHE_SIZE', 0))
+if os.environ.get('RESULT_CACHE_PATH'):
+    analyse_input.set_result_cache(SQLiteResultCache(os.environ['RESULT_CACHE_PATH'], \
+                                                     result_cache_size or 10000))
+elif result_cache_size:
+    analyse_input.set_result_cache(LRUResultCache(result_cache_size))
+
+# Largest number of specs accepted by a single /api/generate request
+max_batch_size = int(os.environ.get('MAX_BATCH_SIZE', 1000))
+
+
+default_form = {'gcContentMinPercentage': 25, 
+                'gcContentMaxPercentage': 65, 
+                'maxHomopolymer': 5,
+                'maxHairpin': 1,
+                'loopMin': 6,
+                'loopMax': 7,
+                'payloadSize': 5, 
+                'payloadNum': 10,
+                'keySize': 2,
+                'keyNum': 2,
+                'homVisible': False,
+                'hairpinVisible': False,
+                'gcVisible': False,
+                }
+
+
+def read_form(request_form):
+    # Get data from the submitted form
+    gcContentMinPercentage = 25
+    gcContentMaxPercentage = 65
+    max_homopolymer = 1
+    maxHairpin = 1
+    loopMin = 6
+    loopMax = 7
+    payloadSize = int(request_form['payloadSize'])
+    payloadNum = int(request_form['payloadNum'])
+    keySize = int(request_form['keySize'])
+    keyNum = int(request_form['keyNum'])
+    constraints = set()
+    if request_form['homVisible'] == 'True':
+        constraints.add('hom')
+        max_homopolymer = int(request_form['maxHomopolymer'])
+    if request_form['hairpinVisible'] == 'True':
+        constraints.add('hairpin')
+        maxHairpin = int(request_form['maxHairpin'])
+        loopMin = int(request_form['loopMin'])
+        loopMax = int(request_form['loopMax'])
+    if request_form['gcVisible'] == 'True':
+        constraints.add('gcContent')
+        gcContentMinPercentage = float(request_form['gcContentMinPercentage'])
+        gcContentMaxPercentage = float(request_form['gcContentMaxPercentage'])
+
+    form = {'gcContentMinPercentage': gcContentMinPercentage, 
+            'gcContentMaxPercentage': gcContentMaxPercentage, 
+            'maxHomopolymer': max_homopolymer,
+            'maxHairpin': maxHairpin,
+            'loopMin': loopMin,
+            'loopMax': loopMax,
+            'payloadSize': payloadSize, 
+            'payloadNum': payloadNum,
+            'keySize': keySize,
+            'keyNum': keyNum,
+            'homVisible': request_form['homVisible'],
+            'hairpinVisible': request_form['hairpinVisible'],
+            'gcVisible': request_form['gcVisible'], 
+            }
+    return form, constraints
+
+
+# Numeric fields of a JSON spec, which otherwise takes the default form values
+spec_fields = {'gcContentMinPercentage': float,
+               'gcContentMaxPercentage': float,
+               'maxHomopolymer': int,
+               'maxHairpin': int,
+               'loopMin': int,
+               'loopMax': int,
+               'payloadSize': int,
+               'payloadNum': int,
+               'keySize': int,
+               'keyNum': int,
+               }
+spec_constraints = {'hom', 'hairpin', 'gcContent', 'noKeyInPayload'}
+
+
+def read_spec(spec):
+    # Get data from a JSON generation spec, raising ValueError if it is malformed
+    if not isinstance(spec, dict):
+        raise ValueError('A spec must be a JSON object')
+    form = {k: default_form[k] for k in spec_fields}
+    for k in spec_fields:
+        if k in spec:
+            if isinstance(spec[k], bool) or not isinstance(spec[k], (int, float)):
+                raise ValueError('{} must be a number'.format(k))
+            form[k] = spec_fields[k](spec[k])
+    with_constraints = spec.get('withConstraints', ['hom', 'hairpin', 'gcContent'])
+    if not isinstance(with_constraints, list) or \
+       not all([isinstance(constraint, str) for constraint in with_constraints]):
+        raise ValueError('withConstraints must be a list of strings')
+    constraints = set(with_constraints)
+    if not constraints <= spec_constraints:
+        raise ValueError('Unknown constraints: {}'.format(sorted(constraints - spec_constraints)))
+    seed = spec.get('seed')
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+        raise ValueError('seed must be a non-negative integer')
+    if analyse_input.get_constraints(form) is False:
+        raise ValueError('Invalid constraints')
+    return form, constraints, seed
+
+
+def load_presets(path):
+    # Presets are a JSON list of specs, in the format of the /api/jobs specs
+    with open(path) as f:
+        specs = json.load(f)
+    return [read_spec(spec)[:2] for spec in specs]
+
+# Motif sets of the presets listed in PRESETS_PATH are generated ahead of the requests, up to
+# PRESET_POOL_SIZE per preset, on PRESET_WORKERS processes
+preset_pool = None
+if os.environ.get('PRESETS_PATH'):
+    preset_pool = PresetPool(load_presets(os.environ['PRESETS_PATH']), \
+                             pool_size=int(os.environ.get('PRESET_POOL_SIZE', 4)), \
+                             workers=int(os.environ.get('PRESET_WORKERS', 1)))
+
 
 @app.route('/', methods=['GET', 'POST'])
 async def generate():
-    form = {'gcContentMinPercentage': 25, 
-            'gcContentMaxPercentage': 65, 
-            'maxHomopolymer': 5,
-            'maxHairpin': 1,
-            'loopMin': 6,
-            'loopMax': 7,
-            'payloadSize': 5, 
-            'payloadNum': 10,
-            'keySize': 2,
-            'keyNum': 2,
-            'homVisible': False,
-            'hairpinVisible': False,
-            'gcVisible': False,
-            }
+    form = dict(default_form)
 
     if request.method == 'POST':
 
         if "analyseSeqSubmission" in request.form:
-            # Form being submitted, get data from form.
-            gcContentMinPercentage = 25
-            gcContentMaxPercentage = 65
-            max_homopolymer = 1
-            maxHairpin = 1
-            loopMin = 6
-            loopMax = 7
-            payloadSize = int(request.form['payloadSize'])
-            payloadNum = int(request.form['payloadNum'])
-            keySize = int(request.form['keySize'])
-            keyNum = int(request.form['keyNum'])
-            constraints = set()
-            if request.form['homVisible'] == 'True':
-                constraints.add('hom')
-                max_homopolymer = int(request.form['maxHomopolymer'])
-            if request.form['hairpinVisible'] == 'True':
-                constraints.add('hairpin')
-                maxHairpin = int(request.form['maxHairpin'])
-                loopMin = int(request.form['loopMin'])
-                loopMax = int(request.form['loopMax'])
-            if request.form['gcVisible'] == 'True':
-                constraints.add('gcContent')
-                gcContentMinPercentage = float(request.form['gcContentMinPercentage'])
-                gcContentMaxPercentage = float(request.form['gcContentMaxPercentage'])
-
-            form = {'gcContentMinPercentage': gcContentMinPercentage, 
-                    'gcContentMaxPercentage': gcContentMaxPercentage, 
-                    'maxHomopolymer': max_homopolymer,
-                    'maxHairpin': maxHairpin,
-                    'loopMin': loopMin,
-                    'loopMax': loopMax,
-                    'payloadSize': payloadSize, 
-                    'payloadNum': payloadNum,
-                    'keySize': keySize,
-                    'keyNum': keyNum,
-                    'homVisible': request.form['homVisible'],
-                    'hairpinVisible': request.form['hairpinVisible'],
-                    'gcVisible': request.form['gcVisible'], 
-                    }
-
-            keys, payloads, motifs, isValid = await analyse_input.generate_keys_and_payloads(form,\
-                                                                                    constraints)
+            form, constraints = read_form(request.form)
+
+            # A preset is served from its pool of motif sets generated ahead of time
+            motif_set = preset_pool.take(form, constraints) if preset_pool else None
+            if motif_set is not None:
+                form['seed'] = motif_set['seed']
+                keys, payloads, motifs, isValid = analyse_input.format_motif_set(motif_set)
+            else:
+                # The seed lets the download replay the same generation
+                form['seed'] = secrets.randbits(32)
+                keys, payloads, motifs, isValid = await analyse_input.generate_keys_and_payloads(\
+                                                                form, constraints, form['seed'])
 
             # Render the page
             return render_template('index.html', payloads=payloads, motifs=motifs, keys=keys, \
@@ -79,6 +184,131 @@ async def generate():
                             isValid=False, submitted=False)
 
 
+@app.route('/download/<file_format>', methods=['POST'])
+async def download(file_format):
+    if file_format not in motif_writer.file_formats:
+        return make_response('Unknown file format', 404)
+    form, constraints = read_form(request.form)
+    seed = int(request.form['seed']) if request.form.get('seed') else None
+
+    # A set served from a preset pool is sent as it was served
+    motif_set = None
+    if preset_pool and seed is not None:
+        motif_set = preset_pool.get_served(form, constraints, seed)
+    if motif_set is not None:
+        motifs = motif_set['motifs']
+    else:
+        key_payload_builder, keys, payloads = await analyse_input.build_keys_and_payloads(\
+                                                                    form, constraints, seed)
+        if not (keys and payloads):
+            return make_response('Could not generate motifs', 422)
+
+        # Motifs are written as they are built, so the whole set is never held in memory
+        motifs = key_payload_builder.iter_motifs(keys, sorted(payloads))
+    response = Response(motif_writer.iter_motif_file(motifs, file_format), \
+                        mimetype=motif_writer.mimetypes[file_format])
+    response.headers['Content-Disposition'] = 'attachment; filename=motifs.' + file_format
+    return response
+
+
+@app.route('/api/presets', methods=['GET'])
+def presets():
+    return jsonify(preset_pool.get_ready_counts() if preset_pool else [])
+
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    try:
+        form, constraints, seed = read_spec(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        job_id = job_queue.submit(form, constraints, seed, \
+                                  analyse_input.generation_stats is not None)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify(job_queue.get_info(job_id)), 202, {'Location': '/api/jobs/' + job_id}
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    info = job_queue.get_info(job_id)
+    if info is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(info)
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    if job_queue.get_info(job_id) is None:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    # Server-sent events, one per status change, until the job is finished
+    def iter_events():
+        for info in job_queue.iter_info(job_id):
+            if info is None:
+                return
+            yield 'event: {}\ndata: {}\n\n'.format(info['status'], json.dumps(info))
+    return Response(iter_events(), mimetype='text/event-stream', \
+                    headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    info = job_queue.get_info(job_id)
+    if info is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if info['status'] == 'failed':
+        return jsonify(info), 500
+    if info['status'] != 'done':
+        return jsonify(info), 202
+    return jsonify(job_queue.get_result(job_id))
+
+
+@app.route('/api/generate', methods=['POST'])
+def generate_batch():
+    body = request.get_json(silent=True)
+    specs = body.get('specs') if isinstance(body, dict) else body
+    if not isinstance(specs, list) or not specs:
+        return jsonify({'error': 'Expected a non-empty list of specs'}), 400
+    if len(specs) > max_batch_size:
+        return jsonify({'error': 'At most {} specs per request'.format(max_batch_size)}), 413
+    batch = []
+    for i in range(len(specs)):
+        try:
+            batch.append(read_spec(specs[i]))
+        except ValueError as e:
+            return jsonify({'error': str(e), 'index': i}), 400
+    try:
+        results = analyse_input.generate_motif_sets(batch, job_queue)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+
+    # NDJSON streams every result as soon as it is ready, in the order they complete
+    if request.args.get('format') == 'ndjson' or \
+       request.accept_mimetypes.best == 'application/x-ndjson':
+        lines = motif_writer.iter_ndjson(dict(result, index=i) for i, result in results)
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            return Response(motif_writer.iter_gzip(lines), mimetype='application/x-ndjson', \
+                            headers={'Content-Encoding': 'gzip'})
+        return Response(lines, mimetype='application/x-ndjson')
+
+    ordered = [None] * len(batch)
+    for i, result in results:
+        ordered[i] = dict(result, index=i)
+    return jsonify({'results': ordered})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    stats = analyse_input.generation_stats
+    if stats is None:
+        return make_response('Generation statistics are disabled', 404)
+    if request.args.get('format') == 'json':
+        return jsonify(stats.to_dict())
+    return Response(stats.to_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == "__main__":
    app.run(debug=True)
 
@@ -0,0 +1,279 @@
+from concurrent.futures import ProcessPoolExecutor
+import collections
+import os
+import threading
+import time
+import uuid
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobQueue:
+    def __init__(self, task, workers=None, max_queued=16, max_finished=256, on_result=None):
+        self.task = task
+        # Called on the result of every successful job, in the server process, before the
+        # result is stored
+        self.on_result = on_result
+        self.workers = workers or os.cpu_count()
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+
+        # The pool is only started by the first job, so that importing the app does not
+        # fork processes before the server does
+        self.executor = None
+
+        # Job id -> job, and ids of the finished jobs, oldest first
+        self.jobs = {}
+        self.finished = collections.deque()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    ### Submit Jobs ###
+
+    def submit(self, *args):
+        """This function queues a call of `task` with the arguments `args` on the worker
+        pool, unless every worker is busy and `max_queued` jobs are already waiting.
+
+        Parameters
+        ----------
+        args:
+            Arguments of `task`. They must be picklable.
+
+        Returns
+        ----------
+        job_id: str
+            Id under which the status and result of the job can be fetched.
+        """
+        with self.lock:
+            pending = self.count_pending()
+            if pending >= self.workers + self.max_queued:
+                raise QueueFullError('{} jobs are already pending'.format(pending))
+            job = self.add_job(args)
+        self.watch_job(job)
+        return job['id']
+
+    def count_pending(self):
+        # Called with the lock held
+        return len([job for job in self.jobs.values() if job['finishedAt'] is None])
+
+    def add_job(self, args, batch=False):
+        # Called with the lock held. The job is only finished once watch_job is called, which
+        # takes the lock.
+        job_id = uuid.uuid4().hex
+        job = {'id': job_id,
+               'submittedAt': time.time(),
+               'finishedAt': None,
+               'future': None,
+               'result': None,
+               'error': None,
+               'batch': batch
+               }
+        self.jobs[job_id] = job
+        job['future'] = self.get_executor().submit(self.task, *args)
+        return job
+
+    def watch_job(self, job):
+        # The callback runs straight away if the job is already done
+        job['future'].add_done_callback(lambda future: self.finish(job['id'], future))
+
+    def finish(self, job_id, future):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job['finishedAt'] is not None:
+                return
+            job['finishedAt'] = time.time()
+            if future.cancelled():
+                job['error'] = 'cancelled'
+            elif future.exception() is not None:
+                job['error'] = repr(future.exception())
+            else:
+                job['result'] = future.result()
+                if self.on_result is not None:
+                    job['result'] = self.on_result(job['result'])
+
+            # Only the most recent finished jobs are kept. Jobs of a batch are taken by the
+            # batch instead, see iter_batch.
+            if not job['batch']:
+                self.finished.append(job_id)
+                while len(self.finished) > self.max_finished:
+                    del self.jobs[self.finished.popleft()]
+            self.changed.notify_all()
+
+    ### Submit Batches ###
+
+    def submit_batch(self, args_list, interval=1.0):
+        """This function queues a call of `task` for each of the arguments in `args_list`
+        on the worker pool, within the limits of the jobs. Calls are submitted as the
+        results are iterated and places free up, so that at most `workers` + `max_queued`
+        calls and jobs are ever pending.
+
+        Parameters
+        ----------
+        args_list: list of tuple
+            Arguments of every call of `task`. They must be picklable.
+        interval: float
+            Longest time in seconds between two checks for finished calls.
+
+        Returns
+        ----------
+        results: generator of (int, object, str or None)
+            Index of the arguments, with the result of the call, or None and the error if
+            it failed, in the order the calls finish. Closing the generator cancels the
+            calls which are still queued.
+
+        Raises
+        ----------
+        QueueFullError
+            If every worker is busy and `max_queued` jobs are already waiting.
+        """
+        with self.lock:
+            pending = self.count_pending()
+            if args_list and pending >= self.workers + self.max_queued:
+                raise QueueFullError('{} jobs are already pending'.format(pending))
+        return self.iter_batch(args_list, interval)
+
+    def add_batch_jobs(self, batch, args_list, next_index):
+        # Called with the lock held. Submits the calls from `next_index` on while places
+        # are free.
+        jobs = []
+        while next_index < len(args_list) and \
+              self.count_pending() < self.workers + self.max_queued:
+            job = self.add_job(args_list[next_index], batch=True)
+            batch[job['id']] = next_index
+            jobs.append(job)
+            next_index += 1
+        return jobs
+
+    def iter_batch(self, args_list, interval):
+        # Job id -> index in `args_list`, of the calls submitted and not yet returned
+        batch = {}
+        next_index = 0
+        try:
+            while batch or next_index < len(args_list):
+                with self.lock:
+                    jobs = self.add_batch_jobs(batch, args_list, next_index)
+                    next_index += len(jobs)
+                    finished = [job_id for job_id in batch \
+                                if self.jobs[job_id]['finishedAt'] is not None]
+                    if not jobs and not finished:
+                        self.changed.wait(interval)
+                        continue
+                    results = []
+                    for job_id in finished:
+                        job = self.jobs.pop(job_id)
+                        results.append((batch.pop(job_id), job['result'], job['error']))
+                for job in jobs:
+                    self.watch_job(job)
+                for result in results:
+                    yield result
+        finally:
+            # Calls still pending are left to finish as ordinary jobs, queued ones are
+            # cancelled. Cancelling finishes them, which takes the lock.
+            futures = []
+            with self.lock:
+                for job_id in batch:
+                    job = self.jobs[job_id]
+                    if job['finishedAt'] is not None:
+                        del self.jobs[job_id]
+                    else:
+                        job['batch'] = False
+                        futures.append(job['future'])
+            for future in futures:
+                future.cancel()
+
+    ### Job Status ###
+
+    def get_status(self, job):
+        if job['finishedAt'] is not None:
+            return 'failed' if job['error'] else 'done'
+        if job['future'] is not None and job['future'].running():
+            return 'running'
+        return 'queued'
+
+    def get_job_info(self, job):
+        info = {'id': job['id'],
+                'status': self.get_status(job),
+                'submittedAt': job['submittedAt'],
+                'finishedAt': job['finishedAt']
+                }
+        if info['status'] == 'queued':
+            # Number of jobs submitted earlier and still waiting for a worker
+            info['position'] = len([other for other in self.jobs.values() \
+                                    if self.get_status(other) == 'queued' and \
+                                       other['submittedAt'] < job['submittedAt']])
+        if info['status'] == 'failed':
+            info['error'] = job['error']
+        return info
+
+    def get_info(self, job_id):
+        """This function returns the status of a job.
+
+        Parameters
+        ----------
+        job_id: str
+            Id returned by `submit`.
+
+        Returns
+        ----------
+        info: dict or None
+            The job 'id', its 'status' among 'queued', 'running', 'done' and 'failed',
+            'submittedAt' and 'finishedAt' times, its 'position' among the queued jobs
+            while it is queued and the 'error' if it failed. None if the job is unknown.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return self.get_job_info(job) if job is not None else None
+
+    def get_result(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return job['result'] if job is not None else None
+
+    def iter_info(self, job_id, interval=1.0):
+        """This function yields the status of a job every time it changes, until the job
+        is finished. The status is checked again at least every `interval` seconds.
+
+        Parameters
+        ----------
+        job_id: str
+            Id returned by `submit`.
+        interval: float
+            Longest time in seconds between two checks of the status.
+
+        Returns
+        ----------
+        infos: generator of dict
+            Statuses of the job, in the format of `get_info`. The last one is 'done' or
+            'failed', or None if the job is unknown.
+        """
+        last_info = None
+        while True:
+            with self.lock:
+                job = self.jobs.get(job_id)
+                info = self.get_job_info(job) if job is not None else None
+                if info is not None and info == last_info:
+                    self.changed.wait(interval)
+                    continue
+            yield info
+            if info is None or info['status'] in ['done', 'failed']:
+                return
+            last_info = info
+
+    def counts(self):
+        with self.lock:
+            statuses = [self.get_status(job) for job in self.jobs.values()]
+        return {status: statuses.count(status) for status in ['queued', 'running', 'done', \
+                                                               'failed']}
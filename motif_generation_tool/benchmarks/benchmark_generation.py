@@ -0,0 +1,211 @@
+from constraints.constraints import Constraints
+from hyperparameters.hyperparameters import Hyperparameters
+from payload.payload_log_score import PayloadLogScore
+from payload.payload_builder import PayloadBuilder
+from key.key_builder import KeyBuilder
+from key_payload_builder import KeyPayloadBuilder
+from dna_language_specification.language import nucleotides
+
+import numpy as np
+import argparse
+import asyncio
+import json
+import time
+
+
+# Setup of the main() coroutine of key_payload_builder.py
+base_constraints = {'payload_size': 60, 'payload_num': 15, 'max_hom': 5, 'max_hairpin': 1, \
+                    'loop_size_min': 6, 'loop_size_max': 7, 'min_gc': 25, 'max_gc': 65, \
+                    'key_size': 20, 'key_num': 8}
+
+# Each grid entry changes some of the base constraints
+grid = [{},
+        {'payload_size': 30},
+        {'payload_size': 120},
+        {'payload_num': 5},
+        {'payload_num': 30},
+        {'key_size': 10},
+        {'key_num': 4},
+        {'key_num': 16},
+        {'max_hairpin': 2},
+        {'max_hairpin': 3},
+        {'loop_size_min': 3, 'loop_size_max': 10}
+        ]
+
+shapes = {'hom': 70, 'gcContent': 10, 'hairpin': 8, 'similarity': 60, 'noKeyInPayload': 45}
+weights = {'hom': 1, 'gcContent': 1, 'hairpin': 1, 'similarity': 1, 'noKeyInPayload': 1}
+
+key_constraints = {'hom', 'gcContent', 'hairpin'}
+with_constraints = {'hom', 'gcContent', 'hairpin', 'noKeyInPayload'}
+
+
+def random_elems(rng, elem_size, elem_num):
+    return [''.join(rng.choice(nucleotides, size=elem_size)) for _ in range(elem_num)]
+
+async def get_payload_log_score(constraints, hyperparameters, seed):
+    # Random keys and payloads, so that the scoring benchmarks do not depend on the builders
+    rng = np.random.default_rng(seed)
+    payload_log_score = PayloadLogScore(constraints, hyperparameters)
+    await payload_log_score.add_keys(random_elems(rng, constraints.key_size, constraints.key_num))
+    await payload_log_score.add_payloads(random_elems(rng, constraints.payload_size, \
+                                                      constraints.payload_num))
+    prefixes = [payload[:rng.integers(1, constraints.payload_size + 1)] \
+                for payload in random_elems(rng, constraints.payload_size, 50)]
+    return payload_log_score, prefixes
+
+
+### Benchmarks ###
+
+async def benchmark_forward_hairpin(constraints, hyperparameters, seed):
+    payload_log_score, prefixes = await get_payload_log_score(constraints, hyperparameters, seed)
+    hairpin = payload_log_score.hairpin
+    start = time.perf_counter()
+    for prefix in prefixes:
+        hairpin.forward_hairpin_log_score(prefix, payload_log_score.payloads, \
+                                          payload_log_score.keys, \
+                                          elems1_index=payload_log_score.payloads_index)
+    duration = time.perf_counter() - start
+    return {'calls': len(prefixes), 'duration': duration}
+
+async def benchmark_max_homopolymer_length(constraints, hyperparameters, seed):
+    payload_log_score, prefixes = await get_payload_log_score(constraints, hyperparameters, seed)
+    prefixes = prefixes * 20
+    start = time.perf_counter()
+    for prefix in prefixes:
+        payload_log_score.max_homopolymer_length(prefix)
+    duration = time.perf_counter() - start
+    return {'calls': len(prefixes), 'duration': duration}
+
+async def benchmark_build_payload(constraints, hyperparameters, seed):
+    # Random keys rarely leave room for any payload, so the keys are built first
+    rng = np.random.default_rng(seed)
+    key_builder = KeyBuilder(constraints, hyperparameters, rng)
+    keys = await key_builder.build_all_keys(key_constraints)
+    payload_builder = PayloadBuilder(constraints, hyperparameters, rng)
+    await payload_builder.add_keys(keys)
+    successes = 0
+    start = time.perf_counter()
+    for _ in range(constraints.payload_num):
+        successes += 1 if await payload_builder.build_payload(with_constraints) else 0
+    duration = time.perf_counter() - start
+    return {'calls': constraints.payload_num, 'duration': duration, 'successes': successes, \
+            'motifs': successes}
+
+async def benchmark_build_all_keys(constraints, hyperparameters, seed):
+    key_builder = KeyBuilder(constraints, hyperparameters, np.random.default_rng(seed))
+    start = time.perf_counter()
+    keys = await key_builder.build_all_keys(key_constraints)
+    duration = time.perf_counter() - start
+    return {'calls': 1, 'duration': duration, \
+            'successes': 1 if len(keys) == constraints.key_num else 0, 'motifs': len(keys)}
+
+async def benchmark_build_keys_and_payloads(constraints, hyperparameters, seed):
+    key_payload_builder = KeyPayloadBuilder(constraints, hyperparameters, seed)
+    start = time.perf_counter()
+    keys, payloads = await key_payload_builder.build_keys_and_payloads(with_constraints)
+    duration = time.perf_counter() - start
+    motifs = key_payload_builder.get_motifs(keys, payloads) if keys and payloads else set()
+    is_success = keys and payloads and len(keys) == constraints.key_num and \
+                 len(payloads) == constraints.payload_num
+    return {'calls': 1, 'duration': duration, 'successes': 1 if is_success else 0, \
+            'motifs': len(motifs)}
+
+benchmarks = {'forward_hairpin_log_score': benchmark_forward_hairpin,
+              'max_homopolymer_length': benchmark_max_homopolymer_length,
+              'build_payload': benchmark_build_payload,
+              'build_all_keys': benchmark_build_all_keys,
+              'build_keys_and_payloads': benchmark_build_keys_and_payloads
+              }
+
+
+### Run Benchmarks ###
+
+async def run_benchmarks(grid, rounds, seed=0, names=None):
+    """This function runs every benchmark on every entry of `grid`, `rounds` times, with
+    the seeds `seed` to `seed + rounds - 1`.
+
+    Parameters
+    ----------
+    grid: list of dict
+        Constraints overriding `base_constraints`, one benchmark setup per entry.
+    rounds: int
+        Number of seeded runs of each benchmark per setup.
+    seed: int
+        First seed.
+    names: list of str or None
+        Names of the benchmarks to run. If None, all benchmarks are run.
+
+    Returns
+    ----------
+    results: list of dict
+        For each benchmark and setup, the 'benchmark' name, the 'constraints', the number
+        of 'calls', the total 'duration', 'callsPerSec' and, for the builders,
+        'successRate' and 'motifsPerSec'.
+    """
+    hyperparameters = Hyperparameters(shapes, weights)
+    results = []
+    for name in (names or benchmarks):
+        for entry in grid:
+            cur_constraints = dict(base_constraints, **entry)
+            constraints = Constraints(**cur_constraints)
+            total = {'calls': 0, 'duration': 0, 'successes': 0, 'motifs': 0}
+            for r in range(rounds):
+                result = await benchmarks[name](constraints, hyperparameters, seed + r)
+                for k in result:
+                    total[k] += result[k]
+            result = {'benchmark': name,
+                      'constraints': cur_constraints,
+                      'calls': total['calls'],
+                      'duration': total['duration'],
+                      'callsPerSec': total['calls'] / total['duration']
+                      }
+            if name not in ['forward_hairpin_log_score', 'max_homopolymer_length']:
+                result['successRate'] = total['successes'] / total['calls']
+                result['motifsPerSec'] = total['motifs'] / total['duration']
+            results.append(result)
+            print(format_result(result), flush=True)
+    return results
+
+def format_result(result, baseline=None):
+    changed = {k: result['constraints'][k] for k in result['constraints'] \
+               if result['constraints'][k] != base_constraints[k]}
+    line = '{:<26} {:<40} {:>12.1f} calls/s'.format(result['benchmark'], str(changed or 'base'), \
+                                                    result['callsPerSec'])
+    if 'motifsPerSec' in result:
+        line += ' {:>10.1f} motifs/s {:>6.0%} success'.format(result['motifsPerSec'], \
+                                                              result['successRate'])
+    if baseline:
+        line += ' {:>6.2f}x baseline'.format(result['callsPerSec'] / baseline['callsPerSec'])
+    return line
+
+def compare_results(results, baseline_results):
+    baselines = {(r['benchmark'], json.dumps(r['constraints'], sort_keys=True)): r \
+                 for r in baseline_results}
+    for result in results:
+        baseline = baselines.get((result['benchmark'], \
+                                  json.dumps(result['constraints'], sort_keys=True)))
+        print(format_result(result, baseline))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the motif generation hot paths.')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--benchmark', action='append', choices=list(benchmarks))
+    parser.add_argument('--output', help='JSON file the results are written to.')
+    parser.add_argument('--baseline', help='JSON file of earlier results to compare with.')
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmarks(grid, args.rounds, args.seed, args.benchmark))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline_results = json.load(f)
+        print()
+        compare_results(results, baseline_results)
+
+
+if __name__ == '__main__':
+    main()
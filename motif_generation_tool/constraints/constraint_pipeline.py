@@ -0,0 +1,54 @@
+# Order in which the constraints are scored. Cheap checks which often rule a base out come
+# first, so that once a base scores -inf the rest, and the costly hairpin search above all,
+# are skipped.
+constraint_order = ['hom', 'gcContent', 'noKeyInPayload', 'similarity', 'hairpin']
+
+# Constraints scored along with a selected constraint
+implied_constraints = {'hairpin': ['similarity']}
+
+
+def get_scored_constraints(with_constraints, scorers):
+    """This function lists the constraints scored for the selection `with_constraints`,
+    along with the constraints they imply, in scoring order. Constraints without a scorer
+    are left out.
+
+    Parameters
+    ----------
+    with_constraints: set of str
+        Selected constraints.
+    scorers: dict of str to callable
+        Scorer of each constraint which can be scored.
+
+    Returns
+    ----------
+    scored_constraints: list of str
+        Constraints to score, in the order of `constraint_order`.
+    """
+    selected = set(with_constraints)
+    for constraint in with_constraints:
+        selected.update(implied_constraints.get(constraint, []))
+    return [constraint for constraint in constraint_order \
+            if constraint in selected and constraint in scorers]
+
+
+def compile_constraints(with_constraints, scorers, hyperparams):
+    """This function compiles the selection `with_constraints` into the list of
+    constraints to score, each with its weight and scorer, so that scoring a base needs no
+    dispatch on constraint names.
+
+    Parameters
+    ----------
+    with_constraints: set of str
+        Selected constraints.
+    scorers: dict of str to callable
+        Scorer of each constraint which can be scored, returning its unweighted log score.
+    hyperparams: dict of str to ConstraintHyperparameters
+        Hyperparameters of each constraint which can be scored.
+
+    Returns
+    ----------
+    pipeline: list of tuple
+        (constraint, weight, scorer) of each constraint to score, in scoring order.
+    """
+    return [(constraint, hyperparams[constraint].weight, scorers[constraint]) \
+            for constraint in get_scored_constraints(with_constraints, scorers)]
@@ -1,6 +1,9 @@
 import numpy as np
 from dna_language_specification.language import nucleotides, converse
+from dna_language_specification.packed_sequence import pairing_codes
 from hyperparameters.hyperparameters import Hyperparameters
+from .pairing_index import PairingIndex
+from .hairpin_layout import HairpinLayout
 
 class Hairpin:
     def __init__(self, constraints, hyperparams=None):
@@ -18,15 +21,36 @@ class Hairpin:
         # Payload
         self.payload_size = constraints.payload_size
 
+        # Layout of the motif window for keys (True) and payloads (False), built when first used
+        self.layouts = {}
+
         # Hyperparameters
         if hyperparams:
             self.hairpin_hyperparams = hyperparams.hairpin
         else:
             self.hairpin_hyperparams = Hyperparameters().hairpin
 
+        # Log score of each stem length up to max_hairpin, as a list, faster than NumPy for a
+        # single lookup
+        self.hairpin_log_scores = \
+            self.hairpin_hyperparams.get_log_score_table(self.max_hairpin).tolist()
+
     ##### Helper Functions #####
 
+    def get_layout(self, is_key, stem1_start, loop_size_max):
+        # Furthest position the stems of a hairpin starting at stem1_start can reach
+        max_pos = max(abs(stem1_start), self.window_size) + loop_size_max + \
+                  2 * self.stem_out_bounds_len + self.window_size
+        layout = self.layouts.get(is_key)
+        if layout is None or layout.max_pos < max_pos:
+            elem1_size = self.key_size if is_key else self.payload_size
+            layout = HairpinLayout(self.window_size, elem1_size, self.key_size, is_key, max_pos)
+            self.layouts[is_key] = layout
+        return layout
+
     def calculate_hairpin_log_score(self, stem_length):
+        if stem_length < len(self.hairpin_log_scores):
+            return self.hairpin_log_scores[stem_length]
         return - self.hairpin_hyperparams.shape**(stem_length / (self.max_hairpin)) + 1
 
     def is_in_cur_elem(self, info, pos):
@@ -62,7 +86,6 @@ class Hairpin:
 
     def get_key_at_pos(self, info, pos):
         if not info['isKey']:
-            pos = pos + self.key_size
             keyElems = info['elems2']
             totalKeyNum = len(keyElems) * 2
         else:
@@ -70,9 +93,9 @@ class Hairpin:
             totalKeyNum = len(keyElems) * 2 + 2
         if totalKeyNum == 0:
             return ""
-        if pos < 0:
-                pos = pos - self.key_size
-        keyNum = (info['firstKey'] + int(pos / self.window_size)) % totalKeyNum
+        layout = info['layout'] if 'layout' in info else self.get_layout(info['isKey'], pos, 0)
+        keyWindow = layout.key_window[pos]
+        keyNum = (info['firstKey'] + keyWindow) % totalKeyNum
         if keyNum >= len(keyElems) * 2:
             return info['curElem']
         return keyElems[int(keyNum / 2)]
@@ -120,15 +143,83 @@ class Hairpin:
             keyPos = start_pos
         return self.get_key_at_pos(info, keyPos) == self.get_key_at_pos(info, keyPos + \
                                                                         self.window_size)
-    
+
+    def get_paired_elems1(self, info, fixed_elem, fixed_pos, elem1_pos, curJ, \
+                          is_elem1_in_stem1=False, is_fixed_in_elem2=False):
+        """This function returns the elements of `elems1` which could still form a stem
+        with `fixed_elem` when placed at `elem1_pos`. Elements whose bases do not pair with
+        the known bases of `fixed_elem` on the next stem positions cannot add any hairpin,
+        so they are filtered out using the pairing index of `elems1`, if there is one.
+
+        Parameters
+        ----------
+        fixed_elem: str
+            Element the stem is checked against.
+        fixed_pos: int
+            Position of the stem in `fixed_elem`.
+        elem1_pos: int
+            Position of the stem in the elements of `elems1`.
+        curJ: int
+            Number of stem positions left to check after the current one.
+        is_elem1_in_stem1: bool
+            True if the elements of `elems1` hold the first stem, False otherwise.
+        is_fixed_in_elem2: bool
+            True if `fixed_elem` has the type of the elements of `elems2`, False otherwise.
+
+        Returns
+        ----------
+        elems1: set or list of str
+            Elements of `elems1` which could form a stem with `fixed_elem`.
+        """
+        elems1_index = info.get('elems1Index')
+        if elems1_index is None or info['isKey']:
+            return info['elems1']
+
+        fixed_start = (fixed_pos % self.window_size) - (info['elem1Size'] if is_fixed_in_elem2 \
+                                                                          else 0)
+        fixed_region_end = info['elem2Size'] if is_fixed_in_elem2 else info['elem1Size']
+        elem1_start = elem1_pos % self.window_size
+
+        # Both stems walk in opposite directions, bases of `fixed_elem` past its current
+        # length are not known yet and are skipped. The paired bases are packed into the
+        # word of the k-mer of `elems1` they form, 2 bits per base.
+        word = 0
+        kmer_size = 0
+        kmer_start = -1
+        for t in range(curJ + 1):
+            cur_fixed_pos = fixed_start - t if not is_elem1_in_stem1 else fixed_start + t
+            cur_elem1_pos = elem1_start - t if is_elem1_in_stem1 else elem1_start + t
+            if not (0 <= cur_fixed_pos < fixed_region_end and \
+                    0 <= cur_elem1_pos < info['elem1Size']):
+                break
+            if cur_fixed_pos >= len(fixed_elem):
+                if kmer_size:
+                    break
+                continue
+            if not kmer_size:
+                kmer_start = cur_elem1_pos
+            code = pairing_codes[fixed_elem[cur_fixed_pos]]
+            if is_elem1_in_stem1:
+                # The k-mer is read backwards, the newest pair is its first base
+                word = (word << 2) | code
+            else:
+                word |= code << (2 * kmer_size)
+            kmer_size += 1
+            if kmer_size == elems1_index.max_kmer_size:
+                break
+
+        word |= 1 << (2 * kmer_size)
+        if is_elem1_in_stem1:
+            kmer_start = kmer_start - kmer_size + 1
+        return elems1_index.get_elems_with_word(kmer_start, word, kmer_size)
+
     ##### Send Current Stem 1 and Stem 2 Positions to Corresponding Payloads and Keys #####
 
     def send_to_all_check(self, info, curJ, stem1_start, stem2_start, stem_length, hairpins, \
                           curE1_1="", curE1_2="", curE2_1="", curE2_2=""):
         if hairpins == -np.inf:
             return True, hairpins
-        stem1_pos = stem1_start + curJ
-        stem2_pos = stem2_start + self.stem_out_bounds_len - 1 - curJ
+        is_elem2 = info['layout'].is_elem2
 
         if curJ < 0 and stem_length > 0:
             if stem_length >= self.stem_out_bounds_len:
@@ -153,21 +244,22 @@ class Hairpin:
         for i in range(len(first_keys)):
             info['firstKey'] = first_keys[i]
             for j in range(curJ, -1, -1):
-                was_sent_to_all_pos1_e1, hairpins = self.send_to_all_pos1_elem1(info, curJ,\
-                                                                    stem1_start, stem2_start,\
-                                                                    stem_length, hairpins, \
-                                                                    curE1_1, curE1_2, \
-                                                                    curE2_2)
-                was_sent_to_all_pos1_e2, hairpins = self.send_to_all_pos1_elem2(info, curJ,\
-                                                                            stem1_start, \
-                                                                            stem2_start, \
-                                                                            stem_length, \
-                                                                            hairpins, curE2_1, \
-                                                                            curE2_2, curE1_2)
-                if hairpins == -np.inf or ((was_sent_to_all_pos1_e1 or was_sent_to_all_pos1_e2) \
-                                                                and i == len(first_keys) - 1):
+                # Only the element types the stem positions fall in are sent to
+                stem1_pos = stem1_start + curJ
+                stem2_pos = stem2_start + self.stem_out_bounds_len - 1 - curJ
+                if not is_elem2[stem1_pos]:
+                    was_sent, hairpins = self.send_to_all_pos1_elem1(info, curJ, stem1_start, \
+                                                                     stem2_start, stem_length, \
+                                                                     hairpins, curE1_1, \
+                                                                     curE1_2, curE2_2)
+                else:
+                    was_sent, hairpins = self.send_to_all_pos1_elem2(info, curJ, stem1_start, \
+                                                                     stem2_start, stem_length, \
+                                                                     hairpins, curE2_1, \
+                                                                     curE2_2, curE1_2)
+                if hairpins == -np.inf or (was_sent and i == len(first_keys) - 1):
                     return True, hairpins
-                elif (was_sent_to_all_pos1_e1 or was_sent_to_all_pos1_e2):
+                elif was_sent:
                     break
                 curJ -= 1
         return False, hairpins
@@ -176,26 +268,24 @@ class Hairpin:
                                curE1_1="", curE1_2="", curE2=""):
         if hairpins == -np.inf:
             return True, hairpins
-        was_sent_to_e1_e1, hairpins = self.send_to_elem1_elem1(info, curJ, stem1_start, \
-                                                                 stem2_start, stem_length, \
-                                                                 hairpins, curE1_1, curE1_2)
-        was_sent_to_e1_e2, hairpins = self.send_to_elem1_elem2(info, curJ, stem1_start, \
-                                                                 stem2_start, stem_length, \
-                                                                 hairpins, curE1_1, curE2)
-        return was_sent_to_e1_e1 or was_sent_to_e1_e2, hairpins
-    
+        stem2_pos = stem2_start + self.stem_out_bounds_len - 1 - curJ
+        if not info['layout'].is_elem2[stem2_pos]:
+            return self.send_to_elem1_elem1(info, curJ, stem1_start, stem2_start, stem_length, \
+                                            hairpins, curE1_1, curE1_2)
+        return self.send_to_elem1_elem2(info, curJ, stem1_start, stem2_start, stem_length, \
+                                        hairpins, curE1_1, curE2)
+
     def send_to_key_key(self, info, curJ, stem1_start, stem2_start, stem_length, hairpins):
         if hairpins == -np.inf:
             return True, hairpins
+        is_elem2 = info['layout'].is_elem2
         stem1_pos = stem1_start + curJ
         stem2_pos = stem2_start + self.stem_out_bounds_len - 1 - curJ
 
-        if info['isKey'] and (self.is_in_elem2(info, stem1_pos) or \
-                                self.is_in_elem2(info, stem2_pos)):
+        if info['isKey'] and (is_elem2[stem1_pos] or is_elem2[stem2_pos]):
             return False, hairpins
 
-        if not info['isKey'] and not (self.is_in_elem2(info, stem1_pos) and \
-                                            self.is_in_elem2(info, stem2_pos)):
+        if not info['isKey'] and not (is_elem2[stem1_pos] and is_elem2[stem2_pos]):
             return False, hairpins
 
         if info['isKey']:
@@ -211,7 +301,7 @@ class Hairpin:
                                                         stem1_start, stem2_start, \
                                                         stem_length, hairpins)
         return True, hairpins
-        
+
 
     def send_to_elem1_elem1(self, info, curJ, stem1_start, stem2_start, stem_length, hairpins, \
                             curE1_1="", curE1_2=""):
@@ -221,19 +311,21 @@ class Hairpin:
             return self.send_to_key_key(info, curJ, stem1_start, stem2_start, stem_length, \
                                         hairpins)
 
+        layout = info['layout']
         stem1_pos = stem1_start + curJ
         stem2_pos = stem2_start + self.stem_out_bounds_len - 1 - curJ
 
-        if self.is_in_elem2(info, stem1_pos) or self.is_in_elem2(info, stem2_pos):
+        if layout.is_elem2[stem1_pos] or layout.is_elem2[stem2_pos]:
             return False, hairpins
+        is_in_same_elem1 = layout.window_id[stem1_pos] == layout.window_id[stem2_pos]
 
         if curE1_1 and curE1_2:
             hairpins = self.hairpin_count_elem1_elem1(info, curE1_1, curE1_2, curJ, stem1_start, \
                                                       stem2_start, stem_length, hairpins)
-        elif curE1_1:            
+        elif curE1_1:
             if not self.is_in_cur_elem(info, stem2_pos):
-                for e1 in info['elems1']:
-                    if self.is_in_same_elem1(info, stem1_pos, stem2_pos) and curE1_1 != e1:
+                for e1 in self.get_paired_elems1(info, curE1_1, stem1_pos, stem2_pos, curJ):
+                    if is_in_same_elem1 and curE1_1 != e1:
                         continue
                     hairpins = self.hairpin_count_elem1_elem1(info, curE1_1, e1, curJ, \
                                                             stem1_start, stem2_start, \
@@ -245,8 +337,9 @@ class Hairpin:
                                                     hairpins)
         elif curE1_2:
             if not self.is_in_cur_elem(info, stem1_pos):
-                for e1 in info['elems1']:
-                    if self.is_in_same_elem1(info, stem1_pos, stem2_pos) and e1 != curE1_2:
+                for e1 in self.get_paired_elems1(info, curE1_2, stem2_pos, stem1_pos, curJ, \
+                                                 is_elem1_in_stem1=True):
+                    if is_in_same_elem1 and e1 != curE1_2:
                         continue
                     hairpins = self.hairpin_count_elem1_elem1(info, e1, curE1_2, curJ, \
                                                             stem1_start, stem2_start, \
@@ -260,9 +353,9 @@ class Hairpin:
             pos1_pos2_in_curElem = self.is_in_cur_elem(info, stem1_pos) and \
                             self.is_in_cur_elem(info, stem2_pos)
             if (not pos1_pos2_in_curElem) and self.is_in_cur_elem(info, stem1_pos):
-                for e1_2 in info['elems1']:
-                    if self.is_in_same_elem1(info, stem1_pos, stem2_pos) and \
-                                                                    info['curElem'] != e1_2:
+                for e1_2 in self.get_paired_elems1(info, info['curElem'], stem1_pos, stem2_pos, \
+                                                   curJ):
+                    if is_in_same_elem1 and info['curElem'] != e1_2:
                         continue
                     hairpins = self.hairpin_count_elem1_elem1(info, info['curElem'], e1_2, curJ, \
                                                             stem1_start, stem2_start, \
@@ -270,9 +363,9 @@ class Hairpin:
                     if hairpins == -np.inf:
                         return True, hairpins
             elif (not pos1_pos2_in_curElem) and self.is_in_cur_elem(info, stem2_pos):
-                for e1_1 in info['elems1']:
-                    if self.is_in_same_elem1(info, stem1_pos, stem2_pos) and \
-                                                                info['curElem'] != e1_1:
+                for e1_1 in self.get_paired_elems1(info, info['curElem'], stem2_pos, stem1_pos, \
+                                                   curJ, is_elem1_in_stem1=True):
+                    if is_in_same_elem1 and info['curElem'] != e1_1:
                         continue
                     hairpins = self.hairpin_count_elem1_elem1(info, e1_1, info['curElem'], curJ, \
                                                             stem1_start, stem2_start, \
@@ -281,8 +374,8 @@ class Hairpin:
                         return True, hairpins
             elif not (self.is_in_cur_elem(info, stem1_pos) or self.is_in_cur_elem(info, stem2_pos)):
                 for e1_1 in info['elems1']:
-                    for e1_2 in info['elems1']:
-                        if self.is_in_same_elem1(info, stem1_pos, stem2_pos) and e1_1 != e1_2:
+                    for e1_2 in self.get_paired_elems1(info, e1_1, stem1_pos, stem2_pos, curJ):
+                        if is_in_same_elem1 and e1_1 != e1_2:
                             continue
                         hairpins = self.hairpin_count_elem1_elem1(info, e1_1, e1_2, curJ, \
                                                                 stem1_start, stem2_start, \
@@ -298,12 +391,13 @@ class Hairpin:
                             curE1="", curE2=""):
         if hairpins == -np.inf:
             return True, hairpins
+        is_elem2 = info['layout'].is_elem2
         stem1_pos = stem1_start + curJ
         stem2_pos = stem2_start + self.stem_out_bounds_len - 1 - curJ
 
-        if not ((not self.is_in_elem2(info, stem1_pos)) and self.is_in_elem2(info, stem2_pos)):
+        if is_elem2[stem1_pos] or not is_elem2[stem2_pos]:
             return False, hairpins
-        
+
         if info['isKey']:
             curE1 = self.get_key_at_pos(info, stem1_start)
         else:
@@ -320,7 +414,8 @@ class Hairpin:
                     return True, hairpins
         elif curE2:
             if not self.is_in_cur_elem(info, stem1_pos):
-                for e1 in info['elems1']:
+                for e1 in self.get_paired_elems1(info, curE2, stem2_pos, stem1_pos, curJ, \
+                                                 is_elem1_in_stem1=True, is_fixed_in_elem2=True):
                     hairpins = self.hairpin_count_elem1_elem2(info, e1, curE2, curJ, stem1_start,\
                                                             stem2_start, stem_length, hairpins)
                     if hairpins == -np.inf:
@@ -331,30 +426,30 @@ class Hairpin:
         if not (curE2 or info['elems2']):
             _, hairpins = self.send_to_all_check(info, curJ-1, stem1_start, stem2_start, \
                                               stem_length, hairpins, curE1_1=curE1, curE2_2=curE2)
-        
+
         return True, hairpins
 
     def send_to_all_pos1_elem2(self, info, curJ, stem1_start, stem2_start, stem_length, hairpins,\
                                curE2_1="", curE2_2="", curE1=""):
         if hairpins == -np.inf:
             return True, hairpins
-        was_sent_to_e2_e1, hairpins = self.send_to_elem2_elem1(info, curJ, stem1_start, \
-                                                                 stem2_start, stem_length, \
-                                                                 hairpins, curE2_1, curE1)
-        was_sent_to_e2_e2, hairpins = self.send_to_elem2_elem2(info, curJ, stem1_start, \
-                                                                 stem2_start, stem_length, \
-                                                                 hairpins, curE2_1, curE2_2)
-        return was_sent_to_e2_e1 or was_sent_to_e2_e2, hairpins
+        stem2_pos = stem2_start + self.stem_out_bounds_len - 1 - curJ
+        if not info['layout'].is_elem2[stem2_pos]:
+            return self.send_to_elem2_elem1(info, curJ, stem1_start, stem2_start, stem_length, \
+                                            hairpins, curE2_1, curE1)
+        return self.send_to_elem2_elem2(info, curJ, stem1_start, stem2_start, stem_length, \
+                                        hairpins, curE2_1, curE2_2)
 
     def send_to_elem2_elem1(self, info, curJ, stem1_start, stem2_start, stem_length, hairpins, \
                             curE2="", curE1=""):
         if hairpins == -np.inf:
             return True, hairpins
+        is_elem2 = info['layout'].is_elem2
         stem1_pos = stem1_start + curJ
         stem2_pos = stem2_start + self.stem_out_bounds_len - 1 - curJ
-        if not (self.is_in_elem2(info, stem1_pos) and (not self.is_in_elem2(info, stem2_pos))):
+        if not is_elem2[stem1_pos] or is_elem2[stem2_pos]:
             return False, hairpins
-        
+
         if info['isKey']:
             curE1 = self.get_key_at_pos(info, stem2_start)
         else:
@@ -364,7 +459,8 @@ class Hairpin:
                                                       stem2_start, stem_length, hairpins)
         elif curE2:
             if not self.is_in_cur_elem(info, stem2_pos):
-                for e1 in info['elems1']:
+                for e1 in self.get_paired_elems1(info, curE2, stem1_pos, stem2_pos, curJ, \
+                                                 is_fixed_in_elem2=True):
                     hairpins = self.hairpin_count_elem2_elem1(info, curE2, e1, curJ, stem1_start, \
                                                             stem2_start, stem_length, hairpins)
                     if hairpins == -np.inf:
@@ -391,17 +487,19 @@ class Hairpin:
             return self.send_to_key_key(info, curJ, stem1_start, stem2_start, stem_length, \
                                         hairpins)
 
+        layout = info['layout']
         stem1_pos = stem1_start + curJ
         stem2_pos = stem2_start + self.stem_out_bounds_len - 1 - curJ
-        if not (self.is_in_elem2(info, stem1_pos) and self.is_in_elem2(info, stem2_pos)):
+        if not (layout.is_elem2[stem1_pos] and layout.is_elem2[stem2_pos]):
             return False, hairpins
+        is_in_same_elem2 = layout.window_id[stem1_pos] == layout.window_id[stem2_pos]
 
         if curE2_1 and curE2_2:
             hairpins = self.hairpin_count_elem2_elem2(info, curE2_1, curE2_2, curJ, stem1_start,\
                                                       stem2_start, stem_length, hairpins)
         elif curE2_1:
             for e2_2 in info['elems2']:
-                if self.is_in_same_elem2(info, stem1_pos, stem2_pos) and curE2_1 != e2_2:
+                if is_in_same_elem2 and curE2_1 != e2_2:
                     continue
                 hairpins = self.hairpin_count_elem2_elem2(info, curE2_1, e2_2, curJ, stem1_start,\
                                                         stem2_start, stem_length, hairpins)
@@ -409,7 +507,7 @@ class Hairpin:
                     return True, hairpins
         elif curE2_2:
             for e2_1 in info['elems2']:
-                if self.is_in_same_elem2(info, stem1_pos, stem2_pos) and e2_1 != curE2_2:
+                if is_in_same_elem2 and e2_1 != curE2_2:
                     continue
                 hairpins = self.hairpin_count_elem2_elem2(info, e2_1, curE2_2, curJ, stem1_start,\
                                                         stem2_start, stem_length, hairpins)
@@ -418,11 +516,11 @@ class Hairpin:
         else:
             for e2_1 in info['elems2']:
                 for e2_2 in info['elems2']:
-                    if self.is_in_same_elem2(info, stem1_pos, stem2_pos) and e2_1 != e2_2:
+                    if is_in_same_elem2 and e2_1 != e2_2:
                         continue
                     hairpins = self.hairpin_count_elem2_elem2(info, e2_1, e2_2, curJ, stem1_start,\
                                                 stem2_start, stem_length, hairpins)
-        
+
         if not ((curE2_1 and curE2_2) or info['elems2']):
             _, hairpins = self.send_to_all_check(info, curJ-1, stem1_start, stem2_start, \
                                                  stem_length, hairpins, \
@@ -431,35 +529,39 @@ class Hairpin:
 
     ##### Check for Hairpins #####
 
+    # Once the stems leave the element types a hairpin_count_* function checks, the
+    # remaining stem positions are sent to the function for the new element types
+
     def hairpin_count_elem1_elem1(self, info, elem1_1, elem1_2, curJ, stem1_start, stem2_start, \
                                   stem_length, hairpins):
         if hairpins == -np.inf:
             return hairpins
+        is_elem2 = info['layout'].is_elem2
+        window_pos = info['layout'].window_pos
         for j in range(curJ, -1, -1):
-            was_sent_to_e2_e1, hairpins = self.send_to_elem2_elem1(info, j, stem1_start, \
-                                                                   stem2_start, stem_length, \
-                                                                   hairpins, curE1=elem1_2)
-            was_sent_to_e2_e2, hairpins = self.send_to_elem2_elem2(info, j, stem1_start, \
-                                                                   stem2_start, stem_length, \
-                                                                   hairpins)
-            was_sent_to_e1_e2, hairpins = self.send_to_elem1_elem2(info, j, stem1_start, \
-                                                                   stem2_start, stem_length, \
-                                                                   hairpins, curE1=elem1_1)
-            if was_sent_to_e2_e1 or was_sent_to_e2_e2 or was_sent_to_e1_e2:
+            stem1_pos = stem1_start + j
+            stem2_pos = stem2_start + self.stem_out_bounds_len - 1 - j
+            if is_elem2[stem1_pos] and not is_elem2[stem2_pos]:
+                _, hairpins = self.send_to_elem2_elem1(info, j, stem1_start, stem2_start, \
+                                                       stem_length, hairpins, curE1=elem1_2)
+                return hairpins
+            if is_elem2[stem1_pos]:
+                _, hairpins = self.send_to_elem2_elem2(info, j, stem1_start, stem2_start, \
+                                                       stem_length, hairpins)
+                return hairpins
+            if is_elem2[stem2_pos]:
+                _, hairpins = self.send_to_elem1_elem2(info, j, stem1_start, stem2_start, \
+                                                       stem_length, hairpins, curE1=elem1_1)
                 return hairpins
 
-            stem1_start_pos = stem1_start % self.window_size
-            stem2_start_pos = stem2_start % self.window_size
-            
-
-            cur_stem1_pos = (stem1_start_pos + j) % self.window_size
-            cur_stem2_pos = (stem2_start_pos + self.stem_out_bounds_len - 1 - j) % self.window_size
+            cur_stem1_pos = window_pos[stem1_pos]
+            cur_stem2_pos = window_pos[stem2_pos]
 
             if cur_stem1_pos >= len(elem1_1) or cur_stem2_pos >= len(elem1_2):
                 if j == 0 and stem_length > 0:
                     hairpins.append(self.calculate_hairpin_log_score(stem_length))
                 continue
-            
+
             if elem1_1[cur_stem1_pos] == converse[elem1_2[cur_stem2_pos]]:
                 stem_length += 1
                 if j == 0:
@@ -476,23 +578,26 @@ class Hairpin:
                                   stem_length, hairpins):
         if hairpins == -np.inf:
             return hairpins
+        is_elem2 = info['layout'].is_elem2
+        window_pos = info['layout'].window_pos
         for j in range(curJ, -1, -1):
-            was_sent_to_e2_e1, hairpins = self.send_to_elem2_elem1(info, j, stem1_start, \
-                                                                stem2_start, stem_length, hairpins)
-            was_sent_to_e2_e2, hairpins = self.send_to_elem2_elem2(info, j, stem1_start, \
-                                                                stem2_start, stem_length, \
-                                                                hairpins, curE2_2=elem2)
-            was_sent_to_e1_e1, hairpins = self.send_to_elem1_elem1(info, j, stem1_start, \
-                                                                stem2_start, stem_length, \
-                                                                hairpins, curE1_1=elem1)
-            if was_sent_to_e2_e1 or was_sent_to_e2_e2 or was_sent_to_e1_e1:
+            stem1_pos = stem1_start + j
+            stem2_pos = stem2_start + self.stem_out_bounds_len - 1 - j
+            if is_elem2[stem1_pos] and not is_elem2[stem2_pos]:
+                _, hairpins = self.send_to_elem2_elem1(info, j, stem1_start, stem2_start, \
+                                                       stem_length, hairpins)
+                return hairpins
+            if is_elem2[stem1_pos]:
+                _, hairpins = self.send_to_elem2_elem2(info, j, stem1_start, stem2_start, \
+                                                       stem_length, hairpins, curE2_2=elem2)
+                return hairpins
+            if not is_elem2[stem2_pos]:
+                _, hairpins = self.send_to_elem1_elem1(info, j, stem1_start, stem2_start, \
+                                                       stem_length, hairpins, curE1_1=elem1)
                 return hairpins
 
-            stem1_start_pos = stem1_start % self.window_size
-            stem2_start_pos = stem2_start % self.window_size
-
-            cur_stem1_pos = (stem1_start_pos + j) % self.window_size
-            cur_stem2_pos = (stem2_start_pos + self.stem_out_bounds_len - 1 - j) % self.window_size
+            cur_stem1_pos = window_pos[stem1_pos]
+            cur_stem2_pos = window_pos[stem2_pos]
 
             if cur_stem1_pos >= len(elem1) or cur_stem2_pos - info['elem1Size'] >= len(elem2):
                 if j == 0 and stem_length > 0:
@@ -514,29 +619,32 @@ class Hairpin:
                                   stem_length, hairpins):
         if hairpins == -np.inf:
             return hairpins
+        is_elem2 = info['layout'].is_elem2
+        window_pos = info['layout'].window_pos
         for j in range(curJ, -1, -1):
-            was_sent_to_e1_e1, hairpins = self.send_to_elem1_elem1(info, j, stem1_start, \
-                                                                stem2_start, stem_length, \
-                                                                hairpins, curE1_2=elem1)
-            was_sent_to_e1_e2, hairpins = self.send_to_elem1_elem2(info, j, stem1_start, \
-                                                                stem2_start, stem_length, hairpins)
-            was_sent_to_e2_e2, hairpins = self.send_to_elem2_elem2(info, j, stem1_start, \
-                                                                stem2_start, stem_length, \
-                                                                hairpins, curE2_1=elem2)
-            if was_sent_to_e1_e1 or was_sent_to_e1_e2 or was_sent_to_e2_e2:
+            stem1_pos = stem1_start + j
+            stem2_pos = stem2_start + self.stem_out_bounds_len - 1 - j
+            if not (is_elem2[stem1_pos] or is_elem2[stem2_pos]):
+                _, hairpins = self.send_to_elem1_elem1(info, j, stem1_start, stem2_start, \
+                                                       stem_length, hairpins, curE1_2=elem1)
+                return hairpins
+            if not is_elem2[stem1_pos]:
+                _, hairpins = self.send_to_elem1_elem2(info, j, stem1_start, stem2_start, \
+                                                       stem_length, hairpins)
+                return hairpins
+            if is_elem2[stem2_pos]:
+                _, hairpins = self.send_to_elem2_elem2(info, j, stem1_start, stem2_start, \
+                                                       stem_length, hairpins, curE2_1=elem2)
                 return hairpins
 
-            stem1_start_pos = stem1_start % self.window_size
-            stem2_start_pos = stem2_start % self.window_size
-
-            cur_stem1_pos = (stem1_start_pos + j) % self.window_size
-            cur_stem2_pos = (stem2_start_pos + self.stem_out_bounds_len - 1 - j) % self.window_size
+            cur_stem1_pos = window_pos[stem1_pos]
+            cur_stem2_pos = window_pos[stem2_pos]
 
             if cur_stem2_pos >= len(elem1) or cur_stem1_pos - info['elem1Size'] >= len(elem2):
                 if j == 0 and stem_length > 0:
                     hairpins.append(self.calculate_hairpin_log_score(stem_length))
                 continue
-            
+
             if elem2[cur_stem1_pos - info['elem1Size']] == converse[elem1[cur_stem2_pos]]:
                 stem_length += 1
                 if j == 0:
@@ -553,27 +661,33 @@ class Hairpin:
                                   stem_length, hairpins):
         if hairpins == -np.inf:
             return hairpins
+        is_elem2 = info['layout'].is_elem2
+        window_pos = info['layout'].window_pos
         for j in range(curJ, -1, -1):
-            was_sent_to_e1_e1, hairpins = self.send_to_elem1_elem1(info, j, stem1_start, \
-                                                                stem2_start, stem_length, hairpins)
-            was_sent_to_e1_e2, hairpins = self.send_to_elem1_elem2(info, j, stem1_start, \
-                                                                stem2_start, stem_length, \
-                                                                hairpins, curE2=elem2_2)   
-            was_sent_to_e2_e1, hairpins = self.send_to_elem2_elem1(info, j, stem1_start, \
-                                                                stem2_start, stem_length, \
-                                                                hairpins, curE2=elem2_1)
-            if was_sent_to_e1_e1 or was_sent_to_e1_e2 or was_sent_to_e2_e1:
+            stem1_pos = stem1_start + j
+            stem2_pos = stem2_start + self.stem_out_bounds_len - 1 - j
+            if not (is_elem2[stem1_pos] or is_elem2[stem2_pos]):
+                _, hairpins = self.send_to_elem1_elem1(info, j, stem1_start, stem2_start, \
+                                                       stem_length, hairpins)
+                return hairpins
+            if not is_elem2[stem1_pos]:
+                _, hairpins = self.send_to_elem1_elem2(info, j, stem1_start, stem2_start, \
+                                                       stem_length, hairpins, curE2=elem2_2)
+                return hairpins
+            if not is_elem2[stem2_pos]:
+                _, hairpins = self.send_to_elem2_elem1(info, j, stem1_start, stem2_start, \
+                                                       stem_length, hairpins, curE2=elem2_1)
                 return hairpins
 
-            cur_stem1_pos = (stem1_start + j) % self.window_size
-            cur_stem2_pos = (stem2_start + self.stem_out_bounds_len - 1 - j) % self.window_size
+            cur_stem1_pos = window_pos[stem1_pos]
+            cur_stem2_pos = window_pos[stem2_pos]
 
             if cur_stem2_pos - info['elem1Size'] >= len(elem2_2) or \
                 cur_stem1_pos - info['elem1Size'] >= len(elem2_1):
                 if j == 0 and stem_length > 0:
                     hairpins.append(self.calculate_hairpin_log_score(stem_length))
                 continue
-            
+
             if elem2_1[cur_stem1_pos - info['elem1Size']] == converse[elem2_2[cur_stem2_pos - \
                                                                             info['elem1Size']]]:
                 stem_length += 1
@@ -589,7 +703,8 @@ class Hairpin:
 
     ##### Calculated Hairpin Log Scores #####
 
-    def backward_hairpin_log_score(self, cur_elem, elems1, elems2, is_key=False):
+    def backward_hairpin_log_score(self, cur_elem, elems1, elems2, is_key=False, \
+                                   elems1_index=None):
         """This function calculates the log score for backward hairpins with 
         the first stem containing the last added base to the currently being constructed
         sequence, for stem lengths between 1 and the boundary defined in the stem hairpin 
@@ -608,6 +723,9 @@ class Hairpin:
             set of already generated payloads otherwise.
         is_key: bool
             True if the sequence being currently generated is a key, False otherwise.
+        elems1_index: PairingIndex or None
+            Pairing index over `elems1`, used to skip the elements of `elems1` which 
+            cannot form a stem. If None, all elements of `elems1` are checked.
         
         Returns
         ----------
@@ -624,7 +742,8 @@ class Hairpin:
         for i in range(self.stem_out_bounds_len):
             stem1_start = len(cur_elem) - 1 - i
             hairpins = self.backward_hairpin_at_pos_log_score(cur_elem, elems1, elems2, \
-                                                            stem1_start, is_key=is_key)
+                                                            stem1_start, is_key=is_key, \
+                                                            elems1_index=elems1_index)
             if hairpins == -np.inf:
                 return -np.inf
             hairpin_log_score += np.sum(np.array(hairpins))
@@ -632,7 +751,8 @@ class Hairpin:
         return hairpin_log_score
 
     def backward_hairpin_at_pos_log_score(self, cur_elem, elems1, elems2, stem1_start, \
-                                             is_key=False, loop_size_min=-1, loop_size_max=-1):
+                                             is_key=False, loop_size_min=-1, loop_size_max=-1, \
+                                             elems1_index=None):
         """This function calculates the log score for backward hairpins with 
         the first stem starting at position stem1_start, and for loop lengths between 
         `loop_size_min` and `loop_size_max`, which were also defined in the inputted constraints.
@@ -649,6 +769,9 @@ class Hairpin:
             set of already generated payloads otherwise.
         is_key: bool
             True if the sequence being currently generated is a key, False otherwise.
+        elems1_index: PairingIndex or None
+            Pairing index over `elems1`, used to skip the elements of `elems1` which 
+            cannot form a stem. If None, all elements of `elems1` are checked.
         
         Returns
         ----------
@@ -662,6 +785,7 @@ class Hairpin:
             loop_size_min = self.loop_size_min
             loop_size_max = self.loop_size_max
 
+        layout = self.get_layout(is_key, stem1_start, loop_size_max)
         for loopSize in range(loop_size_min, loop_size_max + 1):
             stem2_start = stem1_start - loopSize - self.stem_out_bounds_len
 
@@ -676,7 +800,9 @@ class Hairpin:
                     'elems2': elems2, 
                     'elem2Size': elem2Size,
                     'isKey': is_key,
-                    'firstKey': -1
+                    'firstKey': -1,
+                    'elems1Index': elems1_index,
+                    'layout': layout
                     }
             _, hairpins = self.send_to_all_check(info, self.stem_out_bounds_len - 1, stem1_start, \
                                                     stem2_start, 0, hairpins)
@@ -687,7 +813,7 @@ class Hairpin:
 
     def forward_hairpin_at_pos_log_score(self, cur_elem, elems1, elems2, stem1_start, \
                                          first_key=-1, is_key=False, loop_size_min=-1, \
-                                         loop_size_max=-1):
+                                         loop_size_max=-1, elems1_index=None):
         """This function calculates the log score for forward hairpins with 
         the first stem starting at position stem1_start, and for loop lengths between 
         `loop_size_min` and `loop_size_max`, which were also defined in the inputted constraints.
@@ -704,6 +830,9 @@ class Hairpin:
             set of already generated payloads otherwise.
         is_key: bool
             True if the sequence being currently generated is a key, False otherwise.
+        elems1_index: PairingIndex or None
+            Pairing index over `elems1`, used to skip the elements of `elems1` which 
+            cannot form a stem. If None, all elements of `elems1` are checked.
         
         Returns
         ----------
@@ -717,6 +846,7 @@ class Hairpin:
             loop_size_min = self.loop_size_min
             loop_size_max = self.loop_size_max
 
+        layout = self.get_layout(is_key, stem1_start, loop_size_max)
         for loopSize in range(loop_size_min, loop_size_max + 1):
             stem2_start = stem1_start + loopSize + self.stem_out_bounds_len
             
@@ -731,7 +861,9 @@ class Hairpin:
                     'elems2': elems2, 
                     'elem2Size': elem2Size,
                     'isKey': is_key,
-                    'firstKey': first_key
+                    'firstKey': first_key,
+                    'elems1Index': elems1_index,
+                    'layout': layout
                     }
             _, hairpins = self.send_to_all_check(info, self.stem_out_bounds_len - 1, stem1_start, \
                                                     stem2_start, 0, hairpins)
@@ -740,7 +872,8 @@ class Hairpin:
 
         return hairpins
 
-    def forward_hairpin_log_score(self, cur_elem, elems1, elems2, is_key=False):
+    def forward_hairpin_log_score(self, cur_elem, elems1, elems2, is_key=False, \
+                                  elems1_index=None):
         """This function calculates the log score for forward hairpins with 
         the first stem containing the last added base to the currently being constructed
         sequence, for stem lengths between 1 and the boundary defined in the stem hairpin 
@@ -759,6 +892,9 @@ class Hairpin:
             set of already generated payloads otherwise.
         is_key: bool
             True if the sequence being currently generated is a key, False otherwise.
+        elems1_index: PairingIndex or None
+            Pairing index over `elems1`, used to skip the elements of `elems1` which 
+            cannot form a stem. If None, all elements of `elems1` are checked.
         
         Returns
         ----------
@@ -774,7 +910,8 @@ class Hairpin:
         for i in range(self.stem_out_bounds_len):
             stem1_start = len(cur_elem) - 1 - i
             hairpins = self.forward_hairpin_at_pos_log_score(cur_elem, elems1, elems2, stem1_start, \
-                                                                                    is_key=is_key)
+                                                             is_key=is_key, \
+                                                             elems1_index=elems1_index)
             if hairpins == -np.inf:
                 return -np.inf
             hairpin_log_score += np.sum(np.array(hairpins))
@@ -785,9 +922,13 @@ class Hairpin:
     def validate_hairpin(self, keys, payloads):
         if len(payloads) == 0 or len(keys) == 0:
             return False
+        payloads_index = PairingIndex(self.payload_size, self.stem_out_bounds_len)
+        for payload in payloads:
+            payloads_index.add_elem(payload)
         for payload in payloads:
             for i in range(self.payload_size):
-                if self.forward_hairpin_at_pos_log_score(payload, payloads, keys, i) == -np.inf:
+                if self.forward_hairpin_at_pos_log_score(payload, payloads, keys, i, \
+                                                elems1_index=payloads_index) == -np.inf:
                     return False
 
         for key in keys:
@@ -0,0 +1,39 @@
+class HairpinLayout:
+    def __init__(self, window_size, elem1_size, key_size, is_key, max_pos):
+        self.window_size = window_size
+        self.elem1_size = elem1_size
+        self.key_size = key_size
+        self.is_key = is_key
+        self.max_pos = max_pos
+
+        # Every table is indexed directly by position, for positions between -max_pos and
+        # max_pos - 1. Negative positions are stored at the end, where Python's negative
+        # indexing finds them.
+        positions = list(range(0, max_pos)) + list(range(-max_pos, 0))
+
+        # Position within the window
+        self.window_pos = [pos % window_size for pos in positions]
+
+        # True if the position falls in an element of the opposite type of the current one
+        self.is_elem2 = [pos % window_size >= elem1_size for pos in positions]
+
+        # Positions with the same window id are in the same window
+        self.window_id = [self.get_window_id(pos) for pos in positions]
+
+        # Number of windows between the first key and the key at the position
+        self.key_window = [self.get_key_window(pos) for pos in positions]
+
+    def get_window_id(self, pos):
+        if pos < 0:
+            return 2 * int((pos - 1) / self.window_size) + 1
+        return 2 * int(pos / self.window_size)
+
+    def get_key_window(self, pos):
+        if not self.is_key:
+            pos = pos + self.key_size
+        if pos < 0:
+            pos = pos - self.key_size
+        return int(pos / self.window_size)
+
+    def contains(self, pos):
+        return -self.max_pos <= pos < self.max_pos
@@ -0,0 +1,143 @@
+import numpy as np
+from dna_language_specification.language import nucleotides
+
+
+class MotifSetValidator:
+    # Codes follow the order of `nucleotides`, so that the complement of a code is code ^ 1
+    codes = {nucleotides[i]: i for i in range(len(nucleotides))}
+
+    def __init__(self, constraints):
+        self.max_hom = constraints.max_hom
+        self.min_gc = constraints.min_gc
+        self.max_gc = constraints.max_gc
+        self.stem_out_bounds_len = constraints.max_hairpin + 1
+        self.loop_size_min = constraints.loop_size_min
+        self.loop_size_max = constraints.loop_size_max
+
+        # Lookup table from byte to code, 255 for anything which is not a nucleotide
+        self.lookup = np.full(256, 255, dtype=np.uint8)
+        for b in self.codes:
+            self.lookup[ord(b)] = self.codes[b]
+
+    def encode(self, motifs):
+        """This function encodes motifs of the same length as a matrix of nucleotide codes.
+
+        Parameters
+        ----------
+        motifs: list of str
+            Motifs, all of the same length.
+
+        Returns
+        ----------
+        matrix: np.ndarray of np.uint8
+            One row per motif, one column per position.
+        """
+        if not motifs:
+            return np.zeros((0, 0), dtype=np.uint8)
+        motif_size = len(motifs[0])
+        assert(all([len(motif) == motif_size for motif in motifs]))
+        data = np.frombuffer(''.join(motifs).encode('ascii'), dtype=np.uint8)
+        matrix = self.lookup[data].reshape(len(motifs), motif_size)
+        assert((matrix != 255).all())
+        return matrix
+
+    ### Constraint Checks ###
+
+    def max_homopolymer_lengths(self, matrix):
+        num, size = matrix.shape
+        if size == 0:
+            return np.zeros(num, dtype=int)
+        positions = np.arange(size)
+
+        # Position where the current homopolymer started, for each position
+        is_start = np.ones(matrix.shape, dtype=bool)
+        is_start[:, 1:] = matrix[:, 1:] != matrix[:, :-1]
+        starts = np.maximum.accumulate(np.where(is_start, positions, 0), axis=1)
+        return (positions - starts + 1).max(axis=1)
+
+    def gc_contents(self, matrix):
+        if matrix.shape[1] == 0:
+            return np.zeros(matrix.shape[0])
+        is_gc = (matrix == self.codes['G']) | (matrix == self.codes['C'])
+        return 100 * is_gc.sum(axis=1) / matrix.shape[1]
+
+    def hairpins(self, matrix):
+        """This function finds, in every motif, the stems of length `max_hairpin` + 1 which
+        are the reverse complement of another stem of the same motif, separated by a loop
+        of size between `loop_size_min` and `loop_size_max`.
+
+        Parameters
+        ----------
+        matrix: np.ndarray of np.uint8
+            Encoded motifs.
+
+        Returns
+        ----------
+        hairpins: list of (int, int, int)
+            Index of the motif, start of the first stem and loop size of every hairpin.
+        """
+        num, size = matrix.shape
+        stem_len = self.stem_out_bounds_len
+        complement = matrix ^ 1
+        hairpins = []
+        for loop_size in range(self.loop_size_min, self.loop_size_max + 1):
+            stem1_num = size - 2 * stem_len - loop_size + 1
+            if stem1_num <= 0:
+                break
+            is_stem = np.ones((num, stem1_num), dtype=bool)
+            for k in range(stem_len):
+                # Base k of the first stem pairs with base stem_len - 1 - k of the second
+                stem2_pos = stem_len + loop_size + stem_len - 1 - k
+                is_stem &= complement[:, k:k + stem1_num] == \
+                           matrix[:, stem2_pos:stem2_pos + stem1_num]
+            for motif_index, stem1_start in zip(*np.nonzero(is_stem)):
+                hairpins.append((int(motif_index), int(stem1_start), loop_size))
+        return hairpins
+
+    ### Validate ###
+
+    def validate(self, motifs):
+        """This function checks the homopolymer, GC-content and hairpin constraints on
+        every motif of a set at once.
+
+        Parameters
+        ----------
+        motifs: set or list of str
+            Motifs, all of the same length.
+
+        Returns
+        ----------
+        reports: list of dict
+            For each motif, in the order of `motifs` (sorted if it is a set), the 'motif',
+            its 'maxHom', its 'gcContent', its 'hairpins' as (first stem start, loop size)
+            pairs, and the 'violations', the list of the constraints it does not conform
+            to among 'hom', 'gcContent' and 'hairpin'.
+        """
+        motifs = sorted(motifs) if isinstance(motifs, (set, frozenset)) else list(motifs)
+        matrix = self.encode(motifs)
+        max_homs = self.max_homopolymer_lengths(matrix)
+        gc_contents = self.gc_contents(matrix)
+
+        motif_hairpins = [[] for _ in motifs]
+        for motif_index, stem1_start, loop_size in self.hairpins(matrix):
+            motif_hairpins[motif_index].append((stem1_start, loop_size))
+
+        reports = []
+        for i in range(len(motifs)):
+            violations = []
+            if max_homs[i] > self.max_hom:
+                violations.append('hom')
+            if gc_contents[i] < self.min_gc or gc_contents[i] > self.max_gc:
+                violations.append('gcContent')
+            if motif_hairpins[i]:
+                violations.append('hairpin')
+            reports.append({'motif': motifs[i],
+                            'maxHom': int(max_homs[i]),
+                            'gcContent': float(gc_contents[i]),
+                            'hairpins': motif_hairpins[i],
+                            'violations': violations
+                            })
+        return reports
+
+    def is_valid(self, motifs):
+        return all([not report['violations'] for report in self.validate(motifs)])
@@ -0,0 +1,80 @@
+from dna_language_specification.packed_sequence import PackedSequence, kmer_word
+
+
+class PairingIndex:
+    def __init__(self, elem_size, max_kmer_size):
+        self.elem_size = elem_size
+        self.max_kmer_size = max_kmer_size
+
+        # Elements in insertion order
+        self.elems = []
+
+        # For each position, word of the k-mer starting at that position (see `kmer_word`)
+        # -> elements containing it
+        self.kmers = [{} for _ in range(elem_size)]
+
+    def __len__(self):
+        return len(self.elems)
+
+    def add_elem(self, new_elem):
+        """This function adds `new_elem` to the index, registering every k-mer of length
+        1 to `max_kmer_size` at the position where it starts in `new_elem`.
+
+        Parameters
+        ----------
+        new_elem: str
+            Already generated key or payload of size `elem_size`.
+        """
+        if len(new_elem) != self.elem_size:
+            return False
+        packed_elem = PackedSequence(new_elem)
+        self.elems.append(new_elem)
+        for pos in range(self.elem_size):
+            kmer_size_max = min(self.max_kmer_size, self.elem_size - pos)
+            # All k-mers starting at pos share the bits of the longest one
+            word = packed_elem.word(pos, kmer_size_max)
+            for kmer_size in range(1, kmer_size_max + 1):
+                kmer = (word & ((1 << (2 * kmer_size)) - 1)) | (1 << (2 * kmer_size))
+                self.kmers[pos].setdefault(kmer, []).append(new_elem)
+
+    def remove_elem(self, old_elem):
+        if old_elem not in self.elems:
+            return False
+        self.elems.remove(old_elem)
+        for pos in range(self.elem_size):
+            for kmer in list(self.kmers[pos]):
+                elems = self.kmers[pos][kmer]
+                if old_elem in elems:
+                    elems.remove(old_elem)
+                    if not elems:
+                        del self.kmers[pos][kmer]
+        return True
+
+    def get_elems_with_kmer(self, pos, kmer):
+        """This function returns the indexed elements containing `kmer` starting at
+        position `pos`.
+
+        Parameters
+        ----------
+        pos: int
+            Position within the element at which `kmer` starts.
+        kmer: str
+            Sequence of at most `max_kmer_size` bases. If empty, all indexed elements
+            are returned.
+
+        Returns
+        ----------
+        elems: list of str
+            Indexed elements containing `kmer` at position `pos`, in insertion order.
+        """
+        if not kmer:
+            return self.elems
+        return self.get_elems_with_word(pos, kmer_word(kmer), len(kmer))
+
+    def get_elems_with_word(self, pos, word, kmer_size):
+        # Same as get_elems_with_kmer, for a k-mer already packed by `kmer_word`
+        if kmer_size == 0:
+            return self.elems
+        if pos < 0 or pos + kmer_size > self.elem_size:
+            return []
+        return self.kmers[pos].get(word, [])
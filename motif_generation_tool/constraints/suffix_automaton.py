@@ -0,0 +1,123 @@
+from dna_language_specification.language import nucleotides
+from dna_language_specification.base_set import base_codes
+
+
+class SuffixAutomaton:
+    def __init__(self, elems=()):
+        # State 0 is the root, standing for the empty string. For each state, length of the
+        # longest substring ending in it, suffix link and transition by base code (-1 if none)
+        self.lengths = [0]
+        self.links = [-1]
+        self.transitions = [[-1] * len(nucleotides)]
+
+        for elem in elems:
+            last = 0
+            for b in elem:
+                last = self.extend(last, base_codes[b])
+
+        # For each state and base code, state reached and length matched when the base is
+        # missing from the state, after following the suffix links
+        self.fallbacks = [[self.get_fallback(state, code) for code in range(len(nucleotides))] \
+                          for state in range(len(self.lengths))]
+
+    def __len__(self):
+        return len(self.lengths)
+
+    ### Build Automaton ###
+
+    def add_state(self, length, link=-1, transitions=None):
+        self.lengths.append(length)
+        self.links.append(link)
+        self.transitions.append(list(transitions) if transitions is not None \
+                                else [-1] * len(nucleotides))
+        return len(self.lengths) - 1
+
+    def clone_state(self, p, q, code):
+        # Splits q, so that the substrings of q reached from p by `code` get their own state
+        clone = self.add_state(self.lengths[p] + 1, self.links[q], self.transitions[q])
+        while p != -1 and self.transitions[p][code] == q:
+            self.transitions[p][code] = clone
+            p = self.links[p]
+        self.links[q] = clone
+        return clone
+
+    def extend(self, last, code):
+        """This function appends the base `code` to the element ending in state `last`,
+        keeping the automaton of all the substrings of all the elements added so far.
+
+        Parameters
+        ----------
+        last: int
+            State of the element added so far, 0 for a new element.
+        code: int
+            Code of the appended base, see `base_codes`.
+
+        Returns
+        ----------
+        last: int
+            State of the element with `code` appended.
+        """
+        q = self.transitions[last][code]
+        if q != -1:
+            # Another element already contains the extended element
+            if self.lengths[q] == self.lengths[last] + 1:
+                return q
+            return self.clone_state(last, q, code)
+
+        cur = self.add_state(self.lengths[last] + 1)
+        p = last
+        while p != -1 and self.transitions[p][code] == -1:
+            self.transitions[p][code] = cur
+            p = self.links[p]
+        if p == -1:
+            self.links[cur] = 0
+            return cur
+        q = self.transitions[p][code]
+        if self.lengths[q] == self.lengths[p] + 1:
+            self.links[cur] = q
+        else:
+            self.links[cur] = self.clone_state(p, q, code)
+        return cur
+
+    def get_fallback(self, state, code):
+        p = self.links[state]
+        while p != -1:
+            if self.transitions[p][code] != -1:
+                return self.transitions[p][code], self.lengths[p] + 1
+            p = self.links[p]
+        return 0, 0
+
+    ### Match Sequences ###
+
+    def step(self, state, length, base):
+        """This function appends `base` to a sequence whose longest suffix found in the
+        elements has length `length` and ends in `state`.
+
+        Parameters
+        ----------
+        state: int
+            State of the longest suffix of the sequence found in the elements.
+        length: int
+            Length of that suffix.
+        base: str
+            Appended nucleotide.
+
+        Returns
+        ----------
+        state: int
+            State of the longest suffix of the extended sequence found in the elements.
+        length: int
+            Length of that suffix, 0 if `base` is in none of the elements.
+        """
+        code = base_codes[base]
+        next_state = self.transitions[state][code]
+        if next_state != -1:
+            return next_state, length + 1
+        return self.fallbacks[state][code]
+
+    def longest_suffix_match(self, seq):
+        # Length of the longest suffix of `seq` which is a substring of an element
+        state, length = 0, 0
+        for b in seq:
+            state, length = self.step(state, length, b)
+        return length
@@ -0,0 +1,73 @@
+import numpy as np
+from .language import nucleotides
+
+# A set of nucleotides is a 4-bit mask, bit i standing for nucleotides[i]
+base_bits = {nucleotides[i]: 1 << i for i in range(len(nucleotides))}
+base_codes = {nucleotides[i]: i for i in range(len(nucleotides))}
+full_set = (1 << len(nucleotides)) - 1
+
+# Number of nucleotides in each set
+popcount = [bin(mask).count('1') for mask in range(full_set + 1)]
+
+
+def build_similar_table():
+    # The similarity constraint used to store the set of bases seen at a position as a sum
+    # of powers of ten, and calls a position similar when adding the new base to that sum
+    # reaches 1111. The table keeps that rule for every set and base.
+    table = np.zeros((full_set + 1, len(nucleotides)), dtype=bool)
+    for mask in range(full_set + 1):
+        decimal = sum([10**i for i in range(len(nucleotides)) if mask & (1 << i)])
+        for code in range(len(nucleotides)):
+            table[mask, code] = decimal + 10**code >= 1111
+    return table
+
+similar_table = build_similar_table()
+
+# Same table as nested lists, faster than NumPy for a single lookup
+similar_lists = similar_table.tolist()
+
+# Lookup table from byte to code, 255 for anything which is not a nucleotide
+code_lookup = np.full(256, 255, dtype=np.uint8)
+for b in nucleotides:
+    code_lookup[ord(b)] = base_codes[b]
+
+
+def encode(seq):
+    return code_lookup[np.frombuffer(seq.encode('ascii'), dtype=np.uint8)]
+
+# Below this many positions, a Python loop scans a window faster than NumPy
+vectorize_min_window = 32
+
+def similarity_window_size(used_bases, seq, positions):
+    """This function counts how many positions of `seq`, walking `positions` in order,
+    are similar to the sets of bases already used at those positions, up to the first
+    position which is not.
+
+    Parameters
+    ----------
+    used_bases: np.ndarray of np.uint8
+        Set of bases used at each position, as a 4-bit mask.
+    seq: str
+        Sequence being currently generated.
+    positions: range
+        Positions to check, in order. Negative positions index from the end, both in
+        `used_bases` and in `seq`.
+
+    Returns
+    ----------
+    window_size: int
+        Number of consecutive similar positions at the start of `positions`.
+    """
+    if len(positions) < vectorize_min_window:
+        window_size = 0
+        for pos in positions:
+            if not similar_lists[used_bases[pos]][base_codes[seq[pos]]]:
+                break
+            window_size += 1
+        return window_size
+
+    positions = np.asarray(positions)
+    is_similar_pos = similar_table[used_bases[positions], encode(seq)[positions]]
+    if is_similar_pos.all():
+        return len(positions)
+    return int(np.argmin(is_similar_pos))
@@ -0,0 +1,103 @@
+import numpy as np
+from .language import nucleotides, converse
+
+# Every base takes 2 bits, 4 bases per byte. Base i of a sequence is stored in byte i // 4,
+# at bit 2 * (i % 4), so that the first base of a word is in its lowest bits.
+BITS_PER_BASE = 2
+BASES_PER_BYTE = 4
+
+codes = {nucleotides[i]: i for i in range(len(nucleotides))}
+
+# Code of the base pairing with each nucleotide
+pairing_codes = {b: codes[converse[b]] for b in nucleotides}
+
+
+def pack_word(seq):
+    """This function packs a short sequence into an integer word, 2 bits per base, with
+    the first base in the lowest bits.
+
+    Parameters
+    ----------
+    seq: str
+        Sequence of nucleotides.
+
+    Returns
+    ----------
+    word: int
+        Packed sequence. Sequences of different lengths can share a word.
+    """
+    word = 0
+    for i in range(len(seq)):
+        word |= codes[seq[i]] << (BITS_PER_BASE * i)
+    return word
+
+def kmer_word(seq):
+    # Leading 1 bit above the packed bases, so that k-mers of different lengths never
+    # share a word
+    return pack_word(seq) | (1 << (BITS_PER_BASE * len(seq)))
+
+
+class PackedSequence:
+    __slots__ = ('data', 'length')
+
+    def __init__(self, seq=''):
+        self.length = len(seq)
+        self.data = np.zeros((len(seq) + BASES_PER_BYTE - 1) // BASES_PER_BYTE, dtype=np.uint8)
+        if seq:
+            seq_codes = np.array([codes[b] for b in seq], dtype=np.uint8)
+            seq_codes = np.pad(seq_codes, (0, len(self.data) * BASES_PER_BYTE - len(seq)))
+            seq_codes = seq_codes.reshape(-1, BASES_PER_BYTE)
+            shifts = np.arange(BASES_PER_BYTE, dtype=np.uint8) * BITS_PER_BASE
+            self.data = np.bitwise_or.reduce(seq_codes << shifts, axis=1).astype(np.uint8)
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        return ''.join([nucleotides[self.code(i)] for i in range(self.length)])
+
+    def __repr__(self):
+        return 'PackedSequence({!r})'.format(str(self))
+
+    def __eq__(self, other):
+        if not isinstance(other, PackedSequence):
+            return NotImplemented
+        return self.length == other.length and bytes(self.data) == bytes(other.data)
+
+    def __getitem__(self, pos):
+        if pos < 0:
+            pos += self.length
+        if not 0 <= pos < self.length:
+            raise IndexError('PackedSequence index out of range')
+        return nucleotides[self.code(pos)]
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def code(self, pos):
+        return (int(self.data[pos // BASES_PER_BYTE]) >> \
+                (BITS_PER_BASE * (pos % BASES_PER_BYTE))) & 3
+
+    def word(self, start, size):
+        """This function returns the bases from `start` to `start + size` as an integer
+        word, in the format of `pack_word`, so that stems can be compared as integers.
+
+        Parameters
+        ----------
+        start: int
+            Position of the first base.
+        size: int
+            Number of bases.
+
+        Returns
+        ----------
+        word: int
+            Packed bases, the base at `start` in the lowest bits.
+        """
+        assert(0 <= start and start + size <= self.length)
+        first_byte = start // BASES_PER_BYTE
+        last_byte = (start + size + BASES_PER_BYTE - 1) // BASES_PER_BYTE
+        bits = int.from_bytes(self.data[first_byte:last_byte].tobytes(), 'little')
+        bits >>= BITS_PER_BASE * (start % BASES_PER_BYTE)
+        return bits & ((1 << (BITS_PER_BASE * size)) - 1)
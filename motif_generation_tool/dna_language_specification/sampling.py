@@ -0,0 +1,37 @@
+from .language import nucleotides
+
+
+def sample_nucleotide(rng, p):
+    """This function draws a nucleotide with probabilities proportional to `p`, by 
+    inverting the cumulative distribution of `p` at a single uniform draw of `rng`.
+    
+    Parameters
+    ----------
+    rng: np.random.Generator
+        Random number generator the draw is taken from.
+    p: list or np.ndarray of float
+        Non-negative weight of each nucleotide, in the order of `nucleotides`, with at 
+        least one positive weight. It does not need to be normalised.
+    
+    Returns
+    ----------
+    nucleotide: str
+        Drawn nucleotide. Nucleotides with a weight of 0 are never drawn.
+    """
+    total = 0
+    for weight in p:
+        total += weight
+    threshold = rng.random() * total
+
+    cumulative = 0
+    last_index = 0
+    for index in range(len(nucleotides)):
+        if p[index] <= 0:
+            continue
+        cumulative += p[index]
+        if threshold < cumulative:
+            return nucleotides[index]
+        last_index = index
+
+    # Rounding left the threshold at the very end of the distribution
+    return nucleotides[last_index]
@@ -0,0 +1,160 @@
+from collections import Counter, defaultdict
+from dna_language_specification.language import nucleotides
+import threading
+
+
+class GenerationStats:
+    def __init__(self):
+        # The statistics of a server are recorded and merged by several threads at once,
+        # while /metrics exports them
+        self.lock = threading.Lock()
+        self.clear_counters()
+
+    def clear_counters(self):
+        # (kind, constraint) -> number of scored bases and time spent scoring them, where
+        # kind is 'key' or 'payload'
+        self.constraint_calls = Counter()
+        self.constraint_time = defaultdict(float)
+
+        # (kind, is_success) -> number of build_key or build_payload calls, and kind -> time
+        self.builds = Counter()
+        self.build_time = defaultdict(float)
+
+        # (kind, position) -> number of dead ends, and (kind, cause) -> number of bases
+        # ruled out at a dead end by that cause
+        self.dead_ends = Counter()
+        self.dead_end_causes = Counter()
+
+    ### Record ###
+
+    def add_constraint_call(self, kind, constraint, duration):
+        with self.lock:
+            self.constraint_calls[(kind, constraint)] += 1
+            self.constraint_time[(kind, constraint)] += duration
+
+    def add_build(self, kind, is_success, duration):
+        with self.lock:
+            self.builds[(kind, is_success)] += 1
+            self.build_time[kind] += duration
+
+    def add_dead_end(self, kind, pos, blocked_by, excluded):
+        """This function records a dead end, where no base could be appended at `pos`.
+
+        Parameters
+        ----------
+        kind: str
+            'key' or 'payload'.
+        pos: int
+            Position of the dead end.
+        blocked_by: list of str or None
+            For each nucleotide, the constraint whose log score was -inf, or 'completions'
+            if the counting sampler found no way of completing the payload, if any.
+        excluded: np.ndarray of bool
+            For each nucleotide, True if backtracking had already excluded it.
+        """
+        causes = []
+        for index in range(len(nucleotides)):
+            if excluded[index]:
+                causes.append('backtrack')
+            elif blocked_by[index] is not None:
+                causes.append(blocked_by[index])
+            else:
+                # The log score was finite, but too low for its exponential
+                causes.append('underflow')
+        with self.lock:
+            self.dead_ends[(kind, pos)] += 1
+            for cause in causes:
+                self.dead_end_causes[(kind, cause)] += 1
+
+    def reset(self):
+        with self.lock:
+            self.clear_counters()
+
+    ### Export ###
+
+    def to_dict(self):
+        """This function returns the recorded statistics as nested dictionaries, which can
+        be serialised as JSON.
+
+        Returns
+        ----------
+        stats: dict
+            'constraints': kind -> constraint -> 'calls' and 'seconds'.
+            'builds': kind -> 'successes', 'failures' and 'seconds'.
+            'deadEnds': kind -> 'positions', position -> count, and 'causes', cause ->
+            count, the cause being a constraint, 'completions', 'backtrack' or 'underflow'.
+        """
+        with self.lock:
+            stats = {'constraints': {}, 'builds': {}, 'deadEnds': {}}
+            for (kind, constraint), calls in self.constraint_calls.items():
+                stats['constraints'].setdefault(kind, {})[constraint] = {
+                    'calls': calls,
+                    'seconds': self.constraint_time[(kind, constraint)]
+                    }
+            for kind in self.build_time:
+                stats['builds'][kind] = {'successes': self.builds[(kind, True)],
+                                         'failures': self.builds[(kind, False)],
+                                         'seconds': self.build_time[kind]
+                                         }
+            for (kind, pos), count in self.dead_ends.items():
+                dead_ends = stats['deadEnds'].setdefault(kind, {'positions': {}, 'causes': {}})
+                dead_ends['positions'][str(pos)] = count
+            for (kind, cause), count in self.dead_end_causes.items():
+                dead_ends = stats['deadEnds'].setdefault(kind, {'positions': {}, 'causes': {}})
+                dead_ends['causes'][cause] = count
+        return stats
+
+    def merge_dict(self, stats):
+        # Adds statistics exported by to_dict, for instance in another process
+        with self.lock:
+            for kind, constraints in stats['constraints'].items():
+                for constraint, entry in constraints.items():
+                    self.constraint_calls[(kind, constraint)] += entry['calls']
+                    self.constraint_time[(kind, constraint)] += entry['seconds']
+            for kind, entry in stats['builds'].items():
+                self.builds[(kind, True)] += entry['successes']
+                self.builds[(kind, False)] += entry['failures']
+                self.build_time[kind] += entry['seconds']
+            for kind, dead_ends in stats['deadEnds'].items():
+                for pos, count in dead_ends['positions'].items():
+                    self.dead_ends[(kind, int(pos))] += count
+                for cause, count in dead_ends['causes'].items():
+                    self.dead_end_causes[(kind, cause)] += count
+
+    def to_prometheus(self, prefix='motif_generation'):
+        # Text exposition format of Prometheus, for a /metrics endpoint
+        lines = []
+        def add_metric(name, metric_type, help_text, samples):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help_text))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, metric_type))
+            for labels, value in samples:
+                label_text = ','.join(['{}="{}"'.format(k, v) for k, v in labels])
+                lines.append('{}_{}{{{}}} {}'.format(prefix, name, label_text, value))
+
+        # Sorted copies of the counters, taken at once
+        with self.lock:
+            constraint_calls = sorted(self.constraint_calls.items())
+            constraint_time = sorted(self.constraint_time.items())
+            builds = sorted(self.builds.items())
+            build_time = sorted(self.build_time.items())
+            dead_ends = sorted(self.dead_ends.items())
+            dead_end_causes = sorted(self.dead_end_causes.items())
+
+        add_metric('constraint_calls_total', 'counter', 'Bases scored per constraint.', \
+                   [((('kind', kind), ('constraint', constraint)), calls) \
+                    for (kind, constraint), calls in constraint_calls])
+        add_metric('constraint_seconds_total', 'counter', 'Time spent scoring per constraint.', \
+                   [((('kind', kind), ('constraint', constraint)), seconds) \
+                    for (kind, constraint), seconds in constraint_time])
+        add_metric('builds_total', 'counter', 'Keys and payloads built or failed.', \
+                   [((('kind', kind), ('result', 'success' if is_success else 'failure')), \
+                     count) for (kind, is_success), count in builds])
+        add_metric('build_seconds_total', 'counter', 'Time spent building keys and payloads.', \
+                   [((('kind', kind),), seconds) for kind, seconds in build_time])
+        add_metric('dead_ends_total', 'counter', 'Dead ends per position.', \
+                   [((('kind', kind), ('position', pos)), count) \
+                    for (kind, pos), count in dead_ends])
+        add_metric('dead_end_causes_total', 'counter', 'Bases ruled out at dead ends per cause.',\
+                   [((('kind', kind), ('cause', cause)), count) \
+                    for (kind, cause), count in dead_end_causes])
+        return '\n'.join(lines) + '\n'
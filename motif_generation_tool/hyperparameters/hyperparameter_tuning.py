@@ -1,11 +1,54 @@
 from constraints.constraints import Constraints
 from .hyperparameters import Hyperparameters
+from .result_store import HyperparameterResultStore, get_run_id
 from key_payload_builder import KeyPayloadBuilder
 
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
 import numpy as np
+import itertools
+import asyncio
+import math
 import time
 import os
 
+
+def round_task(number_of_runs, constraints, shapes, weights, with_constraints):
+    # Runs in a worker process
+    hyp_tuning = HyperparameterTuning(number_of_runs)
+    start = time.time()
+    total_successes = asyncio.run(hyp_tuning.round(constraints, Hyperparameters(shapes, weights),\
+                                                   with_constraints))
+    return shapes, weights, total_successes, time.time() - start
+
+
+def split_runs(runs, parts):
+    # `runs` split into at most `parts` near-equal positive numbers of runs
+    parts = min(parts, runs)
+    return [runs // parts + (1 if i < runs % parts else 0) for i in range(parts)]
+
+
+def success_rate_bounds(successes, runs, confidence):
+    """This function returns the Wilson score interval of the success rate of a
+    configuration which succeeded `successes` times out of `runs`.
+    
+    Returns
+    ----------
+    lower_bound: float
+        Lower bound of the success rate.
+    upper_bound: float
+        Upper bound of the success rate.
+    """
+    if runs == 0:
+        return 0, 1
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    rate = successes / runs
+    denominator = 1 + z**2 / runs
+    center = (rate + z**2 / (2 * runs)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / runs + z**2 / (4 * runs**2)) / denominator
+    return max(0, center - margin), min(1, center + margin)
+
+
 class HyperparameterTuning:
     def __init__(self, number_of_runs=100):
         self.number_of_runs = number_of_runs
@@ -29,74 +72,185 @@ class HyperparameterTuning:
             totalSuccesses += 1 if valid else 0
         return totalSuccesses
     
-    async def grid_search(self, constraints, shape_values, weight_values, with_constraints):
+    def get_grid_tasks(self, shape_values, weight_values):
+        """This function expands the hyperparameter values into the list of all of their
+        combinations.
+        
+        Returns
+        ----------
+        tasks: list of (dict str: int/float, dict str: int/float)
+            Shapes and weights of every combination.
+        """
+        constraints = ['hom', 'hairpin', 'similarity', 'noKeyInPayload', 'gcContent']
+        values = []
+        for constraint in constraints:
+            values.append([1] if not constraint in shape_values else shape_values[constraint])
+            values.append([1] if not constraint in weight_values else weight_values[constraint])
+
+        tasks = []
+        for combination in itertools.product(*values):
+            shapes = {}
+            weights = {}
+            for i in range(len(constraints)):
+                shapes[constraints[i]] = combination[2 * i]
+                weights[constraints[i]] = combination[2 * i + 1]
+            tasks.append((shapes, weights))
+        return tasks
+
+    async def grid_search(self, constraints, shape_values, weight_values, with_constraints, \
+                          workers=None, store_path=None):
         """This function takes a set of possible hyperparameter values and tries out all
-        of their combinations. It stores the results in the file hypTun.txt.
+        of their combinations, spread over a pool of `workers` processes. Results are stored
+        in a result store keyed by the constraints, the number of runs and the
+        hyperparameters, so that an interrupted search resumes from the combinations which
+        have not been tried yet.
+        
+        Parameters
+        ----------
+        shape_values: dict str: list int/float
+            Dictionary of constraints to the values we want to try the shape hyperparameters 
+            corresponding to each constraint for. Constraints are 'hairpin', 'hom', 'similarity',
+            'gcContent', 'noKeyInPayload'.
+        weight_values: dict str: list int/float
+            Dictionary of constraints to the values we want to try the weight hyperparameters 
+            corresponding to each constraint for. Constraints are 'hairpin', 'hom', 'similarity',
+            'gcContent', 'noKeyInPayload'.
+        with_constraints: set of str
+            Set of strings containing a selection of the following constraints: 
+            'hairpin', 'hom', 'gcContent', 'noKeyInPayload'. Those will be the constraints 
+            that the palyoads and keys will have to conform to.
+        workers: int or None
+            Number of worker processes. If None, the number of processors is used.
+        store_path: str or None
+            Path of the SQLite result store. If None, hypTun.sqlite in the hyperparameters
+            folder is used.
+        
+        Returns
+        ----------
+        store: HyperparameterResultStore
+            Store holding the results of all combinations.
+        """
+        if store_path is None:
+            store_path = os.path.join(os.path.dirname(__file__), "hypTun.sqlite")
+        store = HyperparameterResultStore(store_path, get_run_id(constraints, with_constraints, \
+                                                                 self.number_of_runs))
+
+        completed_keys = store.get_completed_keys()
+        tasks = [(shapes, weights) for shapes, weights \
+                 in self.get_grid_tasks(shape_values, weight_values) \
+                 if store.get_key(shapes, weights) not in completed_keys]
+        print('remaining combinations: ', len(tasks))
+
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [loop.run_in_executor(executor, round_task, self.number_of_runs, \
+                                            constraints, shapes, weights, with_constraints) \
+                       for shapes, weights in tasks]
+            for future in asyncio.as_completed(futures):
+                shapes, weights, total_successes, duration = await future
+                print('time: ', duration)
+                print('total successes: ', total_successes)
+                store.add_result(shapes, weights, self.number_of_runs, total_successes, duration)
+        return store
+
+
+    async def successive_halving(self, constraints, shape_values, weight_values, \
+                                 with_constraints, initial_runs=5, eta=2, confidence=0.95, \
+                                 workers=None):
+        """This function searches the combinations of the hyperparameter values by successive
+        halving. All combinations start with `initial_runs` runs. After each rung, the 
+        combinations whose success rate is, with the given confidence, below the success rate
+        of the best combination are dropped, as well as all but the best 1/`eta` of them.
+        The survivors get `eta` times more runs, up to `number_of_runs`, and the last 
+        combination left gets `number_of_runs` runs.
         
         Parameters
         ----------
         shape_values: dict str: list int/float
             Dictionary of constraints to the values we want to try the shape hyperparameters 
             corresponding to each constraint for. Constraints are 'hairpin', 'hom', 'similarity',
-            'gcContent'.
+            'gcContent', 'noKeyInPayload'.
         weight_values: dict str: list int/float
             Dictionary of constraints to the values we want to try the weight hyperparameters 
             corresponding to each constraint for. Constraints are 'hairpin', 'hom', 'similarity',
-            'gcContent'.
+            'gcContent', 'noKeyInPayload'.
         with_constraints: set of str
             Set of strings containing a selection of the following constraints: 
-            'hairpin', 'hom', 'gcContent'. Those will be the constraints that the
-            palyoads and keys will have to conform to.
+            'hairpin', 'hom', 'gcContent', 'noKeyInPayload'. Those will be the constraints 
+            that the palyoads and keys will have to conform to.
+        initial_runs: int
+            Number of runs of every combination in the first rung.
+        eta: int
+            Factor by which the number of combinations shrinks and the number of runs grows
+            after each rung.
+        confidence: float
+            Confidence level of the bounds on the success rates, between 0 and 1.
+        workers: int or None
+            Number of worker processes the runs of every rung are spread over. If None, the
+            number of processors is used.
+        
+        Returns
+        ----------
+        ranking: list of dict
+            Every combination with its 'shapes', 'weights', 'runs' and 'totalSuccesses',
+            surviving combinations first, sorted by decreasing success rate, then dropped
+            combinations, sorted by decreasing number of runs and success rate.
         """
+        assert(eta > 1)
+        assert(0 < confidence < 1)
+        configurations = [{'shapes': shapes, 'weights': weights, 'runs': 0, 'totalSuccesses': 0}\
+                          for shapes, weights in self.get_grid_tasks(shape_values, weight_values)]
+        alive = configurations
+        dropped = []
+        runs = min(initial_runs, self.number_of_runs)
+        workers = workers or os.cpu_count()
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while True:
+                # The runs of the rung are split between the workers, so that the last
+                # combinations left keep them all busy
+                pending = [configuration for configuration in alive \
+                           if configuration['runs'] < runs]
+                parts = int(np.ceil(workers / max(1, len(pending))))
+                futures = []
+                for configuration in pending:
+                    for part_runs in split_runs(runs - configuration['runs'], parts):
+                        future = loop.run_in_executor(executor, round_task, part_runs, \
+                                                      constraints, configuration['shapes'], \
+                                                      configuration['weights'], with_constraints)
+                        futures.append((configuration, part_runs, future))
+                for configuration, part_runs, future in futures:
+                    _, _, total_successes, _ = await future
+                    configuration['runs'] += part_runs
+                    configuration['totalSuccesses'] += total_successes
+
+                if runs >= self.number_of_runs:
+                    break
+
+                if len(alive) > 1:
+                    # Drop combinations which are confidently worse than the best one
+                    bounds = [success_rate_bounds(configuration['totalSuccesses'], \
+                                                  configuration['runs'], confidence) \
+                              for configuration in alive]
+                    best_lower_bound = max([lower_bound for lower_bound, _ in bounds])
+                    survivors = [alive[i] for i in range(len(alive)) \
+                                 if bounds[i][1] >= best_lower_bound]
+
+                    # Keep the best 1/eta of the combinations
+                    survivors.sort(key=lambda c: c['totalSuccesses'] / c['runs'], reverse=True)
+                    survivors = survivors[:max(1, int(np.ceil(len(alive) / eta)))]
+                    dropped += [configuration for configuration in alive \
+                                if configuration not in survivors]
+                    alive = survivors
 
-        hom_shapes = [1] if not 'hom' in shape_values else shape_values['hom']
-        hairpin_shapes = [1] if not 'hairpin' in shape_values else shape_values['hairpin']
-        similarity_shapes = [1] if not 'similarity' in shape_values else shape_values['similarity']
-        no_key_in_payload_shapes = [1] if not 'noKeyInPayload' in shape_values else shape_values['noKeyInPayload']
-        gc_shapes = [1] if not 'gcContent' in shape_values else shape_values['gcContent']
-
-        hom_weights = [1] if not 'hom' in weight_values else weight_values['hom']
-        hairpin_weights = [1] if not 'hairpin' in weight_values else weight_values['hairpin']
-        similarity_weights = [1] if not 'similarity' in weight_values \
-                                 else weight_values['similarity']
-        no_key_in_payload_weights = [1] if not 'noKeyInPayload' in weight_values \
-                                 else weight_values['noKeyInPayload']
-        gc_weights = [1] if not 'gcContent' in weight_values else weight_values['gcContent']
-
-        for hom_shape in hom_shapes:
-            for hom_weight in hom_weights:
-                for hairpin_shape in hairpin_shapes:
-                    for hairpin_weight in hairpin_weights:
-                        for similarity_shape in similarity_shapes:
-                            for similarity_weight in similarity_weights:
-                                for no_key_in_payload_shape in no_key_in_payload_shapes:
-                                    for no_key_in_payload_weight in no_key_in_payload_weights:
-                                        for gc_shape in gc_shapes:
-                                            for gc_weight in gc_weights:
-                                                shapes = {'hom': hom_shape, 
-                                                        'hairpin': hairpin_shape, 
-                                                        'similarity': similarity_shape,
-                                                        'noKeyInPayload': no_key_in_payload_shape,
-                                                        'gcContent': gc_shape 
-                                                        }
-                                                weights = {'hom': hom_weight, 
-                                                        'hairpin': hairpin_weight, 
-                                                        'similarity': similarity_weight,
-                                                        'noKeyInPayload': no_key_in_payload_weight,
-                                                        'gcContent': gc_weight 
-                                                        }
-                                                hyp = Hyperparameters(shapes, weights)
-                                                start = time.time()
-                                                total_successes = await self.round(constraints, hyp, \
-                                                                                    with_constraints)
-                                                end = time.time()
-                                                print('time: ', end - start)
-                                                print('total successes: ', total_successes)
-                                                w = 'weights: ' + str(weights) + 'shapes: ' + str(shapes) + \
-                                                    'totalSuccesses: ' + str(total_successes) + '\n'
-                                                f = open(os.path.join(os.path.dirname(__file__), "hypTun.txt"), "a")
-                                                f.write(w)
-                                                f.close()
+                # The last combination left gets the whole remaining budget
+                runs = self.number_of_runs if len(alive) == 1 \
+                       else min(runs * eta, self.number_of_runs)
+                print('combinations left: ', len(alive), ', runs: ', runs)
+
+        alive.sort(key=lambda c: c['totalSuccesses'] / c['runs'], reverse=True)
+        dropped.sort(key=lambda c: (c['runs'], c['totalSuccesses'] / c['runs']), reverse=True)
+        return alive + dropped
 
 
 async def main():
@@ -196,6 +350,20 @@ def corIndexKey(line):
         return 4
     
 
+def storeDataExtract(store_path=None, row_constraint='hom', column_constraint='gcContent', \
+                     run_id=None):
+    if store_path is None:
+        store_path = os.path.join(os.path.dirname(__file__), "hypTun.sqlite")
+    store = HyperparameterResultStore(store_path, run_id)
+    row_values, column_values, data = store.get_success_grid(row_constraint, column_constraint)
+    import seaborn as sn
+    # plotting the heatmap 
+    hm = sn.heatmap(data = data, cmap = 'Blues', yticklabels=row_values, \
+                    xticklabels=column_values) 
+    hm.set(ylabel=row_constraint, xlabel=column_constraint)
+    hm.invert_yaxis()
+    return hm, data
+
 def dataExtract():
     data = [[0,0,0,0,0],[0,0,0,0,0],[0,0,0,0,0],[0,0,0,0,0],[0,0,0,0,0]]
     with open(os.path.join(os.path.dirname(__file__), "hypTun2.txt"), "r") as file:
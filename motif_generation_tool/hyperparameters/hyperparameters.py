@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class ConstraintHyperparameters:
     def __init__(self, shape=2, weight=1):
         self.shape = shape
@@ -10,6 +13,27 @@ class ConstraintHyperparameters:
         assert(hyperparameter > 0)
         self.weight = hyperparameter
 
+    def get_log_score_table(self, max_value, size=None):
+        """This function tabulates the log score - shape**(x / max_value) + 1 shared by the
+        constraints, for every x in range(size), so that scoring a base needs no power.
+
+        Parameters
+        ----------
+        max_value: int
+            Value of x at which the log score reaches 1 - shape.
+        size: int or None
+            Number of entries. If None, every x up to `max_value` is tabulated.
+
+        Returns
+        ----------
+        table: np.ndarray of float
+            Log score of each x.
+        """
+        if size is None:
+            size = max_value + 1
+        # Python floats, so that entries are exactly the scalar formula
+        return np.array([- self.shape**(x / max_value) + 1 for x in range(size)], dtype=float)
+
 
 class Hyperparameters:
     def __init__(self, shape_hyperparameters={}, weight_hyperparameters={}):
@@ -0,0 +1,159 @@
+from contextlib import closing
+import json
+import sqlite3
+import time
+
+# Constraint name -> column prefix
+constraint_columns = {'hom': 'hom',
+                      'hairpin': 'hairpin',
+                      'similarity': 'similarity',
+                      'noKeyInPayload': 'no_key_in_payload',
+                      'gcContent': 'gc_content'
+                      }
+
+
+def get_run_id(constraints, with_constraints, number_of_runs):
+    """This function returns the id of a tuning run, so that results are only resumed
+    from runs with the same constraints and number of runs per combination.
+
+    Parameters
+    ----------
+    constraints: Constraints
+        Constraints of the run.
+    with_constraints: set of str
+        Constraints the keys and payloads have to conform to.
+    number_of_runs: int
+        Number of generations per combination.
+
+    Returns
+    ----------
+    run_id: str
+        Normalised JSON of all the inputs.
+    """
+    return json.dumps({'constraints': vars(constraints),
+                       'withConstraints': sorted(with_constraints),
+                       'numberOfRuns': int(number_of_runs)
+                       }, sort_keys=True)
+
+
+class HyperparameterResultStore:
+    def __init__(self, path, run_id=None):
+        self.path = path
+        # Results are read and written for this run only, see get_run_id. If None, results
+        # of all runs are read.
+        self.run_id = run_id
+        self.hyperparameter_columns = []
+        for constraint in constraint_columns:
+            self.hyperparameter_columns.append(constraint_columns[constraint] + '_shape')
+            self.hyperparameter_columns.append(constraint_columns[constraint] + '_weight')
+
+        columns = ', '.join([column + ' REAL NOT NULL' for column in self.hyperparameter_columns])
+        key = ', '.join(['run_id'] + self.hyperparameter_columns)
+        # Results of stores without run ids, in a `results` table, can't be told apart, so
+        # they are left out
+        with self.connect() as connection, connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS run_results (' + \
+                               'run_id TEXT NOT NULL, ' + columns + ', ' + \
+                               'number_of_runs INTEGER NOT NULL, ' + \
+                               'total_successes INTEGER NOT NULL, ' + \
+                               'duration REAL NOT NULL, ' + \
+                               'created_at REAL NOT NULL, ' + \
+                               'PRIMARY KEY (' + key + '))')
+
+    def connect(self):
+        # Used as `with self.connect() as connection, connection:`, which commits and then
+        # closes the connection. The context of a connection alone only commits.
+        return closing(sqlite3.connect(self.path))
+
+    def get_run_filter(self):
+        if self.run_id is None:
+            return '', ()
+        return ' WHERE run_id = ?', (self.run_id,)
+
+    def get_key(self, shapes, weights):
+        """This function returns the hyperparameter tuple identifying a configuration, in
+        the order of the hyperparameter columns. Missing hyperparameters default to 1.
+        """
+        key = []
+        for constraint in constraint_columns:
+            key.append(float(shapes.get(constraint, 1)))
+            key.append(float(weights.get(constraint, 1)))
+        return tuple(key)
+
+    def get_completed_keys(self):
+        run_filter, parameters = self.get_run_filter()
+        with self.connect() as connection, connection:
+            rows = connection.execute('SELECT ' + ', '.join(self.hyperparameter_columns) + \
+                                      ' FROM run_results' + run_filter, parameters).fetchall()
+        return set([tuple(row) for row in rows])
+
+    def has_result(self, shapes, weights):
+        return self.get_key(shapes, weights) in self.get_completed_keys()
+
+    def add_result(self, shapes, weights, number_of_runs, total_successes, duration):
+        """This function stores the number of successful runs out of `number_of_runs` for
+        the configuration given by `shapes` and `weights`, replacing any previous result
+        for that configuration in the same run.
+        """
+        key = (self.run_id or '',) + self.get_key(shapes, weights)
+        placeholders = ', '.join(['?'] * (len(key) + 4))
+        with self.connect() as connection, connection:
+            connection.execute('INSERT OR REPLACE INTO run_results VALUES (' + placeholders + \
+                               ')', key + (number_of_runs, total_successes, duration, \
+                                           time.time()))
+
+    def get_results(self):
+        """This function returns all stored results of the run, or of all runs if the
+        store has no run id.
+
+        Returns
+        ----------
+        results: list of dict
+            For each configuration, its 'shapes', 'weights', 'numberOfRuns',
+            'totalSuccesses' and 'duration'.
+        """
+        run_filter, parameters = self.get_run_filter()
+        with self.connect() as connection, connection:
+            rows = connection.execute('SELECT ' + ', '.join(self.hyperparameter_columns) + \
+                                      ', number_of_runs, total_successes, duration' + \
+                                      ' FROM run_results' + run_filter + \
+                                      ' ORDER BY created_at', parameters).fetchall()
+        results = []
+        for row in rows:
+            shapes = {}
+            weights = {}
+            i = 0
+            for constraint in constraint_columns:
+                shapes[constraint] = row[i]
+                weights[constraint] = row[i + 1]
+                i += 2
+            results.append({'shapes': shapes,
+                            'weights': weights,
+                            'numberOfRuns': row[i],
+                            'totalSuccesses': row[i + 1],
+                            'duration': row[i + 2]
+                            })
+        return results
+
+    def get_success_grid(self, row_constraint, column_constraint):
+        """This function sums the successes of all stored results over a grid of the shape
+        hyperparameters of `row_constraint` and `column_constraint`.
+
+        Returns
+        ----------
+        row_values: list of float
+            Sorted shape values of `row_constraint`.
+        column_values: list of float
+            Sorted shape values of `column_constraint`.
+        data: list of list of int
+            Total successes for each pair of row and column shape values.
+        """
+        results = self.get_results()
+        row_values = sorted(set([result['shapes'][row_constraint] for result in results]))
+        column_values = sorted(set([result['shapes'][column_constraint] for result in results]))
+        data = [[0] * len(column_values) for _ in row_values]
+        for result in results:
+            i = row_values.index(result['shapes'][row_constraint])
+            j = column_values.index(result['shapes'][column_constraint])
+            data[i][j] += result['totalSuccesses']
+        return row_values, column_values, data
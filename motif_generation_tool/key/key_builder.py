@@ -1,75 +1,109 @@
 from .key_log_score import KeyLogScore
 from dna_language_specification.language import nucleotides
+from dna_language_specification.sampling import sample_nucleotide
 
 import numpy as np
+import time
 
 class KeyBuilder:
-    def __init__(self, constraints, hyperparameters):
+    def __init__(self, constraints, hyperparameters, rng=None, stats=None):
         self.constraints = constraints
         
         self.hyperparams = hyperparameters
 
+        # Random number generator the nucleotides are drawn from
+        self.rng = rng if rng is not None else np.random.default_rng()
+
         self.key_num = constraints.key_num
         self.key_size = constraints.key_size
 
-        self.key_log_score = KeyLogScore(constraints, hyperparameters)
+        # Opt-in GenerationStats, recording the builds, dead ends and constraint timings
+        self.stats = stats
+
+        self.key_log_score = KeyLogScore(constraints, hyperparameters, stats)
+
+        # Number of dead ends reached at each position of the keys
+        self.dead_ends_per_pos = np.zeros(self.key_size, dtype=int)
 
     ### Build Keys ###
 
-    async def build_key(self, with_constraints):
+    async def build_key(self, with_constraints, backtrack_size=0, max_backtracks=0):
+        """This function attempts to build a key respecting the thresholds related to
+        the constraints listed in `with_constraints`. When no nucleotide can be appended,
+        the last `backtrack_size` bases are removed and the base that led to the dead end
+        is excluded at its position, at most `max_backtracks` times. Every dead end is
+        counted in `dead_ends_per_pos` at the position where it happened.
+        
+        Parameters
+        ----------
+        with_constraints: set of str
+            Set of strings containing a selection of the following constraints: 
+            'hairpin', 'hom', 'gcContent'.
+        backtrack_size: int
+            Number of bases removed on a dead end. If 0, the key is abandoned on the
+            first dead end.
+        max_backtracks: int
+            Maximum number of dead ends recovered from while building the key.
+        
+        Returns
+        ----------
+        key: str or bool
+            Key conforming to the constraints `with_constraints`, False if none could
+            be built.
+        """
+        start = time.perf_counter()
         key = ''
 
+        # For each position of the key, bases leading to a dead end at that position
+        dead_ends = [np.zeros(len(nucleotides), dtype=bool)]
+        backtracks = 0
+
         self.key_log_score.start_new_key()
-        for _ in range(self.key_size):
+        while len(key) < self.key_size:
             
-            log_scores = [0] * 4
-            index_map = {'A':0, 'T':1, 'C':2, 'G':3}
-            for n in nucleotides:
-                index = index_map[n]
-                log_scores[index] = 0
-                for constraint in with_constraints:
-                    if constraint == 'hom':
-                        weight = self.hyperparams.hom.weight
-                        hom_log_score = self.key_log_score.get_homopolymer_log_score(key, n)
-                        log_scores[index] += weight * hom_log_score
-                        if log_scores[index] == -np.inf:
-                            break
-                    elif constraint == 'gcContent':
-                        weight = self.hyperparams.gc_content.weight
-                        gc_log_score = self.key_log_score.get_gc_log_score(key, n)
-                        log_scores[index] += weight * gc_log_score
-                        if log_scores[index] == -np.inf:
-                            break
-                    elif constraint == 'hairpin':
-                        weight = self.hyperparams.hairpin.weight
-                        hairpin_log_score = self.key_log_score.get_hairpin_log_score(key, n)
-                        log_scores[index] += weight * hairpin_log_score
-                        if log_scores[index] == -np.inf:
-                            break
-                        weight = self.hyperparams.similarity.weight
-                        similarity_log_score = self.key_log_score.get_similarity_log_score(key, n)
-                        log_scores[index] += weight * similarity_log_score
+            log_scores = self.key_log_score.score_all_bases(key, with_constraints)
             
             if not with_constraints:
                 p = np.array([0.25, 0.25, 0.25, 0.25])
             else:
-                log_scores = np.array(log_scores)
                 p = np.exp(log_scores)
+                p[dead_ends[-1]] = 0
                 if not p.any():
-                    return False
-                p /= p.sum()
-
-            new_nucleotide = np.random.choice(nucleotides, p=p)
+                    self.dead_ends_per_pos[len(key)] += 1
+                    if self.stats is not None:
+                        self.stats.add_dead_end('key', len(key), self.key_log_score.blocked_by, \
+                                                dead_ends[-1])
+                    if backtrack_size <= 0 or backtracks >= max_backtracks or not key:
+                        if self.stats is not None:
+                            self.stats.add_build('key', False, time.perf_counter() - start)
+                        return False
+                    backtracks += 1
+
+                    # Rewind and exclude the first removed base at its position
+                    for _ in range(min(backtrack_size, len(key))):
+                        old_base = await self.key_log_score.pop_base()
+                        key = key[:-1]
+                        dead_ends.pop()
+                    dead_ends[-1][nucleotides.index(old_base)] = True
+                    continue
+
+            new_nucleotide = sample_nucleotide(self.rng, p)
         
             key += new_nucleotide
             await self.key_log_score.add_base(new_nucleotide)
+            dead_ends.append(np.zeros(len(nucleotides), dtype=bool))
 
         await self.key_log_score.add_key(key)
+        if self.stats is not None:
+            self.stats.add_build('key', True, time.perf_counter() - start)
         return key
     
-    async def build_all_keys(self, with_constraints):
+    async def build_all_keys(self, with_constraints, backtrack_size=0, max_backtracks=0, \
+                             max_retries=0):
         """This function attempts to build a key respecting the thresholds related to
-        the constraints listed in `with_constraints` a total of `key_num` number of times
+        the constraints listed in `with_constraints` a total of `key_num` number of times.
+        Each key which could not be built, or which was already built, is attempted
+        again up to `max_retries` times.
         
         Parameters
         ----------
@@ -77,6 +111,13 @@ class KeyBuilder:
             Set of strings containing a selection of the following constraints: 
             'hairpin', 'hom', 'gcContent'. Those will be the constraints that the
             palyoads will have to conform to.
+        backtrack_size: int
+            Number of bases removed when a key reaches a dead end. If 0, the key is
+            abandoned on the first dead end.
+        max_backtracks: int
+            Maximum number of dead ends recovered from per key attempt.
+        max_retries: int
+            Maximum number of additional attempts per key.
         
         Returns
         ----------
@@ -87,7 +128,10 @@ class KeyBuilder:
         all_keys = set()
         all_keys_list = []
         for _ in range(self.key_num):
-            key = await self.build_key(with_constraints)
+            for _ in range(max_retries + 1):
+                key = await self.build_key(with_constraints, backtrack_size, max_backtracks)
+                if key and key not in all_keys:
+                    break
             if not key:
                 continue
             if not key in all_keys:
@@ -95,7 +139,6 @@ class KeyBuilder:
             all_keys.add(key)
         return all_keys_list
 
-
 async def main():
     from ..constraints.constraints import Constraints
     from ..hyperparameters.hyperparameters import Hyperparameters
@@ -1,18 +1,21 @@
 import numpy as np
+import time
 from dna_language_specification.language import nucleotides, converse
+from dna_language_specification.base_set import base_bits, popcount, similarity_window_size
+from constraints.constraint_pipeline import compile_constraints
 from constraints.hairpin import Hairpin
 
 
 class KeyLogScore:
-    def __init__(self, constraints, hyperparams):
+    def __init__(self, constraints, hyperparams, stats=None):
         self.keys = set()
         self.keys_list = []
         self.key_size = constraints.key_size
         self.payload_size = constraints.payload_size
         self.motif_size = constraints.motif_size
 
-        # Similarity
-        self.used_bases = np.zeros(self.key_size)
+        # Similarity, set of bases used at each position as a 4-bit mask
+        self.used_bases = np.zeros(self.key_size, dtype=np.uint8)
 
         # Hairpin
         self.max_hairpin = constraints.max_hairpin
@@ -26,6 +29,8 @@ class KeyLogScore:
         self.min_gc = constraints.min_gc
         self.max_gc = constraints.max_gc
         self.cur_gc_count = 0
+        self.min_motif_gc_count = np.ceil(self.min_gc * self.motif_size / 100)
+        self.max_motif_gc_count = np.floor(self.max_gc * self.motif_size / 100)
 
         # Key
         self.key_size = constraints.key_size
@@ -39,6 +44,32 @@ class KeyLogScore:
         self.gc_content_hyperparams = hyperparams.gc_content
         self.similarity_hyperparams = hyperparams.similarity
 
+        # Log scores by homopolymer length and similarity window, and GC weights by motif
+        # size, tabulated once. Lookups go through lists, which are faster than NumPy for a
+        # single element.
+        self.hom_log_scores = self.hom_hyperparams.get_log_score_table(self.max_hom).tolist()
+        self.similarity_log_scores = \
+            self.similarity_hyperparams.get_log_score_table(self.max_hairpin).tolist()
+        self.gc_weights = (- self.gc_content_hyperparams.get_log_score_table(\
+                                                                self.motif_size)).tolist()
+
+        # Opt-in GenerationStats. When set, score_all_bases times every constraint and keeps
+        # in `blocked_by` the constraint which ruled out each nucleotide, if any.
+        self.stats = stats
+        self.blocked_by = [None] * len(nucleotides)
+
+        # Scorer and hyperparameters of each constraint, scoring the key being currently
+        # generated. Selections of constraints are compiled once into `pipelines`.
+        self.scorers = {'hom': self.homopolymer_log_score,
+                        'gcContent': self.key_gc_content_log_score,
+                        'similarity': self.similarity_log_score,
+                        'hairpin': self.hairpin_log_score}
+        self.constraint_hyperparams = {'hom': self.hom_hyperparams,
+                                       'gcContent': self.gc_content_hyperparams,
+                                       'similarity': self.similarity_hyperparams,
+                                       'hairpin': self.hairpin_hyperparams}
+        self.pipelines = {}
+
     ### Get Log Scores ###
 
     def get_all_log_scores(self, key, base):
@@ -63,7 +94,57 @@ class KeyLogScore:
     def get_similarity_log_score(self, key, base):
         cur_key = key + base
         return self.similarity_log_score(cur_key)
-    
+
+    ### Score All Bases ###
+
+    def score_all_bases(self, key, with_constraints):
+        """This function calculates the weighted log score of appending each of the
+        nucleotides to `key`, the key being currently generated, for the constraints listed
+        in `with_constraints`, using the running statistics of `key`.
+        
+        Parameters
+        ----------
+        key: str
+            Key being currently generated.
+        with_constraints: set of str
+            Set of strings containing a selection of the following constraints: 
+            'hairpin', 'hom', 'gcContent'.
+        
+        Returns
+        ----------
+        log_scores: np.ndarray of float
+            Weighted log score of each nucleotide, in the order of `nucleotides`.
+        """
+        log_scores = np.zeros(len(nucleotides))
+        if not with_constraints:
+            return log_scores
+
+        pipeline = self.get_pipeline(with_constraints)
+        for index in range(len(nucleotides)):
+            cur_key = key + nucleotides[index]
+            self.blocked_by[index] = None
+            for constraint, weight, scorer in pipeline:
+                if self.stats is None:
+                    log_scores[index] += weight * scorer(cur_key)
+                else:
+                    start = time.perf_counter()
+                    log_scores[index] += weight * scorer(cur_key)
+                    self.stats.add_constraint_call('key', constraint, time.perf_counter() - start)
+                if log_scores[index] == -np.inf:
+                    self.blocked_by[index] = constraint
+                    break
+        return log_scores
+
+    def get_pipeline(self, with_constraints):
+        # (constraint, weight, scorer) of each constraint to score, see compile_constraints
+        key = frozenset(with_constraints)
+        pipeline = self.pipelines.get(key)
+        if pipeline is None:
+            pipeline = compile_constraints(with_constraints, self.scorers, \
+                                           self.constraint_hyperparams)
+            self.pipelines[key] = pipeline
+        return pipeline
+
     ### Add Base to current Key ###
     
     async def add_base(self, new_base):
@@ -82,6 +163,23 @@ class KeyLogScore:
     async def update_gc_count_stats(self, new_base):
         self.cur_gc_count += 1 if new_base in ['G', 'C'] else 0
 
+    ### Remove Base from current Key ###
+
+    async def pop_base(self):
+        if not self.cur_key:
+            return ''
+        old_base = self.cur_key[-1]
+        self.cur_key = self.cur_key[:-1]
+        self.cur_gc_count -= 1 if old_base in ['G', 'C'] else 0
+
+        # Homopolymer at the end of the remaining key
+        self.cur_hom = 0
+        for b in reversed(self.cur_key):
+            if b != self.cur_key[-1]:
+                break
+            self.cur_hom += 1
+        return old_base
+
     ### Start New Key ###
 
     def start_new_key(self):
@@ -104,11 +202,8 @@ class KeyLogScore:
             await self.add_key(new_key)
 
     async def add_motif_gc_and_similarity_stats(self, new_key):
-        unit = {'A':0, 'T':1, 'C':2, 'G':3}
         for i in range(self.key_size):
-            b = new_key[i]
-            if self.used_bases[i] // 10**unit[b] % 10 != 1:
-                self.used_bases[i] += 10**unit[b]
+            self.used_bases[i] |= base_bits[new_key[i]]
 
         gc_count = sum([1 if b in ['G', 'C'] else 0 for b in new_key])
         self.min_gc_count = gc_count if self.min_gc_count == -1 else min(self.min_gc_count,\
@@ -126,7 +221,7 @@ class KeyLogScore:
             return 0
         if max_hom_len > self.max_hom:
             return -np.inf
-        return - self.hom_hyperparams.shape**(max_hom_len / self.max_hom) + 1
+        return self.hom_log_scores[max_hom_len]
 
     def homopolymer_in_key(self, cur_key):
         if len(cur_key) <= 1:
@@ -134,28 +229,14 @@ class KeyLogScore:
         return self.cur_hom + 1 if cur_key[len(cur_key) - 1] == cur_key[len(cur_key) - 2] else 1
 
     def get_first_and_last_key_pos_info(self, cur_key):
-        unit = {'A':0, 'T':1, 'C':2, 'G':3}
-        first_key_pos_used_bases = self.used_bases[0]
-        last_key_pos_used_bases = self.used_bases[-1]
-        cur_first_base = cur_key[0]
-        if first_key_pos_used_bases // 10**unit[cur_first_base] % 10 != 1:
-            first_key_pos_used_bases += 10**unit[cur_first_base]
+        first_key_pos_used_bases = int(self.used_bases[0]) | base_bits[cur_key[0]]
+        last_key_pos_used_bases = int(self.used_bases[-1])
         if len(cur_key) == self.key_size:
-            cur_end_base = cur_key[self.key_size - 1]
-            if last_key_pos_used_bases // 10**unit[cur_end_base] % 10 != 1:
-                last_key_pos_used_bases += 10**unit[cur_end_base]
-        same_unused_base = 0
-        unused_bases_first_pos = 0
-        unused_bases_last_pos = 0
-        for b in nucleotides:
-            first_key_pos_used_base = first_key_pos_used_bases // 10**unit[b] % 10 == 1
-            last_key_pos_used_base = last_key_pos_used_bases // 10**unit[b] % 10 == 1
-            if not (first_key_pos_used_base or last_key_pos_used_base):
-                same_unused_base += 1
-            if not first_key_pos_used_base:
-                unused_bases_first_pos += 1
-            if not last_key_pos_used_base:
-                unused_bases_last_pos += 1
+            last_key_pos_used_bases |= base_bits[cur_key[self.key_size - 1]]
+        num = len(nucleotides)
+        same_unused_base = num - popcount[first_key_pos_used_bases | last_key_pos_used_bases]
+        unused_bases_first_pos = num - popcount[first_key_pos_used_bases]
+        unused_bases_last_pos = num - popcount[last_key_pos_used_bases]
         return same_unused_base, unused_bases_first_pos, unused_bases_last_pos
     
     def homopolymer_within_motif_edge_cases(self, cur_key):
@@ -196,17 +277,59 @@ class KeyLogScore:
     def key_gc_content_within_motif(self, cur_key):
         key_gc_count = self.cur_gc_count + 1 if cur_key[len(cur_key) - 1] in ['G', 'C'] \
                                          else self.cur_gc_count
+        return self.gc_content_log_score(key_gc_count, len(cur_key))
+
+    def is_gc_count_feasible(self, key_gc_count, cur_key_len):
+        """This function checks that the key being currently generated can still be
+        completed so that some payload GC count suits every motif, with the key itself or
+        with any of the keys already built. Payloads are checked against the lowest and
+        highest GC counts among the keys, so the key must keep those within reach of a
+        payload.
+
+        Parameters
+        ----------
+        key_gc_count: int
+            GC count of the key being currently generated.
+        cur_key_len: int
+            Length of the key being currently generated.
+
+        Returns
+        ----------
+        is_feasible: bool
+            True if some GC count of the whole key leaves a payload GC count between 0
+            and `payload_size` which keeps every motif within the GC-content bounds.
+        """
+        min_motif_gc_count = int(self.min_motif_gc_count)
+        max_motif_gc_count = int(self.max_motif_gc_count)
+
+        # A payload suits keys with GC counts between min_count and max_count if
+        # min_motif_gc_count - 2 * min_count <= max_motif_gc_count - 2 * max_count,
+        # min_motif_gc_count - 2 * min_count <= payload_size and 2 * max_count <=
+        # max_motif_gc_count. This bounds the GC count of the whole key.
+        spread = (max_motif_gc_count - min_motif_gc_count) // 2
+        if spread < 0:
+            return False
+        low = max(key_gc_count, -((self.payload_size - min_motif_gc_count) // 2))
+        high = min(key_gc_count + self.key_size - cur_key_len, max_motif_gc_count // 2)
+        if self.min_gc_count != -1:
+            if self.max_gc_count - self.min_gc_count > spread or \
+               self.min_gc_count < -((self.payload_size - min_motif_gc_count) // 2) or \
+               self.max_gc_count > max_motif_gc_count // 2:
+                return False
+            low = max(low, self.max_gc_count - spread)
+            high = min(high, self.min_gc_count + spread)
+        return low <= high
+
+    def gc_content_log_score(self, key_gc_count, cur_key_len):
         log_score = 0
 
-        # with itself
-        cur_motif_size = len(cur_key) * 2
-        min_gc_count = np.ceil(self.min_gc * self.motif_size / 100)
-        max_gc_count = np.floor(self.max_gc * self.motif_size / 100)
-        if key_gc_count * 2 > max_gc_count or key_gc_count * 2 + self.motif_size - cur_motif_size\
-                                                                                   < min_gc_count:
+        if not self.is_gc_count_feasible(key_gc_count, cur_key_len):
             return -np.inf
 
-        weight = self.gc_content_hyperparams.shape**(cur_motif_size / self.motif_size) - 1
+        # with itself
+        cur_motif_size = cur_key_len * 2
+
+        weight = self.gc_weights[cur_motif_size]
         min_gc_content = (100 * (key_gc_count * 2)) / cur_motif_size
         max_gc_content = (100 * (key_gc_count * 2)) / cur_motif_size
         log_score = max(log_score, weight * (self.min_gc - min_gc_content))
@@ -216,8 +339,8 @@ class KeyLogScore:
             return -log_score
 
         # with other keys
-        cur_motif_size = len(cur_key) + self.key_size
-        weight = self.gc_content_hyperparams.shape**(cur_motif_size / self.motif_size) - 1
+        cur_motif_size = cur_key_len + self.key_size
+        weight = self.gc_weights[cur_motif_size]
         min_gc_content = (100 * (key_gc_count + self.min_gc_count)) / cur_motif_size
         max_gc_content = (100 * (key_gc_count + self.max_gc_count)) / cur_motif_size
         log_score = max(log_score, weight * (self.min_gc - min_gc_content))
@@ -239,13 +362,8 @@ class KeyLogScore:
     def similarity_log_score(self, cur_key):
         if not cur_key:
             return 0
-        window_size = 0
-        unit = {'A':0, 'T':1, 'C':2, 'G':3}
-        for i in range(self.max_hairpin):
-            index = len(cur_key) - 1 - i
-            if self.used_bases[index] + 10**unit[cur_key[index]] >= 1111:
-                window_size += 1
-            else:
-                break
-        return - self.similarity_hyperparams.shape**(window_size / self.max_hairpin) + 1
-
+        # Positions before the start of the key wrap around to its end, as for payloads
+        window_end = len(cur_key) - 1 - min(self.max_hairpin, 2 * len(cur_key))
+        positions = range(len(cur_key) - 1, window_end, -1)
+        window_size = similarity_window_size(self.used_bases, cur_key, positions)
+        return self.similarity_log_scores[window_size]
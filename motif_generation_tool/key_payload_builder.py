@@ -1,14 +1,39 @@
 from payload.payload_builder import PayloadBuilder
 from key.key_builder import KeyBuilder
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
+import asyncio
+
+
+def build_keys_and_payloads_task(constraints, hyperparameters, with_constraints, seed, \
+                                 backtrack_size=0, max_backtracks=0, max_retries=0, \
+                                 counting_sampler=False):
+    # Runs in a worker process, the seed makes every task reproducible on its own
+    key_payload_builder = KeyPayloadBuilder(constraints, hyperparameters, seed, \
+                                            counting_sampler=counting_sampler)
+    return asyncio.run(key_payload_builder.build_keys_and_payloads(with_constraints, \
+                                                                   backtrack_size, \
+                                                                   max_backtracks, max_retries))
+
 
 class KeyPayloadBuilder:
-    def __init__(self, constraints, hyperparameters):
+    def __init__(self, constraints, hyperparameters, seed=None, stats=None, \
+                 counting_sampler=False):
         self.constraints = constraints
         self.hyperparameters = hyperparameters
 
-    async def build_keys_and_payloads(self, with_constraints):
+        # Payloads are sampled by counting feasible completions, see PayloadBuilder
+        self.counting_sampler = counting_sampler
+
+        # Opt-in GenerationStats, shared by the key and payload builders
+        self.stats = stats
+
+        # Shared by the key and payload builders, so a seed replays the whole generation
+        self.rng = np.random.default_rng(seed)
+
+    async def build_keys_and_payloads(self, with_constraints, backtrack_size=0, max_backtracks=0, \
+                                      max_retries=0):
         """This function attempts to build keys and payloads respecting the thresholds related to
         the constraints listed in `with_constraints` a total of `key_num` and 
         `payload_num` number of times respectively.
@@ -19,6 +44,13 @@ class KeyPayloadBuilder:
             Set of strings containing a selection of the following constraints: 
             'hairpin', 'hom', 'gcContent'. Those will be the constraints that the
             palyoads will have to conform to.
+        backtrack_size: int
+            Number of bases removed when a key or payload reaches a dead end. If 0, it is
+            abandoned on the first dead end.
+        max_backtracks: int
+            Maximum number of dead ends recovered from per key or payload attempt.
+        max_retries: int
+            Maximum number of additional attempts per key or payload.
         
         Returns
         ----------
@@ -30,19 +62,67 @@ class KeyPayloadBuilder:
             key could be generated, it is False.
         """
 
-        key_builder = KeyBuilder(self.constraints, self.hyperparameters)
-        keys = await key_builder.build_all_keys(with_constraints)
+        key_builder = KeyBuilder(self.constraints, self.hyperparameters, self.rng, self.stats)
+        keys = await key_builder.build_all_keys(with_constraints, backtrack_size, max_backtracks, \
+                                                max_retries)
         if not keys:
             return False, False
-        payload_builder = PayloadBuilder(self.constraints, self.hyperparameters)
+        payload_builder = PayloadBuilder(self.constraints, self.hyperparameters, self.rng, \
+                                         self.stats, self.counting_sampler)
         await payload_builder.add_keys(keys)
-        payloads = await payload_builder.build_all_payloads(with_constraints)
+        payloads = await payload_builder.build_all_payloads(with_constraints, backtrack_size, \
+                                                            max_backtracks, max_retries)
         if not payloads:
             return False, False
         return keys, payloads
 
-    def get_motifs(self, keys, payloads):
-        """This function returns the set of motifs corresponding to the keys and payloads inputted.
+    def build_many(self, n, with_constraints, workers=None, seed=None, backtrack_size=0, \
+                   max_backtracks=0, max_retries=0):
+        """This function makes `n` independent attempts at building keys and payloads 
+        respecting the thresholds related to the constraints listed in `with_constraints`,
+        spread over a pool of `workers` processes. Results are yielded as they complete.
+        
+        Parameters
+        ----------
+        n: int
+            Number of independent attempts.
+        with_constraints: set of str
+            Set of strings containing a selection of the following constraints: 
+            'hairpin', 'hom', 'gcContent', 'noKeyInPayload'. Those will be the constraints
+            that the keys and payloads will have to conform to.
+        workers: int or None
+            Number of worker processes. If None, the number of processors is used.
+        seed: int or None
+            Seed from which the seed of every attempt is derived. Attempt i always gets the
+            same seed for a given `seed`. If None, fresh entropy is used.
+        backtrack_size, max_backtracks, max_retries: int
+            Backtracking and retry budgets, see `build_keys_and_payloads`.
+        
+        Returns
+        ----------
+        results: generator of (int, list of str or bool, set of str or bool)
+            Index of the attempt, with the keys and payloads it built. Keys and payloads
+            are False if the attempt failed.
+        """
+        task_seeds = np.random.SeedSequence(seed).generate_state(n)
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = {}
+            for i in range(n):
+                future = executor.submit(build_keys_and_payloads_task, self.constraints, \
+                                         self.hyperparameters, with_constraints, \
+                                         int(task_seeds[i]), backtrack_size, \
+                                         max_backtracks, max_retries, self.counting_sampler)
+                futures[future] = i
+            for future in as_completed(futures):
+                keys, payloads = future.result()
+                yield futures[future], keys, payloads
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def iter_motifs(self, keys, payloads):
+        """This function yields the motifs corresponding to the keys and payloads inputted one 
+        at a time, without building the whole set of motifs.
         
         Parameters
         ----------
@@ -53,18 +133,35 @@ class KeyPayloadBuilder:
         
         Returns
         ----------
-        motifs: set of str or bool
-            Set of all motifs built using the provided keys and payloads.
+        motifs: generator of str
+            All motifs built using the provided keys and payloads, each yielded once if
+            the keys are unique.
         """
-        motifs = set()
         for payload in payloads:
             for i in range(len(keys)):
                 motif1 = keys[i] + payload + keys[i]
                 motif2 = keys[i] + payload + keys[(i + 1) % len(keys)]
-                motifs.add(motif1)
-                motifs.add(motif2)
-        return motifs
-    
+                yield motif1
+                # Keys are unique, so both motifs are only the same with a single key
+                if motif2 != motif1:
+                    yield motif2
+
+    def get_motifs(self, keys, payloads):
+        """This function returns the set of motifs corresponding to the keys and payloads inputted.
+        
+        Parameters
+        ----------
+        keys: list of str
+            List of keys.
+        payload: set of str
+            Set of payloads.
+        
+        Returns
+        ----------
+        motifs: set of str or bool
+            Set of all motifs built using the provided keys and payloads.
+        """
+        return set(self.iter_motifs(keys, payloads))
 
 async def main():
     from constraints.constraints import Constraints
@@ -89,20 +186,18 @@ async def main():
     num_rounds = 10000
     num_successful_motifs = 0
     with_constraints = {'hom', 'gcContent', 'hairpin', 'noKeyInPayload'}
-    for i in range(num_rounds):
-        for weight in [1]:
-
-            shapes = {'hom': 70, 'gcContent': 10, 'hairpin': 8, 'similarity': 60, 'noKeyInPayload': 45}
-            weights = {'hom': 1, 'gcContent': 1, 'hairpin': 1, 'similarity': 1, 'noKeyInPayload': 1}
-            hyperparams = Hyperparameters(shapes, weights)
-
-            keyPayloadBuilder = KeyPayloadBuilder(constraints, hyperparams)
-            keys, payloads = await keyPayloadBuilder.build_keys_and_payloads(with_constraints)
-            if not (keys and payloads):
-              continue
-            # print('keys: ', keys)
-            # print('payloads: ', payloads)
-            num_successful_motifs += 1
+
+    shapes = {'hom': 70, 'gcContent': 10, 'hairpin': 8, 'similarity': 60, 'noKeyInPayload': 45}
+    weights = {'hom': 1, 'gcContent': 1, 'hairpin': 1, 'similarity': 1, 'noKeyInPayload': 1}
+    hyperparams = Hyperparameters(shapes, weights)
+
+    keyPayloadBuilder = KeyPayloadBuilder(constraints, hyperparams)
+    for _, keys, payloads in keyPayloadBuilder.build_many(num_rounds, with_constraints):
+        if not (keys and payloads):
+            continue
+        # print('keys: ', keys)
+        # print('payloads: ', payloads)
+        num_successful_motifs += 1
 
     print('Number of motif sets conforming to the constraints is ', num_successful_motifs) # Output: 9285
 
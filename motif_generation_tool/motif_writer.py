@@ -0,0 +1,109 @@
+import json
+import zlib
+
+
+def iter_fasta(motifs, name='motif'):
+    """This function yields the FASTA record of every motif, one at a time.
+    
+    Parameters
+    ----------
+    motifs: iterable of str
+        Motifs, for instance from `KeyPayloadBuilder.iter_motifs`.
+    name: str
+        Prefix of the record names, which are numbered from 1.
+    
+    Returns
+    ----------
+    records: generator of str
+        FASTA record of each motif, ending with a new line.
+    """
+    i = 0
+    for motif in motifs:
+        i += 1
+        yield '>' + name + '_' + str(i) + '\n' + motif + '\n'
+
+def iter_csv(motifs):
+    """This function yields a CSV header followed by the row of every motif, one at a time.
+    
+    Parameters
+    ----------
+    motifs: iterable of str
+        Motifs, for instance from `KeyPayloadBuilder.iter_motifs`.
+    
+    Returns
+    ----------
+    rows: generator of str
+        Header and rows, each ending with a new line.
+    """
+    yield 'index,motif\n'
+    i = 0
+    for motif in motifs:
+        i += 1
+        yield str(i) + ',' + motif + '\n'
+
+file_formats = {'fasta': iter_fasta, 'csv': iter_csv}
+mimetypes = {'fasta': 'text/x-fasta', 'csv': 'text/csv'}
+
+def iter_chunks(lines, chunk_size=1000):
+    # Groups lines so that streams are not written one motif at a time
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+def iter_motif_file(motifs, file_format='fasta', chunk_size=1000):
+    """This function yields the content of a FASTA or CSV file of `motifs` in chunks,
+    without holding more than `chunk_size` motifs in memory.
+    
+    Parameters
+    ----------
+    motifs: iterable of str
+        Motifs, for instance from `KeyPayloadBuilder.iter_motifs`.
+    file_format: str
+        'fasta' or 'csv'.
+    chunk_size: int
+        Number of lines per chunk.
+    
+    Returns
+    ----------
+    chunks: generator of str
+        Consecutive parts of the file.
+    """
+    return iter_chunks(file_formats[file_format](motifs), chunk_size)
+
+def write_motifs(motifs, file, file_format='fasta', chunk_size=1000):
+    for chunk in iter_motif_file(motifs, file_format, chunk_size):
+        file.write(chunk)
+
+def iter_ndjson(records):
+    # One JSON document per line
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+def iter_gzip(chunks, level=6):
+    """This function compresses a stream of text chunks into a single gzip stream, one
+    chunk at a time.
+    
+    Parameters
+    ----------
+    chunks: iterable of str
+        Consecutive parts of the content.
+    level: int
+        Compression level, from 1 (fastest) to 9 (smallest).
+    
+    Returns
+    ----------
+    chunks: generator of bytes
+        Consecutive parts of the gzip stream. A chunk is yielded as soon as the
+        compressor has flushed it, so that readers do not wait for the whole stream.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -1,88 +1,134 @@
 from .payload_log_score import PayloadLogScore
+from .payload_completion_counter import PayloadCompletionCounter
 from constraints.constraints import Constraints
 from hyperparameters.hyperparameters import Hyperparameters
 from dna_language_specification.language import nucleotides
+from dna_language_specification.sampling import sample_nucleotide
 
 import numpy as np
+import time
 
 
 class PayloadBuilder:
-    def __init__(self, constraints, hyperparameters):
+    def __init__(self, constraints, hyperparameters, rng=None, stats=None, \
+                 counting_sampler=False):
         self.constraints = constraints
 
         self.hyperparams = hyperparameters
 
+        # Random number generator the nucleotides are drawn from
+        self.rng = rng if rng is not None else np.random.default_rng()
+
         self.payload_num = constraints.payload_num
         self.payload_size = constraints.payload_size
 
-        self.payload_log_score = PayloadLogScore(constraints, hyperparameters)
+        # Opt-in GenerationStats, recording the builds, dead ends and constraint timings
+        self.stats = stats
+
+        self.payload_log_score = PayloadLogScore(constraints, hyperparameters, stats)
+
+        # If set, bases are also weighed by the number of ways of completing the payload
+        # within the homopolymer and GC-content constraints, so that only the hairpin
+        # constraint can lead to a dead end. One counter per set of constraints.
+        self.counting_sampler = counting_sampler
+        self.completion_counters = {}
         
     async def add_keys(self, keys):
         await self.payload_log_score.add_keys(keys)
+        self.completion_counters = {}
+
+    def get_completion_counter(self, with_constraints):
+        key = frozenset(with_constraints)
+        if key not in self.completion_counters:
+            self.completion_counters[key] = PayloadCompletionCounter(self.payload_log_score, \
+                                                                     with_constraints)
+        return self.completion_counters[key]
 
     ### Build Payload ###
 
-    async def build_payload(self, with_constraints):
-        payload = ''
+    async def build_payload(self, with_constraints, backtrack_size=0, max_backtracks=0):
+        """This function attempts to build a payload respecting the thresholds related to
+        the constraints listed in `with_constraints`. When no nucleotide can be appended,
+        the last `backtrack_size` bases are removed and the base that led to the dead end
+        is excluded at its position, at most `max_backtracks` times. With
+        `counting_sampler`, only the hairpin constraint can lead to a dead end.
+        
+        Parameters
+        ----------
+        with_constraints: set of str
+            Set of strings containing a selection of the following constraints: 
+            'hairpin', 'hom', 'gcContent', 'noKeyInPayload'.
+        backtrack_size: int
+            Number of bases removed on a dead end. If 0, the payload is abandoned on the
+            first dead end.
+        max_backtracks: int
+            Maximum number of dead ends recovered from while building the payload.
+        
+        Returns
+        ----------
+        payload: str or bool
+            Payload conforming to the constraints `with_constraints`, False if none could
+            be built.
+        """
+        start = time.perf_counter()
+        prefix_state = self.payload_log_score.new_prefix_state()
+
+        # For each position of the prefix, bases leading to a dead end at that position
+        dead_ends = [np.zeros(len(nucleotides), dtype=bool)]
+        backtracks = 0
 
-        for _ in range(self.payload_size):
+        while len(prefix_state) < self.payload_size:
             
-            log_scores = [0] * 4
-            index_map = {'A':0, 'T':1, 'C':2, 'G':3}
-            for n in nucleotides:
-                index = index_map[n]
-                log_scores[index] = 0
-                for constraint in with_constraints:
-                    if constraint == 'hom':
-                        weight = self.hyperparams.hom.weight
-                        hom_log_score = self.payload_log_score.get_homopolymer_log_score(payload, n)
-                        log_scores[index] += weight * hom_log_score
-                        if log_scores[index] == -np.inf:
-                            break
-                    elif constraint == 'gcContent':
-                        weight = self.hyperparams.gc_content.weight
-                        gc_log_score = self.payload_log_score.get_gc_log_score(payload, n)
-                        log_scores[index] += weight * gc_log_score
-                        if log_scores[index] == -np.inf:
-                            break
-                    elif constraint == 'hairpin':
-                        weight = self.hyperparams.hairpin.weight
-                        hairpin_log_score = self.payload_log_score.get_hairpin_log_score(payload, n)
-                        log_scores[index] += weight * hairpin_log_score
-                        if log_scores[index] == -np.inf:
-                            break
-                        weight = self.hyperparams.similarity.weight
-                        similarity_log_score = \
-                                        self.payload_log_score.get_similarity_log_score(payload, n)
-                        log_scores[index] += weight * similarity_log_score
-                    elif constraint == 'noKeyInPayload':
-                        weight = self.hyperparams.no_key_in_payload.weight
-                        no_key_in_payload_log_score = self.payload_log_score.get_no_key_in_payload_log_score(payload, n)
-                        log_scores[index] += weight * no_key_in_payload_log_score
-                        if log_scores[index] == -np.inf:
-                            break
+            log_scores = self.payload_log_score.score_all_bases(prefix_state, with_constraints)
             
             if not with_constraints: 
                 p = np.array([0.25, 0.25, 0.25, 0.25])
             else:
-                log_scores = np.array(log_scores)
                 p = np.exp(log_scores)
+                blocked_by = self.payload_log_score.blocked_by
+                if self.counting_sampler:
+                    weights = self.get_completion_counter(with_constraints)\
+                                  .get_completion_weights(prefix_state)
+                    p *= weights
+                    blocked_by = [blocked_by[i] if blocked_by[i] is not None or weights[i] > 0 \
+                                  else 'completions' for i in range(len(nucleotides))]
+                p[dead_ends[-1]] = 0
                 if not p.any():
-                    await self.payload_log_score.add_payload(payload)
-                    return False
-                p /= p.sum()
+                    if self.stats is not None:
+                        self.stats.add_dead_end('payload', len(prefix_state), blocked_by, \
+                                                dead_ends[-1])
+                    if backtrack_size <= 0 or backtracks >= max_backtracks or \
+                       len(prefix_state) == 0:
+                        if self.stats is not None:
+                            self.stats.add_build('payload', False, time.perf_counter() - start)
+                        return False
+                    backtracks += 1
+
+                    # Rewind and exclude the first removed base at its position
+                    for _ in range(min(backtrack_size, len(prefix_state))):
+                        old_base = prefix_state.pop()
+                        dead_ends.pop()
+                    dead_ends[-1][nucleotides.index(old_base)] = True
+                    continue
             
-            new_nucleotide = np.random.choice(nucleotides, p=p)
+            new_nucleotide = sample_nucleotide(self.rng, p)
 
-            payload += new_nucleotide
+            prefix_state.push(new_nucleotide)
+            dead_ends.append(np.zeros(len(nucleotides), dtype=bool))
 
+        payload = prefix_state.payload
         await self.payload_log_score.add_payload(payload)
+        if self.stats is not None:
+            self.stats.add_build('payload', True, time.perf_counter() - start)
 
         return payload
     
-    async def build_all_payloads(self, with_constraints):
+    async def build_all_payloads(self, with_constraints, backtrack_size=0, max_backtracks=0, \
+                                 max_retries=0):
         """This function attempts to build a payload respecting the thresholds related to
-        the constraints listed in `with_constraints` a total of `payload_num` number of times
+        the constraints listed in `with_constraints` a total of `payload_num` number of times.
+        Each payload which could not be built, or which was already built, is attempted
+        again up to `max_retries` times.
         
         Parameters
         ----------
@@ -90,6 +136,13 @@ class PayloadBuilder:
             Set of strings containing a selection of the following constraints: 
             'hairpin', 'hom, 'gcContent'. Those will be the constraints that the
             palyoads will have to conform to.
+        backtrack_size: int
+            Number of bases removed when a payload reaches a dead end. If 0, the payload
+            is abandoned on the first dead end.
+        max_backtracks: int
+            Maximum number of dead ends recovered from per payload attempt.
+        max_retries: int
+            Maximum number of additional attempts per payload.
         
         Returns
         ----------
@@ -98,13 +151,16 @@ class PayloadBuilder:
         """
         all_payloads = set()
         for _ in range(self.payload_num):
-            payload = await self.build_payload(with_constraints)
+            for _ in range(max_retries + 1):
+                payload = await self.build_payload(with_constraints, backtrack_size, \
+                                                   max_backtracks)
+                if payload and payload not in all_payloads:
+                    break
             if not payload:
                 continue
             all_payloads.add(payload)
         return all_payloads
 
-
 async def main():
     payload_size = 8
     payload_num = 5
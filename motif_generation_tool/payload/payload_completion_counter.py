@@ -0,0 +1,171 @@
+import numpy as np
+from dna_language_specification.language import nucleotides
+
+
+class PayloadCompletionCounter:
+    def __init__(self, payload_log_score, with_constraints):
+        self.payload_log_score = payload_log_score
+        self.payload_size = payload_log_score.payload_size
+        self.max_hom = payload_log_score.max_hom
+
+        # Local constraints which can rule a base out. The hairpin constraint is left to the
+        # log score, and noKeyInPayload and similarity never do.
+        self.with_hom = 'hom' in with_constraints
+        self.with_gc_content = 'gcContent' in with_constraints
+
+        # GC counts a whole payload may end with. The count is only tracked when some are
+        # ruled out.
+        self.is_final_gc_count = [not self.with_gc_content or \
+                                  payload_log_score.gc_content_log_score(gc_count, \
+                                                                         self.payload_size) \
+                                  != -np.inf for gc_count in range(self.payload_size + 1)]
+        self.tracks_gc_count = not all(self.is_final_gc_count)
+
+        # The start homopolymer of the payload only matters next to a key which is a
+        # homopolymer as a whole
+        self.tracks_start_hom = self.with_hom and \
+            any([index != -1 for index in payload_log_score.whole_key_hom_indices.values()])
+
+        # (position, state) -> number of feasible completions, and feasible transitions
+        self.counts = {}
+        self.transitions = {}
+        self.payload_stats = self.get_payload_stats()
+
+    def get_payload_stats(self):
+        # Statistics of the payloads already built which the homopolymer length depends on
+        return (tuple(self.payload_log_score.max_start_payload_hom.values()), \
+                tuple(self.payload_log_score.max_end_payload_hom.values()))
+
+    ### States ###
+
+    def get_state(self, prefix_state):
+        """This function returns the state of the constraint automaton reached by the
+        payload being currently generated. It only keeps what later bases can be ruled out
+        by: the last base and its homopolymer length, the first base and the length of
+        the start homopolymer, and the GC count.
+
+        Parameters
+        ----------
+        prefix_state: PayloadPrefixState
+            State of the payload being currently generated.
+
+        Returns
+        ----------
+        state: tuple
+            (last base, end homopolymer, first base, start homopolymer, GC count), with
+            None for what is not tracked.
+        """
+        bases = prefix_state.bases
+        if not bases:
+            return (None, 0, None, 0, 0 if self.tracks_gc_count else None)
+        return (bases[-1], prefix_state.end_hom, \
+                bases[0] if self.tracks_start_hom else None, \
+                prefix_state.start_hom if self.tracks_start_hom else 0, \
+                prefix_state.gc_count if self.tracks_gc_count else None)
+
+    def get_next_state(self, pos, state, base):
+        # State after appending `base` at position `pos`, None if a constraint rules it out
+        end_base, end_hom, first_base, start_hom, gc_count = state
+        cur_hom = end_hom + 1 if end_base == base else 1
+        if self.with_hom:
+            cur_start_hom = start_hom if first_base == base else 0
+            hom_length = self.payload_log_score.homopolymer_length_within_motifs(cur_hom, \
+                                                        pos + 1, base, cur_start_hom)
+            if hom_length > self.max_hom:
+                return None
+        if self.tracks_start_hom:
+            if pos == 0:
+                first_base = base
+            if start_hom == pos and first_base == base:
+                start_hom += 1
+        if self.tracks_gc_count and base in ['G', 'C']:
+            gc_count += 1
+        return (base, cur_hom, first_base, start_hom, gc_count)
+
+    def get_transitions(self, pos, state):
+        transitions = self.transitions.get((pos, state))
+        if transitions is None:
+            transitions = []
+            for index in range(len(nucleotides)):
+                next_state = self.get_next_state(pos, state, nucleotides[index])
+                if next_state is not None:
+                    transitions.append((index, next_state))
+            self.transitions[(pos, state)] = transitions
+        return transitions
+
+    ### Count Completions ###
+
+    def count_completions(self, pos, state):
+        """This function counts the ways of completing a payload which reached `state` at
+        `pos` without breaking the homopolymer and GC-content constraints. States reachable
+        from `state` are listed forward first, then counted backward from the end of the
+        payload, and every count is kept for later calls.
+
+        Parameters
+        ----------
+        pos: int
+            Length of the payload being currently generated.
+        state: tuple
+            State of the payload, see `get_state`.
+
+        Returns
+        ----------
+        count: int
+            Number of feasible completions.
+        """
+        if self.get_payload_stats() != self.payload_stats:
+            # A new payload changed the homopolymer lengths next to the keys
+            self.counts = {}
+            self.transitions = {}
+            self.payload_stats = self.get_payload_stats()
+
+        if (pos, state) in self.counts:
+            return self.counts[(pos, state)]
+
+        # States reachable from `state` whose count is still unknown, at each position
+        layers = [{state}]
+        for cur_pos in range(pos, self.payload_size):
+            next_layer = set()
+            for cur_state in layers[-1]:
+                for _, next_state in self.get_transitions(cur_pos, cur_state):
+                    if (cur_pos + 1, next_state) not in self.counts:
+                        next_layer.add(next_state)
+            layers.append(next_layer)
+
+        for cur_state in layers[-1]:
+            gc_count = cur_state[-1]
+            self.counts[(self.payload_size, cur_state)] = \
+                1 if gc_count is None or self.is_final_gc_count[gc_count] else 0
+        for cur_pos in range(self.payload_size - 1, pos - 1, -1):
+            for cur_state in layers[cur_pos - pos]:
+                self.counts[(cur_pos, cur_state)] = \
+                    sum([self.counts[(cur_pos + 1, next_state)] \
+                         for _, next_state in self.get_transitions(cur_pos, cur_state)])
+        return self.counts[(pos, state)]
+
+    def get_completion_weights(self, prefix_state):
+        """This function weighs each nucleotide by the number of feasible completions of
+        the payload once it is appended, relative to the nucleotide with the most.
+
+        Parameters
+        ----------
+        prefix_state: PayloadPrefixState
+            State of the payload being currently generated.
+
+        Returns
+        ----------
+        weights: np.ndarray of float
+            Weight of each nucleotide, in the order of `nucleotides`, 0 for the ones
+            which lead to a dead end.
+        """
+        pos = len(prefix_state)
+        state = self.get_state(prefix_state)
+        counts = [0] * len(nucleotides)
+        if self.count_completions(pos, state):
+            for index, next_state in self.get_transitions(pos, state):
+                counts[index] = self.counts[(pos + 1, next_state)]
+        max_count = max(counts)
+        if max_count == 0:
+            return np.zeros(len(nucleotides))
+        # Counts grow as 4**payload_size, so they are divided as Python ints first
+        return np.array([count / max_count for count in counts])
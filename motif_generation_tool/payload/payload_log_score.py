@@ -1,10 +1,17 @@
 import numpy as np
+import time
 from dna_language_specification.language import nucleotides, converse
+from dna_language_specification.base_set import base_bits, base_codes, full_set, \
+                                                similarity_window_size
+from constraints.constraint_pipeline import compile_constraints
 from constraints.hairpin import Hairpin
+from constraints.pairing_index import PairingIndex
+from constraints.suffix_automaton import SuffixAutomaton
+from .payload_prefix_state import PayloadPrefixState
 
 
 class PayloadLogScore:
-    def __init__(self, constraints, hyperparams):
+    def __init__(self, constraints, hyperparams, stats=None):
         
         self.payloads = set()
         self.motif_size = constraints.motif_size
@@ -12,6 +19,7 @@ class PayloadLogScore:
         # Hairpin
         self.max_hairpin = constraints.max_hairpin
         self.hairpin = Hairpin(constraints, hyperparams)
+        self.payloads_index = PairingIndex(constraints.payload_size, self.max_hairpin + 1)
 
         # Homopolymer
         self.max_hom = constraints.max_hom
@@ -23,6 +31,7 @@ class PayloadLogScore:
         # Keys
         self.keys = []
         self.key_size = constraints.key_size
+        self.key_automaton = SuffixAutomaton()
         self.start_key_hom = []
         self.end_key_hom = []
         self.max_start_key_hom = {'A':0, 'T':0, 'C':0, 'G':0}
@@ -31,12 +40,19 @@ class PayloadLogScore:
         self.min_key_gc_count = -1
         self.max_key_gc_count = -1
 
+        # Lowest and highest GC counts a whole payload may have once keys are added, None if
+        # no payload can suit them
+        self.final_gc_count_range = (0, constraints.payload_size)
+
         # Payload
         self.payload_size = constraints.payload_size
         self.max_start_payload_hom = {'A':0, 'T':0, 'C':0, 'G':0}
         self.max_end_payload_hom = {'A':0, 'T':0, 'C':0, 'G':0}
 
-        self.used_bases = np.zeros(self.payload_size)
+        # Set of bases used at each position as a 4-bit mask, and how many payloads use
+        # each base there, so that a payload can be removed again
+        self.used_bases = np.zeros(self.payload_size, dtype=np.uint8)
+        self.used_base_counts = np.zeros((self.payload_size, len(nucleotides)), dtype=int)
 
         # Hyperparameters
         self.hom_hyperparams = hyperparams.hom
@@ -45,6 +61,37 @@ class PayloadLogScore:
         self.similarity_hyperparams = hyperparams.similarity
         self.no_key_in_payload_hyperparams = hyperparams.no_key_in_payload
 
+        # Log scores by homopolymer length, similarity window and key overlap window, and GC
+        # weights by motif size, tabulated once. Lookups go through lists, which are faster
+        # than NumPy for a single element.
+        self.hom_log_scores = self.hom_hyperparams.get_log_score_table(self.max_hom).tolist()
+        self.similarity_log_scores = \
+            self.similarity_hyperparams.get_log_score_table(self.max_hairpin).tolist()
+        self.no_key_in_payload_log_scores = \
+            self.no_key_in_payload_hyperparams.get_log_score_table(self.key_size).tolist()
+        self.gc_weights = (- self.gc_content_hyperparams.get_log_score_table(\
+                                                                self.motif_size)).tolist()
+
+        # Opt-in GenerationStats. When set, score_all_bases times every constraint and keeps
+        # in `blocked_by` the constraint which ruled out each nucleotide, if any.
+        self.stats = stats
+        self.blocked_by = [None] * len(nucleotides)
+
+        # Scorer and hyperparameters of each constraint, scoring the base appended to the
+        # payload held in a PayloadPrefixState. Selections of constraints are compiled once
+        # into `pipelines`.
+        self.scorers = {'hom': self.prefix_homopolymer_log_score,
+                        'gcContent': self.prefix_gc_content_log_score,
+                        'noKeyInPayload': self.prefix_no_key_in_payload_log_score,
+                        'similarity': self.prefix_similarity_log_score,
+                        'hairpin': self.prefix_hairpin_log_score}
+        self.constraint_hyperparams = {'hom': self.hom_hyperparams,
+                                       'gcContent': self.gc_content_hyperparams,
+                                       'noKeyInPayload': self.no_key_in_payload_hyperparams,
+                                       'similarity': self.similarity_hyperparams,
+                                       'hairpin': self.hairpin_hyperparams}
+        self.pipelines = {}
+
     ### Get Log Score ###
 
     def get_all_log_score(self, payload, base):
@@ -75,6 +122,60 @@ class PayloadLogScore:
         cur_payload = payload + base
         return self.no_key_in_payload_log_score(cur_payload)
 
+    ### Score All Bases ###
+
+    def new_prefix_state(self, payload=''):
+        return PayloadPrefixState(self.used_bases, payload, self.key_automaton)
+
+    def score_all_bases(self, prefix_state, with_constraints):
+        """This function calculates the weighted log score of appending each of the
+        nucleotides to the payload being currently generated, for the constraints listed 
+        in `with_constraints`, using the running statistics held in `prefix_state`.
+        
+        Parameters
+        ----------
+        prefix_state: PayloadPrefixState
+            State of the payload being currently generated.
+        with_constraints: set of str
+            Set of strings containing a selection of the following constraints: 
+            'hairpin', 'hom', 'gcContent', 'noKeyInPayload'.
+        
+        Returns
+        ----------
+        log_scores: np.ndarray of float
+            Weighted log score of each nucleotide, in the order of `nucleotides`.
+        """
+        log_scores = np.zeros(len(nucleotides))
+        if not with_constraints:
+            return log_scores
+
+        pipeline = self.get_pipeline(with_constraints)
+        for index in range(len(nucleotides)):
+            base = nucleotides[index]
+            self.blocked_by[index] = None
+            for constraint, weight, scorer in pipeline:
+                if self.stats is None:
+                    log_scores[index] += weight * scorer(prefix_state, base)
+                else:
+                    start = time.perf_counter()
+                    log_scores[index] += weight * scorer(prefix_state, base)
+                    self.stats.add_constraint_call('payload', constraint, \
+                                                   time.perf_counter() - start)
+                if log_scores[index] == -np.inf:
+                    self.blocked_by[index] = constraint
+                    break
+        return log_scores
+
+    def get_pipeline(self, with_constraints):
+        # (constraint, weight, scorer) of each constraint to score, see compile_constraints
+        key = frozenset(with_constraints)
+        pipeline = self.pipelines.get(key)
+        if pipeline is None:
+            pipeline = compile_constraints(with_constraints, self.scorers, \
+                                           self.constraint_hyperparams)
+            self.pipelines[key] = pipeline
+        return pipeline
+
     ##### Add Payloads and Keys #####
 
     ### Add Payloads ###
@@ -82,6 +183,9 @@ class PayloadLogScore:
     async def add_payload(self, new_payload):
         if len(new_payload) != self.payload_size:
             return False
+        if new_payload in self.payloads:
+            return
+        self.payloads_index.add_elem(new_payload)
         self.payloads.add(new_payload)
         await self.add_hom_and_similarity_stats(new_payload)
     
@@ -89,11 +193,42 @@ class PayloadLogScore:
         for new_payload in new_payloads:
             await self.add_payload(new_payload)
 
+    ### Remove Payloads ###
+
+    async def remove_payload(self, old_payload):
+        """This function undoes the addition of `old_payload`, so that the next payloads
+        are scored as if it had never been built.
+
+        Parameters
+        ----------
+        old_payload: str
+            Payload previously added with `add_payload`.
+
+        Returns
+        ----------
+        was_removed: bool
+            True if `old_payload` had been added, False otherwise.
+        """
+        if old_payload not in self.payloads:
+            return False
+        self.payloads.remove(old_payload)
+        self.payloads_index.remove_elem(old_payload)
+        self.remove_similarity_stats(old_payload)
+
+        # The homopolymer stats are maxima, they are recalculated from the other payloads
+        self.max_start_payload_hom = {'A':0, 'T':0, 'C':0, 'G':0}
+        self.max_end_payload_hom = {'A':0, 'T':0, 'C':0, 'G':0}
+        for payload in self.payloads:
+            await self.add_hom_stats(payload)
+        return True
+
     ### Add Keys ###
 
     async def add_keys(self, keys):
         self.keys = keys if isinstance(keys, list) else list(keys)
+        self.key_automaton = SuffixAutomaton(self.keys)
         await self.generate_key_pre_stats()
+        self.final_gc_count_range = self.get_final_gc_count_range()
     
     ##### Pre-Stats #####
 
@@ -140,18 +275,28 @@ class PayloadLogScore:
     ### Payload Pre-Stats ###
 
     async def add_hom_and_similarity_stats(self, payload):
-        unit = {'A':0, 'T':1, 'C':2, 'G':3}
+        self.add_similarity_stats(payload)
+        await self.add_hom_stats(payload)
+
+    def add_similarity_stats(self, payload):
+        for i in range(1, self.payload_size):
+            b = payload[i]
+            self.used_base_counts[i, base_codes[b]] += 1
+            self.used_bases[i] |= base_bits[b]
+
+    def remove_similarity_stats(self, payload):
+        for i in range(1, self.payload_size):
+            b = payload[i]
+            self.used_base_counts[i, base_codes[b]] -= 1
+            if self.used_base_counts[i, base_codes[b]] == 0:
+                self.used_bases[i] &= full_set ^ base_bits[b]
+
+    async def add_hom_stats(self, payload):
         is_start = True
         cur_payload = payload[0]
         cur_hom = 1
         for i in range(1, self.payload_size):
             b = payload[i]
-
-            # Update similarity stats
-            if self.used_bases[i] // 10**unit[b] % 10 != 1:
-                self.used_bases[i] += 10**unit[b]
-
-            # Update homopolymer stats
             if cur_payload != b:
                 if is_start:
                     is_start = False
@@ -161,7 +306,6 @@ class PayloadLogScore:
                 cur_payload = b
             cur_hom += 1
 
-        # Update homopolymer stats
         if is_start:
             self.max_start_payload_hom[cur_payload] = max(self.max_start_payload_hom[cur_payload],\
                                                           cur_hom)
@@ -174,11 +318,19 @@ class PayloadLogScore:
     def calculate_hom_log_score(self, hom_length):
         if hom_length > self.max_hom:
             return -np.inf
-        return - self.hom_hyperparams.shape**(hom_length/self.max_hom) + 1
+        return self.hom_log_scores[hom_length]
 
     def homopolymer_log_score(self, cur_payload):
         max_hom_length = self.max_homopolymer_length(cur_payload)
         return self.calculate_hom_log_score(max_hom_length)
+
+    def prefix_homopolymer_log_score(self, prefix_state, base):
+        bases = prefix_state.bases
+        cur_hom = prefix_state.end_hom + 1 if bases and bases[-1] == base else 1
+        cur_start_hom = prefix_state.start_hom if bases and bases[0] == base else 0
+        hom_length = self.homopolymer_length_within_motifs(cur_hom, len(bases) + 1, base, \
+                                                           cur_start_hom)
+        return self.calculate_hom_log_score(hom_length)
     
     def get_start_hom_count(self, payload, base):
         cur_start = base
@@ -190,16 +342,29 @@ class PayloadLogScore:
             cur_start_hom += 1
         return cur_start_hom
 
-    def max_homopolymer_length(self, cur_payload):
-        cur_hom = 1
-        cur_base = cur_payload[-1]
-        for i in range(len(cur_payload) - 2, -1, -1):
-            b = cur_payload[i]
-            if cur_base != b:
+    def get_end_hom_count(self, payload):
+        if not payload:
+            return 0
+        cur_end = payload[-1]
+        cur_end_hom = 0
+        for i in range(len(payload) - 1, -1, -1):
+            b = payload[i]
+            if cur_end != b:
                 break
-            cur_hom += 1
+            cur_end_hom += 1
+        return cur_end_hom
+
+    def max_homopolymer_length(self, cur_payload):
+        cur_hom = self.get_end_hom_count(cur_payload)
         added_base = cur_payload[-1]
+        cur_start_hom = 0
+        if cur_hom != len(cur_payload) and len(cur_payload) == self.payload_size:
+            cur_start_hom = self.get_start_hom_count(cur_payload, added_base)
+        return self.homopolymer_length_within_motifs(cur_hom, len(cur_payload), added_base, \
+                                                     cur_start_hom)
 
+    def homopolymer_length_within_motifs(self, cur_hom, cur_payload_len, added_base, \
+                                         cur_start_hom=0):
         if not self.start_key_hom:
             return cur_hom
 
@@ -226,7 +391,7 @@ class PayloadLogScore:
                           self.max_start_key_hom[added_base]
                 return hom_len
         # Start keys
-        elif cur_hom == len(cur_payload):
+        elif cur_hom == cur_payload_len:
             if self.whole_key_hom_indices[added_base] != -1:
                 if self.max_end_payload_hom[added_base] == self.payload_size:
                     whole_key_index = self.whole_key_hom_indices[added_base]
@@ -244,7 +409,7 @@ class PayloadLogScore:
                 hom_len = cur_hom + self.max_end_key_hom[added_base]
                 return hom_len
         # End keys
-        elif len(cur_payload) == self.payload_size:
+        elif cur_payload_len == self.payload_size:
             if self.whole_key_hom_indices[added_base] != -1:
                 if self.max_start_payload_hom[added_base] == self.payload_size:
                     whole_key_index = self.whole_key_hom_indices[added_base]
@@ -255,7 +420,6 @@ class PayloadLogScore:
                               start_next_key_hom
                     return hom_len
                 else:
-                    cur_start_hom = self.get_start_hom_count(cur_payload, added_base)
                     max_start_payload_hom = max(self.max_start_payload_hom[added_base], \
                                                 cur_start_hom)
                     hom_len = cur_hom + self.key_size + max_start_payload_hom
@@ -269,13 +433,40 @@ class PayloadLogScore:
 
     def motif_gc_content_log_score(self, cur_payload):
         gc_count = sum([1 if b in ['G', 'C'] else 0 for b in cur_payload])
+        return self.gc_content_log_score(gc_count, len(cur_payload))
+
+    def prefix_gc_content_log_score(self, prefix_state, base):
+        gc_count = prefix_state.gc_count + (1 if base in ['G', 'C'] else 0)
+        return self.gc_content_log_score(gc_count, len(prefix_state) + 1)
+
+    def get_final_gc_count_range(self):
+        # The keys are fixed, so the complete motif check below only depends on the GC count
+        gc_counts = [gc_count for gc_count in range(self.payload_size + 1) \
+                     if self.gc_content_log_score(gc_count, self.payload_size) != -np.inf]
+        if not gc_counts:
+            return None
+        return min(gc_counts), max(gc_counts)
+
+    def is_gc_count_reachable(self, gc_count, cur_payload_len):
+        # True if the remaining bases can still bring the GC count within the final range
+        if self.final_gc_count_range is None:
+            return False
+        min_gc_count, max_gc_count = self.final_gc_count_range
+        return gc_count <= max_gc_count and \
+               gc_count + self.payload_size - cur_payload_len >= min_gc_count
 
+    def gc_content_log_score(self, gc_count, cur_payload_len):
         if len(self.keys) == 0:
-            weight = - self.gc_content_hyperparams.shape**(len(cur_payload) / self.motif_size) + 1
-            return weight * 100 * gc_count / len(cur_payload)
+            weight = - self.gc_weights[cur_payload_len]
+            return weight * 100 * gc_count / cur_payload_len
+
+        # Prefixes which can no longer end within the GC-content bounds are cut straight away
+        if cur_payload_len < self.payload_size and \
+           not self.is_gc_count_reachable(gc_count, cur_payload_len):
+            return -np.inf
         
-        cur_motif_size = len(cur_payload) + self.key_size * 2
-        weight = self.gc_content_hyperparams.shape**(cur_motif_size / self.motif_size) - 1
+        cur_motif_size = cur_payload_len + self.key_size * 2
+        weight = self.gc_weights[cur_motif_size]
         min_gc_content = (100 * (gc_count + self.min_key_gc_count * 2)) / cur_motif_size
         max_gc_content = (100 * (gc_count + self.max_key_gc_count * 2)) / cur_motif_size
         log_score = 0
@@ -288,40 +479,45 @@ class PayloadLogScore:
     ### Hairpin Log Score ###
 
     def hairpin_log_score(self, cur_payload):
-        log_score = self.hairpin.forward_hairpin_log_score(cur_payload, self.payloads, self.keys) \
-                   + self.hairpin.backward_hairpin_log_score(cur_payload, self.payloads, self.keys)
+        log_score = self.hairpin.forward_hairpin_log_score(cur_payload, self.payloads, self.keys, \
+                                                        elems1_index=self.payloads_index) \
+                   + self.hairpin.backward_hairpin_log_score(cur_payload, self.payloads, self.keys, \
+                                                        elems1_index=self.payloads_index)
         return log_score
 
+    def prefix_hairpin_log_score(self, prefix_state, base):
+        return self.hairpin_log_score(prefix_state.payload + base)
+
     ### Similarity Log Score ###
 
     def similarity_log_score(self, cur_payload):
         if not cur_payload:
             return 0
-        window_size = 0
-        unit = {'A':0, 'T':1, 'C':2, 'G':3}
-        for i in range(self.max_hairpin):
-            index = len(cur_payload) - 1 - i
-            if self.used_bases[index] + 10**unit[cur_payload[index]] >= 1111:
-                window_size += 1
-            else:
-                break
-        return - self.similarity_hyperparams.shape**(window_size / self.max_hairpin) + 1
+        # Positions before the start of the payload wrap around to its end
+        window_end = len(cur_payload) - 1 - min(self.max_hairpin, 2 * len(cur_payload))
+        positions = range(len(cur_payload) - 1, window_end, -1)
+        window_size = similarity_window_size(self.used_bases, cur_payload, positions)
+        return self.similarity_log_scores[window_size]
     
+    def prefix_similarity_log_score(self, prefix_state, base):
+        if not prefix_state.is_similar_pos(len(prefix_state), base):
+            window_size = 0
+        elif prefix_state.similarity_window == len(prefix_state) and \
+                                            len(prefix_state) + 1 < self.max_hairpin:
+            # Window wraps around the start of the payload
+            return self.similarity_log_score(prefix_state.payload + base)
+        else:
+            window_size = 1 + min(prefix_state.similarity_window, self.max_hairpin - 1)
+        return self.similarity_log_scores[window_size]
+
     ### No Key in Payload Log Score ###
 
     def no_key_in_payload_log_score(self, cur_payload):
-        if not cur_payload:
-            return 0
-        window_size = 0
-        unit = {'A':0, 'T':1, 'C':2, 'G':3}
-        for key in self.keys:
-            for i in range(1, min(len(cur_payload), self.key_size)):
-                index = len(cur_payload) - 1 - i
-                if cur_payload[index:] in key:
-                    window_size = max(window_size, i)
-                    if window_size == self.key_size:
-                        return -np.inf
-                else:
-                    break
-        return - self.no_key_in_payload_hyperparams.shape**(window_size / self.key_size) + 1
+        # Window of the longest suffix of the payload found in a key, its last base aside
+        window_size = max(self.key_automaton.longest_suffix_match(cur_payload) - 1, 0)
+        return self.no_key_in_payload_log_scores[window_size]
+
+    def prefix_no_key_in_payload_log_score(self, prefix_state, base):
+        window_size = max(prefix_state.key_match_length(base) - 1, 0)
+        return self.no_key_in_payload_log_scores[window_size]
 
@@ -0,0 +1,95 @@
+from dna_language_specification.base_set import similar_lists, base_codes
+from constraints.suffix_automaton import SuffixAutomaton
+
+
+class PayloadPrefixState:
+    __slots__ = ('bases', 'used_bases', 'key_automaton', 'gc_counts', 'end_homs', \
+                 'start_hom', 'similarity_windows', 'key_matches')
+
+    def __init__(self, used_bases, payload='', key_automaton=None):
+        # Bases of the payload, as a stack, so that pushing and popping a base is O(1)
+        self.bases = []
+        self.used_bases = used_bases
+        self.key_automaton = key_automaton if key_automaton is not None else SuffixAutomaton()
+
+        # Running statistics, one entry per prefix length
+        self.gc_counts = [0]
+        self.end_homs = [0]
+        self.similarity_windows = [0]
+        self.start_hom = 0
+
+        # State and length of the longest suffix found in the keys, see SuffixAutomaton
+        self.key_matches = [(0, 0)]
+
+        for b in payload:
+            self.push(b)
+
+    def __len__(self):
+        return len(self.bases)
+
+    @property
+    def payload(self):
+        # Joined on every call, for when the whole payload is needed
+        return ''.join(self.bases)
+
+    ### Running Statistics ###
+
+    @property
+    def gc_count(self):
+        return self.gc_counts[-1]
+
+    @property
+    def end_hom(self):
+        return self.end_homs[-1]
+
+    @property
+    def similarity_window(self):
+        return self.similarity_windows[-1]
+
+    def is_similar_pos(self, pos, base):
+        return similar_lists[self.used_bases[pos]][base_codes[base]]
+
+    def key_match_length(self, base):
+        # Length of the longest suffix found in the keys once `base` is appended
+        state, length = self.key_matches[-1]
+        return self.key_automaton.step(state, length, base)[1]
+
+    ### Push and Pop Bases ###
+
+    def push(self, new_base):
+        pos = len(self.bases)
+
+        # GC-content
+        self.gc_counts.append(self.gc_counts[-1] + (1 if new_base in ['G', 'C'] else 0))
+
+        # Homopolymer
+        if pos > 0 and self.bases[-1] == new_base:
+            self.end_homs.append(self.end_homs[-1] + 1)
+        else:
+            self.end_homs.append(1)
+        if self.start_hom == pos and (pos == 0 or self.bases[0] == new_base):
+            self.start_hom += 1
+
+        # Similarity
+        if self.is_similar_pos(pos, new_base):
+            self.similarity_windows.append(self.similarity_windows[-1] + 1)
+        else:
+            self.similarity_windows.append(0)
+
+        # Keys
+        state, length = self.key_matches[-1]
+        self.key_matches.append(self.key_automaton.step(state, length, new_base))
+
+        self.bases.append(new_base)
+
+    def pop(self):
+        if not self.bases:
+            return ''
+        if self.start_hom == len(self.bases):
+            self.start_hom -= 1
+        old_base = self.bases.pop()
+        self.gc_counts.pop()
+        self.end_homs.pop()
+        self.similarity_windows.pop()
+        self.key_matches.pop()
+        return old_base
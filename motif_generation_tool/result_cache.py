@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from contextlib import closing
+import json
+import sqlite3
+import threading
+import time
+
+# Hyperparameters attribute -> constraint name
+hyperparameter_constraints = {'hom': 'hom',
+                              'hairpin': 'hairpin',
+                              'gc_content': 'gcContent',
+                              'similarity': 'similarity',
+                              'no_key_in_payload': 'noKeyInPayload'
+                              }
+
+
+def get_cache_key(constraints, hyperparameters, with_constraints, seed):
+    """This function returns the key identifying a seeded generation, so that two
+    generations get the same key exactly when they build the same keys and payloads.
+
+    Parameters
+    ----------
+    constraints: Constraints
+        Constraints of the generation.
+    hyperparameters: Hyperparameters
+        Hyperparameters of the generation.
+    with_constraints: set of str
+        Constraints the keys and payloads have to conform to.
+    seed: int
+        Seed of the generation.
+
+    Returns
+    ----------
+    key: str
+        Normalised JSON of all the inputs.
+    """
+    shapes = {}
+    weights = {}
+    for attribute in hyperparameter_constraints:
+        constraint_hyperparameters = getattr(hyperparameters, attribute)
+        shapes[hyperparameter_constraints[attribute]] = float(constraint_hyperparameters.shape)
+        weights[hyperparameter_constraints[attribute]] = float(constraint_hyperparameters.weight)
+    return json.dumps({'constraints': vars(constraints),
+                       'shapes': shapes,
+                       'weights': weights,
+                       'withConstraints': sorted(with_constraints),
+                       'seed': int(seed)
+                       }, sort_keys=True)
+
+
+class LRUResultCache:
+    # Each process has its own entries, so worker processes leave the cache to the server,
+    # see analyse_input.collect_result
+    shared = False
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            # Least recently used entries are evicted first
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class SQLiteResultCache:
+    # All processes read and write the same file
+    shared = True
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        with self.connect() as connection, connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS results (' + \
+                               'key TEXT PRIMARY KEY, ' + \
+                               'value TEXT NOT NULL, ' + \
+                               'last_used REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS results_last_used ' + \
+                               'ON results (last_used)')
+
+    def connect(self):
+        # Several server processes can share the file, each waiting for the others' writes.
+        # Used as `with self.connect() as connection, connection:`, which commits and then
+        # closes the connection. The context of a connection alone only commits.
+        return closing(sqlite3.connect(self.path, timeout=30))
+
+    def __len__(self):
+        with self.connect() as connection, connection:
+            return connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def get(self, key):
+        with self.connect() as connection, connection:
+            row = connection.execute('SELECT value FROM results WHERE key = ?', \
+                                     (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            connection.execute('UPDATE results SET last_used = ? WHERE key = ?', \
+                               (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        with self.connect() as connection, connection:
+            connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?)', \
+                               (key, json.dumps(value), time.time()))
+            # Least recently used entries are evicted first
+            connection.execute('DELETE FROM results WHERE key IN (SELECT key FROM results ' + \
+                               'ORDER BY last_used DESC LIMIT -1 OFFSET ?)', \
+                               (self.max_entries,))
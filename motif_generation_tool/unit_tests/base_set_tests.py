@@ -0,0 +1,35 @@
+import numpy as np
+from ..dna_language_specification import base_set as bs
+
+def decimal_similar(used, base):
+    # Former representation of the bases used at a position, as a sum of powers of ten
+    unit = {'A':0, 'T':1, 'C':2, 'G':3}
+    decimal = sum([10**unit[b] for b in used])
+    return decimal + 10**unit[base] >= 1111
+
+def test_similar_table_matches_decimal_sets():
+    nucleotides = ['A', 'T', 'C', 'G']
+    for mask in range(16):
+        used = [nucleotides[i] for i in range(4) if mask & (1 << i)]
+        for base in nucleotides:
+            assert bs.similar_lists[mask][bs.base_codes[base]] == decimal_similar(used, base)
+
+def test_popcount():
+    assert bs.popcount[0] == 0
+    assert bs.popcount[bs.base_bits['A'] | bs.base_bits['G']] == 2
+    assert bs.popcount[bs.full_set] == 4
+
+def test_similarity_window_size_loop_and_vectorized_agree():
+    rng = np.random.default_rng(0)
+    size = 80
+    for _ in range(50):
+        used_bases = rng.choice([bs.full_set, bs.full_set, 0, 7], size=size).astype(np.uint8)
+        seq = ''.join(rng.choice(['A', 'T', 'C', 'G'], size=size))
+        for window in [5, 40]:
+            positions = range(size - 1, size - 1 - window, -1)
+            expected = 0
+            for pos in positions:
+                if not bs.similar_table[used_bases[pos], bs.base_codes[seq[pos]]]:
+                    break
+                expected += 1
+            assert bs.similarity_window_size(used_bases, seq, positions) == expected
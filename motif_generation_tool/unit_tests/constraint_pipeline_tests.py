@@ -0,0 +1,75 @@
+import pytest
+import numpy as np
+from ..constraints import constraint_pipeline as cp
+from ..payload import payload_log_score as ls
+from ..key import key_log_score as kls
+from ..constraints import constraints as c
+from ..hyperparameters import hyperparameters as h
+
+def get_constraints():
+    return c.Constraints(payload_size=6, payload_num=4, max_hom=2, max_hairpin=2, min_gc=40, \
+                         max_gc=60, key_size=3, key_num=2)
+
+def get_hyperparameters():
+    return h.Hyperparameters({'hom': 5, 'gcContent': 5, 'hairpin': 5, 'similarity': 5, \
+                              'noKeyInPayload': 5}, \
+                             {'hom': 2, 'gcContent': 3, 'hairpin': 4, 'similarity': 5, \
+                              'noKeyInPayload': 6})
+
+def test_scored_constraints_are_ordered():
+    scorers = {'hom': None, 'gcContent': None, 'hairpin': None, 'similarity': None}
+    assert cp.get_scored_constraints({'hairpin', 'gcContent', 'hom'}, scorers) == \
+           ['hom', 'gcContent', 'similarity', 'hairpin']
+    # Constraints without a scorer are left out
+    assert cp.get_scored_constraints({'noKeyInPayload', 'hom'}, scorers) == ['hom']
+    assert cp.get_scored_constraints(set(), scorers) == []
+
+def test_compiled_constraints_hold_weights():
+    payload_log_score = ls.PayloadLogScore(get_constraints(), get_hyperparameters())
+    pipeline = payload_log_score.get_pipeline({'hairpin', 'noKeyInPayload'})
+    assert [(constraint, weight) for constraint, weight, _ in pipeline] == \
+           [('noKeyInPayload', 6), ('similarity', 5), ('hairpin', 4)]
+    assert payload_log_score.get_pipeline({'noKeyInPayload', 'hairpin'}) is pipeline
+
+@pytest.mark.asyncio
+async def test_payload_scores_match_log_scores_of_whole_payloads():
+    payload_log_score = ls.PayloadLogScore(get_constraints(), get_hyperparameters())
+    await payload_log_score.add_keys(['ACG', 'TTC'])
+    await payload_log_score.add_payload('GATCAG')
+
+    # Unweighted log score of each constraint, computed on the whole payload, with the
+    # weights of get_hyperparameters, in scoring order
+    log_score_functions = [(payload_log_score.homopolymer_log_score, 2), \
+                           (payload_log_score.motif_gc_content_log_score, 3), \
+                           (payload_log_score.no_key_in_payload_log_score, 6), \
+                           (payload_log_score.similarity_log_score, 5), \
+                           (payload_log_score.hairpin_log_score, 4)]
+    with_constraints = {'hom', 'gcContent', 'hairpin', 'noKeyInPayload'}
+    for payload in ['', 'C', 'GA', 'TCAG']:
+        prefix_state = payload_log_score.new_prefix_state(payload)
+        log_scores = payload_log_score.score_all_bases(prefix_state, with_constraints)
+        for index, base in enumerate(['A', 'T', 'C', 'G']):
+            log_score = 0
+            for log_score_function, weight in log_score_functions:
+                log_score += weight * log_score_function(payload + base)
+                if log_score == -np.inf:
+                    break
+            assert log_scores[index] == pytest.approx(log_score)
+
+@pytest.mark.asyncio
+async def test_fatal_constraint_skips_hairpin():
+    key_log_score = kls.KeyLogScore(get_constraints(), get_hyperparameters())
+    hairpin_calls = []
+    hairpin_log_score = key_log_score.scorers['hairpin']
+    def counting_hairpin_log_score(cur_key):
+        hairpin_calls.append(cur_key)
+        return hairpin_log_score(cur_key)
+    key_log_score.scorers['hairpin'] = counting_hairpin_log_score
+
+    # 'AAA' breaks the homopolymer constraint, so its hairpin is never searched
+    await key_log_score.add_base('A')
+    await key_log_score.add_base('A')
+    log_scores = key_log_score.score_all_bases('AA', {'hom', 'hairpin'})
+    assert log_scores[0] == -np.inf
+    assert key_log_score.blocked_by[0] == 'hom'
+    assert hairpin_calls == ['AAT', 'AAC', 'AAG']
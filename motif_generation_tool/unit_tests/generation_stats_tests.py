@@ -0,0 +1,121 @@
+import pytest
+import numpy as np
+import sys
+import threading
+from .. import generation_stats as gs
+from ..payload import payload_builder as pb
+from ..constraints import constraints as c
+from ..hyperparameters import hyperparameters as h
+
+def get_constraints(payloadSize=6, maxHom=1):
+    return c.Constraints(payload_size=payloadSize, payload_num=4, max_hom=maxHom, max_hairpin=1, \
+                         min_gc=0, max_gc=100, key_size=1, key_num=1)
+
+def get_hyperparameters():
+    return h.Hyperparameters({'hom': 5, 'gcContent': 5, 'hairpin': 5, 'similarity': 5})
+
+def get_stats():
+    stats = gs.GenerationStats()
+    stats.add_constraint_call('payload', 'hom', 0.5)
+    stats.add_constraint_call('payload', 'hom', 0.25)
+    stats.add_build('payload', True, 1.0)
+    stats.add_build('payload', False, 2.0)
+    stats.add_dead_end('payload', 3, ['hom', None, 'hairpin', None], \
+                       np.array([False, True, False, False]))
+    return stats
+
+def test_dead_end_causes_are_counted_per_base():
+    stats = get_stats()
+    assert stats.constraint_calls[('payload', 'hom')] == 2
+    assert stats.constraint_time[('payload', 'hom')] == 0.75
+    assert stats.builds == {('payload', True): 1, ('payload', False): 1}
+    assert stats.dead_ends == {('payload', 3): 1}
+    assert stats.dead_end_causes == {('payload', 'hom'): 1, ('payload', 'backtrack'): 1, \
+                                     ('payload', 'hairpin'): 1, ('payload', 'underflow'): 1}
+
+def test_merge_dict_adds_exported_stats():
+    stats = get_stats()
+    merged = get_stats()
+    merged.merge_dict(stats.to_dict())
+    assert merged.constraint_calls[('payload', 'hom')] == 4
+    assert merged.build_time['payload'] == 6.0
+    assert merged.dead_ends == {('payload', 3): 2}
+    assert merged.dead_end_causes[('payload', 'underflow')] == 2
+
+    merged.reset()
+    assert merged.to_dict() == {'constraints': {}, 'builds': {}, 'deadEnds': {}}
+
+def test_prometheus_output():
+    lines = get_stats().to_prometheus().splitlines()
+    assert '# TYPE motif_generation_builds_total counter' in lines
+    assert 'motif_generation_constraint_calls_total{kind="payload",constraint="hom"} 2' in lines
+    assert 'motif_generation_builds_total{kind="payload",result="failure"} 1' in lines
+    assert 'motif_generation_dead_ends_total{kind="payload",position="3"} 1' in lines
+
+def test_concurrent_recording_and_export():
+    # Threads switch often, so that unlocked updates and exports would interleave
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    stats = gs.GenerationStats()
+    exported = get_stats().to_dict()
+    errors = []
+    n = 5000
+    def record(thread):
+        for pos in range(n):
+            stats.add_constraint_call('key', 'hom', 1.0)
+            stats.add_dead_end('key', thread * n + pos, ['hom'] * 4, np.zeros(4, dtype=bool))
+            stats.merge_dict(exported)
+    def export():
+        try:
+            while any([thread.is_alive() for thread in threads]):
+                stats.to_dict()
+                stats.to_prometheus()
+        except RuntimeError as e:
+            errors.append(e)
+    try:
+        threads = [threading.Thread(target=record, args=(thread,)) for thread in range(4)]
+        for thread in threads:
+            thread.start()
+        export()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert errors == []
+    assert stats.constraint_calls[('key', 'hom')] == 4 * n
+    assert stats.constraint_calls[('payload', 'hom')] == 4 * n * 2
+    assert len(stats.dead_ends) == 4 * n + 1
+    assert stats.dead_end_causes[('key', 'hom')] == 4 * n * 4
+
+@pytest.mark.asyncio
+async def test_payload_builder_records_dead_end_cause():
+    stats = gs.GenerationStats()
+    payload_builder = pb.PayloadBuilder(get_constraints(), get_hyperparameters(), \
+                                        np.random.default_rng(0), stats)
+    await payload_builder.add_keys(['A'])
+
+    # The homopolymer constraint rules out every base at position 2
+    scorers = payload_builder.payload_log_score.scorers
+    prefix_homopolymer_log_score = scorers['hom']
+    def prefix_homopolymer_log_score_blocking(prefix_state, base):
+        if len(prefix_state) == 2:
+            return -np.inf
+        return prefix_homopolymer_log_score(prefix_state, base)
+    scorers['hom'] = prefix_homopolymer_log_score_blocking
+
+    payload = await payload_builder.build_payload({'hom', 'gcContent'})
+    assert payload == False
+    assert stats.dead_ends == {('payload', 2): 1}
+    assert stats.dead_end_causes == {('payload', 'hom'): 4}
+    assert stats.builds == {('payload', False): 1}
+    assert stats.constraint_calls[('payload', 'hom')] == 12
+
+@pytest.mark.asyncio
+async def test_payload_builder_without_stats_builds_same_payload():
+    payloads = []
+    for stats in [None, gs.GenerationStats()]:
+        payload_builder = pb.PayloadBuilder(get_constraints(), get_hyperparameters(), \
+                                            np.random.default_rng(0), stats)
+        await payload_builder.add_keys(['A'])
+        payloads.append(await payload_builder.build_payload({'hom', 'gcContent', 'hairpin'}))
+    assert payloads[0] == payloads[1]
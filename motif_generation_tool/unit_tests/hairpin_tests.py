@@ -1,6 +1,7 @@
 import pytest
 import numpy as np
 from ..constraints import hairpin as ls
+from ..constraints import pairing_index as pi
 from ..constraints import constraints as c
 from ..hyperparameters import hyperparameters as h
 
@@ -30,6 +31,12 @@ def get_score(elem_length, elem_hyperparam, max_elem):
 
 ##### Helper Functions tests #####
 
+def test_hairpin_log_score_table_matches_formula():
+    hairpin_log_score = ls.Hairpin(get_constraints(maxHairpin=3), get_hyperparameters(7))
+    for stem_length in range(6):
+        assert hairpin_log_score.calculate_hairpin_log_score(stem_length) == \
+               get_score(stem_length, 7, 3)
+
 def test_is_in_cur_elem():
     maxHairpin = 2
     loopSize = 1
@@ -646,6 +653,43 @@ def test_stems_in_same_key_even_after_shift_false():
     result = False
     assert result == hairpinScore
 
+##### Layout tests #####
+
+@pytest.mark.parametrize('isKey', [False, True])
+def test_layout_matches_helper_functions(isKey):
+    constraints = get_constraints(maxHairpin=2, payloadSize=5, keySize=3, loopSizeMin=1, loopSizeMax=4)
+    hairpin_log_score = ls.Hairpin(constraints, get_hyperparameters())
+    elem1Size = 3 if isKey else 5
+    info = {'curElem': 'ACG',
+            'elems1': ['TTA', 'GCA'] if isKey else set(),
+            'elem1Size': elem1Size,
+            'elems2': set() if isKey else ['TTA', 'GCA'],
+            'elem2Size': 5 if isKey else 3,
+            'isKey': isKey,
+            'firstKey': 1
+            }
+    layout = hairpin_log_score.get_layout(isKey, 0, 4)
+    for pos1 in range(-20, 20):
+        assert layout.is_elem2[pos1] == hairpin_log_score.is_in_elem2(info, pos1)
+        assert layout.window_pos[pos1] == pos1 % 8
+        for pos2 in range(-20, 20):
+            isInSameElem1 = not (layout.is_elem2[pos1] or layout.is_elem2[pos2]) and \
+                            layout.window_id[pos1] == layout.window_id[pos2]
+            assert isInSameElem1 == hairpin_log_score.is_in_same_elem1(info, pos1, pos2)
+            isInSameElem2 = layout.is_elem2[pos1] and layout.is_elem2[pos2] and \
+                            layout.window_id[pos1] == layout.window_id[pos2]
+            assert isInSameElem2 == hairpin_log_score.is_in_same_elem2(info, pos1, pos2)
+
+def test_layout_grows_for_far_positions():
+    constraints = get_constraints(maxHairpin=2, payloadSize=5, keySize=3)
+    hairpin_log_score = ls.Hairpin(constraints, get_hyperparameters())
+    layout = hairpin_log_score.get_layout(False, 0, 1)
+    farLayout = hairpin_log_score.get_layout(False, 100, 1)
+    assert farLayout.contains(100 + 1 + 2 * 3)
+    assert farLayout.contains(-100)
+    assert hairpin_log_score.get_layout(False, 0, 1) is farLayout
+    assert not layout.contains(100)
+
 ##### Payload Hairpin Log Score tests ######
 
 ##### Backward hairpin tests ######
@@ -1427,3 +1471,50 @@ def test_valid_hairpin_false_in_different_payloads():
     valid = hairpin_validation.validate_hairpin(keys, payloads)
     result = False
     assert result == valid
+
+##### Pairing Index tests #####
+
+def test_pairing_index_get_elems_with_kmer():
+    index = pi.PairingIndex(5, 2)
+    index.add_elem('ACGTA')
+    index.add_elem('TCGAA')
+    assert index.get_elems_with_kmer(1, 'CG') == ['ACGTA', 'TCGAA']
+    assert index.get_elems_with_kmer(3, 'T') == ['ACGTA']
+    assert index.get_elems_with_kmer(4, 'AA') == []
+    assert index.get_elems_with_kmer(0, '') == ['ACGTA', 'TCGAA']
+
+def test_backward_hairpin_with_pairing_index_in_different_payloads():
+    keySize = 1
+    maxHairpin = 1
+    loopSizeMin = 2
+    loopSizeMax = 3
+    constraints = get_constraints(maxHairpin=maxHairpin, keySize=keySize, loopSizeMin=loopSizeMin, loopSizeMax=loopSizeMax)
+    hairpin_log_score = ls.Hairpin(constraints)
+    keys = ['A', 'C']
+    payloads = {'CCACACAGCA', 'CCCGACAGCA', 'TTACGCAGCG', 'GGATGCAGTT'}
+    payloads_index = pi.PairingIndex(constraints.payload_size, maxHairpin + 1)
+    for payload in payloads:
+        payloads_index.add_elem(payload)
+    for curPayload in ['A', 'CG', 'AAT', 'CGCAAC']:
+        hairpinScore = hairpin_log_score.backward_hairpin_log_score(curPayload, payloads, keys)
+        indexedHairpinScore = hairpin_log_score.backward_hairpin_log_score(curPayload, payloads, \
+                                                        keys, elems1_index=payloads_index)
+        assert hairpinScore == pytest.approx(indexedHairpinScore)
+
+def test_forward_hairpin_with_pairing_index_in_different_payloads():
+    keySize = 1
+    maxHairpin = 1
+    loopSizeMin = 2
+    loopSizeMax = 3
+    constraints = get_constraints(maxHairpin=maxHairpin, keySize=keySize, loopSizeMin=loopSizeMin, loopSizeMax=loopSizeMax)
+    hairpin_log_score = ls.Hairpin(constraints)
+    keys = ['A', 'C']
+    payloads = {'CCACACAGCA', 'CCCGACAGCA', 'TTACGCAGCG', 'GGATGCAGTT'}
+    payloads_index = pi.PairingIndex(constraints.payload_size, maxHairpin + 1)
+    for payload in payloads:
+        payloads_index.add_elem(payload)
+    for curPayload in ['ACGTTAGC', 'CGATTAGCA', 'AATCGATTAG']:
+        hairpinScore = hairpin_log_score.forward_hairpin_log_score(curPayload, payloads, keys)
+        indexedHairpinScore = hairpin_log_score.forward_hairpin_log_score(curPayload, payloads, \
+                                                        keys, elems1_index=payloads_index)
+        assert hairpinScore == pytest.approx(indexedHairpinScore)
@@ -0,0 +1,76 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from ..hyperparameters import hyperparameter_tuning as ht
+from ..hyperparameters import result_store as rs
+from ..constraints import constraints as c
+
+def test_success_rate_bounds_contain_rate():
+    lowerBound, upperBound = ht.success_rate_bounds(30, 50, 0.95)
+    assert lowerBound < 30 / 50 < upperBound
+
+def test_success_rate_bounds_tighten_with_runs():
+    lowerBound1, upperBound1 = ht.success_rate_bounds(5, 10, 0.95)
+    lowerBound2, upperBound2 = ht.success_rate_bounds(50, 100, 0.95)
+    assert upperBound2 - lowerBound2 < upperBound1 - lowerBound1
+
+def test_success_rate_bounds_no_runs():
+    assert ht.success_rate_bounds(0, 0, 0.95) == (0, 1)
+
+def test_split_runs():
+    assert ht.split_runs(10, 4) == [3, 3, 2, 2]
+    assert ht.split_runs(2, 4) == [1, 1]
+    assert ht.split_runs(5, 1) == [5]
+
+@pytest.mark.asyncio
+async def test_successive_halving_drops_hopeless_configurations(monkeypatch):
+    calls = []
+    def round_task(number_of_runs, constraints, shapes, weights, with_constraints):
+        # Only the largest homopolymer shape ever succeeds
+        calls.append((shapes['hom'], number_of_runs))
+        return shapes, weights, number_of_runs if shapes['hom'] == 30 else 0, 0.5
+    # Runs are on threads, so that the stubbed task is used
+    monkeypatch.setattr(ht, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(ht, 'round_task', round_task)
+
+    hyp_tuning = ht.HyperparameterTuning(number_of_runs=40)
+    ranking = await hyp_tuning.successive_halving(None, {'hom': [10, 20, 30]}, {}, {'hom'}, \
+                                                  initial_runs=5, eta=2, workers=4)
+    assert ranking[0]['shapes']['hom'] == 30
+    assert ranking[0]['runs'] == 40
+    assert ranking[0]['totalSuccesses'] == 40
+    assert ranking[1]['runs'] == 5
+    assert ranking[2]['runs'] == 5
+
+    # The first rung is spread over the workers, and so are the runs of the last combination
+    assert sorted(calls[:6]) == [(10, 2), (10, 3), (20, 2), (20, 3), (30, 2), (30, 3)]
+    assert sorted(calls[6:]) == [(30, 8), (30, 9), (30, 9), (30, 9)]
+
+@pytest.mark.asyncio
+async def test_grid_search_resumes_from_stored_results(tmp_path, monkeypatch):
+    calls = []
+    def round_task(number_of_runs, constraints, shapes, weights, with_constraints):
+        calls.append(shapes['hom'])
+        return shapes, weights, shapes['hom'], 0.5
+    # Combinations run on threads, so that the stubbed task is used
+    monkeypatch.setattr(ht, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(ht, 'round_task', round_task)
+
+    constraints = c.Constraints(payload_size=6, payload_num=4, key_size=3, key_num=2)
+    path = str(tmp_path / 'results.sqlite')
+    store = rs.HyperparameterResultStore(path, rs.get_run_id(constraints, {'hom'}, 40))
+    hyp_tuning = ht.HyperparameterTuning(number_of_runs=40)
+    for shapes, weights in hyp_tuning.get_grid_tasks({'hom': [10, 30]}, {}):
+        store.add_result(shapes, weights, 40, 7, 1.0)
+
+    store = await hyp_tuning.grid_search(constraints, {'hom': [10, 20, 30]}, {}, {'hom'}, \
+                                         workers=2, store_path=path)
+    assert calls == [20]
+    results = {result['shapes']['hom']: result['totalSuccesses'] \
+               for result in store.get_results()}
+    assert results == {10: 7, 20: 20, 30: 7}
+
+    # A search with a different number of runs is not resumed from them
+    calls.clear()
+    await ht.HyperparameterTuning(number_of_runs=20).grid_search(constraints, {'hom': [10, 20]}, \
+                                                                 {}, {'hom'}, store_path=path)
+    assert sorted(calls) == [10, 20]
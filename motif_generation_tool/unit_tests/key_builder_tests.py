@@ -0,0 +1,64 @@
+import pytest
+import numpy as np
+from ..key import key_builder as kb
+from ..constraints import constraints as c
+from ..hyperparameters import hyperparameters as h
+
+def get_constraints(keySize=4, keyNum=4, maxHom=1, maxHairpin=1, minGC=0, maxGC=100, payloadSize=6):
+    return c.Constraints(payload_size=payloadSize, payload_num=1, max_hom=maxHom, \
+                         max_hairpin=maxHairpin, min_gc=minGC, max_gc=maxGC, key_size=keySize, \
+                         key_num=keyNum)
+
+def get_hyperparameters():
+    return h.Hyperparameters({'hom': 5, 'gcContent': 5, 'hairpin': 5, 'similarity': 5})
+
+@pytest.mark.asyncio
+async def test_dead_end_is_counted_at_its_position():
+    constraints = get_constraints(keySize=4)
+    key_builder = kb.KeyBuilder(constraints, get_hyperparameters(), np.random.default_rng(0))
+    key_builder.key_log_score.score_all_bases = \
+        lambda key, with_constraints: np.full(4, -np.inf) if len(key) == 2 else np.zeros(4)
+    key = await key_builder.build_key({'hom'})
+    assert key == False
+    assert list(key_builder.dead_ends_per_pos) == [0, 0, 1, 0]
+    assert key_builder.key_log_score.keys == set()
+
+@pytest.mark.asyncio
+async def test_backtracking_masks_dead_branch():
+    constraints = get_constraints(keySize=6, maxHom=2)
+    key_builder = kb.KeyBuilder(constraints, get_hyperparameters(), np.random.default_rng(0))
+
+    # Every key has to end with 'GG', which is a dead end if the previous base is 'G'
+    score_all_bases = key_builder.key_log_score.score_all_bases
+    def score_all_bases_ending_with_gg(key, with_constraints):
+        log_scores = score_all_bases(key, with_constraints)
+        if len(key) >= 4:
+            log_scores[[0, 1, 2]] = -np.inf
+        return log_scores
+    key_builder.key_log_score.score_all_bases = score_all_bases_ending_with_gg
+
+    for _ in range(5):
+        key = await key_builder.build_key({'hom'}, backtrack_size=2, max_backtracks=100)
+        assert key
+        assert key.endswith('GG')
+        assert 'GGG' not in key
+        assert key_builder.key_log_score.cur_key == key
+
+@pytest.mark.asyncio
+async def test_build_all_keys_retries_until_key_num():
+    constraints = get_constraints(keySize=3, keyNum=6, maxHom=1)
+    for seed in range(5):
+        key_builder = kb.KeyBuilder(constraints, get_hyperparameters(), np.random.default_rng(seed))
+        keys = await key_builder.build_all_keys({'hom'}, backtrack_size=1, max_backtracks=10, \
+                                                max_retries=50)
+        assert len(keys) == 6
+        assert len(set(keys)) == 6
+
+@pytest.mark.asyncio
+async def test_same_seed_replays_keys():
+    constraints = get_constraints(keySize=6, keyNum=5, maxHom=2)
+    key_builder1 = kb.KeyBuilder(constraints, get_hyperparameters(), np.random.default_rng(7))
+    key_builder2 = kb.KeyBuilder(constraints, get_hyperparameters(), np.random.default_rng(7))
+    keys1 = await key_builder1.build_all_keys({'hom', 'gcContent', 'hairpin'})
+    keys2 = await key_builder2.build_all_keys({'hom', 'gcContent', 'hairpin'})
+    assert keys1 == keys2
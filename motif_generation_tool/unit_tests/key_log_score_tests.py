@@ -1,6 +1,7 @@
 import pytest
 import numpy as np
 from ..key import key_log_score as ls
+from ..payload import payload_log_score as pls
 from ..constraints import constraints as c
 from ..hyperparameters import hyperparameters as h
 
@@ -179,6 +180,23 @@ async def test_gc_within_motif_went_under_gc_count_limit():
     result = -np.inf
     assert result == gcScore
 
+@pytest.mark.asyncio
+async def test_gc_lookahead_with_other_keys():
+    # Motifs of 12 bases need 4 to 8 G or C
+    constraints = get_constraints(minGc=30, maxGc=70, keySize=4, payloadSize=4)
+    hyperparams = get_hyperparameters()
+    key_log_score = ls.KeyLogScore(constraints, hyperparams)
+    await key_log_score.add_keys({'GGGA'})
+
+    # AAAA suits itself, but no payload suits both the AAAA and the GGGA motifs
+    assert key_log_score.is_gc_count_feasible(0, 4) == False
+    assert key_log_score.is_gc_count_feasible(1, 4) == True
+    assert key_log_score.is_gc_count_feasible(0, 3) == True
+    for b in 'AAA':
+        await key_log_score.add_base(b)
+    assert key_log_score.key_gc_content_log_score('AAAA') == -np.inf
+    assert key_log_score.key_gc_content_log_score('AAAG') != -np.inf
+
 ###### Homopoylmer tests ######
 
 @pytest.mark.asyncio
@@ -539,3 +557,82 @@ async def test_forward_full_stem1_and_part_stem2_in_key1():
     result = get_score(1, hairpinHyperparam, maxHairpin)
     assert result == hairpinScore
 
+
+###### Similarity tests ######
+
+@pytest.mark.asyncio
+async def test_similarity_window_wraps_around_key():
+    constraints = get_constraints(keySize=2, maxHairpin=2)
+    hyperparams = h.Hyperparameters({'similarity': 6})
+    key_log_score = ls.KeyLogScore(constraints, hyperparams)
+    await key_log_score.add_keys(['AA', 'TT', 'CC'])
+
+    # 'G' completes the bases used at the first position and, before the start of the key,
+    # at the last one, so the window covers both
+    assert key_log_score.similarity_log_score('G') == get_score(2, 6, 2)
+    assert key_log_score.similarity_log_score('GA') == 0
+    assert key_log_score.similarity_log_score('AG') == get_score(1, 6, 2)
+
+@pytest.mark.asyncio
+async def test_similarity_log_score_matches_payloads():
+    constraints = get_constraints(keySize=4, payloadSize=4, maxHairpin=6)
+    hyperparams = h.Hyperparameters({'similarity': 6})
+    key_log_score = ls.KeyLogScore(constraints, hyperparams)
+    payload_log_score = pls.PayloadLogScore(constraints, hyperparams)
+    await key_log_score.add_keys(['ATCG', 'TCGA', 'CGAT'])
+
+    # Given the same bases used at each position, the windows are the same
+    payload_log_score.used_bases[:] = key_log_score.used_bases
+    for seq in ['G', 'GA', 'GAT', 'GATC', 'A', 'CT', 'TAG']:
+        assert key_log_score.similarity_log_score(seq) == \
+               payload_log_score.similarity_log_score(seq)
+
+###### Score all bases tests ######
+
+@pytest.mark.asyncio
+async def test_score_all_bases_matches_single_base_scores():
+    keySize = 4
+    maxHom = 2
+    constraints = get_constraints(keySize=keySize, maxHom=maxHom)
+    hyperparams = get_hyperparameters()
+    keys = {'AGTG', 'GACT'}
+    key_log_score = ls.KeyLogScore(constraints, hyperparams)
+    await key_log_score.add_keys(keys)
+    curKey = 'GC'
+    for b in curKey:
+        await key_log_score.add_base(b)
+    logScores = key_log_score.score_all_bases(curKey, {'hom', 'gcContent', 'hairpin'})
+    for i, b in enumerate(['A', 'T', 'C', 'G']):
+        result = key_log_score.get_homopolymer_log_score(curKey, b) + \
+                 key_log_score.get_gc_log_score(curKey, b) + \
+                 key_log_score.get_hairpin_log_score(curKey, b) + \
+                 key_log_score.get_similarity_log_score(curKey, b)
+        assert result == pytest.approx(logScores[i])
+
+def test_score_all_bases_without_constraints():
+    constraints = get_constraints()
+    hyperparams = get_hyperparameters()
+    key_log_score = ls.KeyLogScore(constraints, hyperparams)
+    logScores = key_log_score.score_all_bases('', set())
+    assert list(logScores) == [0, 0, 0, 0]
+
+###### Pop base tests ######
+
+@pytest.mark.asyncio
+async def test_pop_base_restores_stats():
+    keySize = 6
+    constraints = get_constraints(keySize=keySize, maxHom=3)
+    hyperparams = get_hyperparameters()
+    key_log_score = ls.KeyLogScore(constraints, hyperparams)
+    for b in 'GCCA':
+        await key_log_score.add_base(b)
+    oldBase = await key_log_score.pop_base()
+    assert oldBase == 'A'
+    assert key_log_score.cur_key == 'GCC'
+    assert key_log_score.cur_hom == 2
+    assert key_log_score.cur_gc_count == 3
+    await key_log_score.pop_base()
+    await key_log_score.pop_base()
+    assert key_log_score.cur_key == 'G'
+    assert key_log_score.cur_hom == 1
+    assert key_log_score.cur_gc_count == 1
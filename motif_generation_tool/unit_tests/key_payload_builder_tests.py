@@ -0,0 +1,71 @@
+import pytest
+from .. import key_payload_builder as kpb
+from ..constraints import constraints as c
+from ..constraints import motif_set_validator as msv
+from ..hyperparameters import hyperparameters as h
+
+def get_constraints():
+    return c.Constraints(payload_size=6, payload_num=3, max_hom=3, min_gc=30, max_gc=70, \
+                         key_size=3, key_num=2)
+
+def get_key_payload_builder():
+    hyperparameters = h.Hyperparameters({'hom': 70, 'gcContent': 20, 'hairpin': 8, \
+                                         'similarity': 50})
+    return kpb.KeyPayloadBuilder(get_constraints(), hyperparameters)
+
+def build_many(seed, workers):
+    # Results by index of the attempt
+    results = {}
+    for i, keys, payloads in get_key_payload_builder().build_many(4, {'hom', 'gcContent'}, \
+                                                                  workers, seed):
+        assert i not in results
+        results[i] = (keys, payloads)
+    return results
+
+def get_baseline_motifs(keys, payloads):
+    # Set of motifs as built before iter_motifs
+    motifs = set()
+    for payload in payloads:
+        for i in range(len(keys)):
+            motifs.add(keys[i] + payload + keys[i])
+            motifs.add(keys[i] + payload + keys[(i + 1) % len(keys)])
+    return motifs
+
+###### Build Many ######
+
+def test_build_many_yields_every_attempt():
+    results = build_many(3, 2)
+    assert sorted(results) == [0, 1, 2, 3]
+    assert any([keys and payloads for keys, payloads in results.values()])
+
+    validator = msv.MotifSetValidator(get_constraints())
+    key_payload_builder = get_key_payload_builder()
+    for keys, payloads in results.values():
+        if not (keys and payloads):
+            continue
+        assert len(keys) == 2 and all([len(key) == 3 for key in keys])
+        assert len(payloads) == 3 and all([len(payload) == 6 for payload in payloads])
+        for report in validator.validate(key_payload_builder.get_motifs(keys, payloads)):
+            assert 'hom' not in report['violations']
+            assert 'gcContent' not in report['violations']
+
+def test_build_many_is_reproducible():
+    results = build_many(5, 2)
+    assert any([keys and payloads for keys, payloads in results.values()])
+
+    # Attempt i always gets the same seed, whatever the number of workers
+    assert build_many(5, 1) == results
+    assert build_many(5, 2) == results
+    assert build_many(6, 2) != results
+
+###### Motifs ######
+
+@pytest.mark.parametrize('keys, payloads', [(['AC', 'GT', 'TA'], {'CCG', 'ATT'}), \
+                                            (['AC'], {'CCG', 'ATT'}), \
+                                            (['ACG', 'TTA'], {'GATTCA'})])
+def test_motifs_match_baseline(keys, payloads):
+    key_payload_builder = get_key_payload_builder()
+    motifs = list(key_payload_builder.iter_motifs(keys, payloads))
+    assert len(motifs) == len(set(motifs))
+    assert set(motifs) == get_baseline_motifs(keys, payloads)
+    assert key_payload_builder.get_motifs(keys, payloads) == get_baseline_motifs(keys, payloads)
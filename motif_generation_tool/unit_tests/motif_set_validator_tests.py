@@ -0,0 +1,40 @@
+import pytest
+from ..constraints import motif_set_validator as msv
+from ..constraints import constraints as c
+
+def get_constraints(maxHom=2, maxHairpin=1, loopSizeMin=1, loopSizeMax=2, minGC=25, maxGC=75):
+    return c.Constraints(payload_size=6, payload_num=1, max_hom=maxHom, max_hairpin=maxHairpin, \
+                         min_gc=minGC, max_gc=maxGC, key_size=1, key_num=2, \
+                         loop_size_min=loopSizeMin, loop_size_max=loopSizeMax)
+
+def test_encode_complement():
+    validator = msv.MotifSetValidator(get_constraints())
+    matrix = validator.encode(['ATCG'])
+    assert list(matrix[0] ^ 1) == list(validator.encode(['TAGC'])[0])
+
+def test_max_homopolymer_lengths():
+    validator = msv.MotifSetValidator(get_constraints())
+    matrix = validator.encode(['AATTTC', 'ACGTAC', 'GGGGGG'])
+    assert list(validator.max_homopolymer_lengths(matrix)) == [3, 1, 6]
+
+def test_gc_contents():
+    validator = msv.MotifSetValidator(get_constraints())
+    matrix = validator.encode(['AATTTC', 'GCGCAT'])
+    assert list(validator.gc_contents(matrix)) == pytest.approx([100 / 6, 400 / 6])
+
+def test_hairpins_within_loop_range():
+    validator = msv.MotifSetValidator(get_constraints(maxHairpin=1, loopSizeMin=1, loopSizeMax=2))
+    # 'AC' pairs with 'GT' after a loop of size 1, and with nothing else
+    matrix = validator.encode(['ACAGTAAA', 'ACAAGTAA', 'ACAAAGTA'])
+    assert validator.hairpins(matrix) == [(0, 0, 1), (1, 0, 2)]
+
+def test_validate_reports_violations():
+    validator = msv.MotifSetValidator(get_constraints(maxHom=2, minGC=25, maxGC=70))
+    reports = validator.validate(['ACAGTAAA', 'ACCACAGA', 'CCACCACC'])
+    assert reports[0]['violations'] == ['hom', 'hairpin']
+    assert reports[0]['hairpins'] == [(0, 1)]
+    assert reports[1]['violations'] == []
+    assert reports[2]['violations'] == ['gcContent']
+    assert reports[2]['gcContent'] == 75
+    assert not validator.is_valid(['ACAGTAAA', 'ACCACAGA'])
+    assert validator.is_valid(['ACCACAGA'])
@@ -0,0 +1,60 @@
+import gzip
+import json
+import zlib
+import io
+from .. import motif_writer as mw
+from .. import key_payload_builder as kpb
+from ..constraints import constraints as c
+from ..hyperparameters import hyperparameters as h
+
+def get_key_payload_builder():
+    constraints = c.Constraints(payload_size=3, payload_num=2, key_size=2, key_num=3)
+    return kpb.KeyPayloadBuilder(constraints, h.Hyperparameters())
+
+def test_iter_motifs_matches_get_motifs():
+    key_payload_builder = get_key_payload_builder()
+    keys = ['AC', 'GT', 'CA']
+    payloads = {'AAT', 'GCA'}
+    motifs = list(key_payload_builder.iter_motifs(keys, payloads))
+    assert len(motifs) == len(set(motifs))
+    assert set(motifs) == key_payload_builder.get_motifs(keys, payloads)
+
+def test_iter_motifs_single_key():
+    key_payload_builder = get_key_payload_builder()
+    motifs = list(key_payload_builder.iter_motifs(['AC'], {'AAT'}))
+    assert motifs == ['ACAATAC']
+
+def test_iter_fasta():
+    records = list(mw.iter_fasta(['ACGT', 'TTGA']))
+    assert records == ['>motif_1\nACGT\n', '>motif_2\nTTGA\n']
+
+def test_iter_csv():
+    rows = list(mw.iter_csv(['ACGT', 'TTGA']))
+    assert rows == ['index,motif\n', '1,ACGT\n', '2,TTGA\n']
+
+def test_iter_motif_file_chunks():
+    motifs = ['ACGT'] * 5
+    chunks = list(mw.iter_motif_file(iter(motifs), 'fasta', chunk_size=2))
+    assert len(chunks) == 3
+    assert ''.join(chunks) == ''.join(mw.iter_fasta(motifs))
+
+def test_write_motifs_csv():
+    file = io.StringIO()
+    mw.write_motifs(iter(['ACGT', 'TTGA']), file, 'csv')
+    assert file.getvalue() == 'index,motif\n1,ACGT\n2,TTGA\n'
+
+def test_iter_ndjson():
+    lines = list(mw.iter_ndjson([{'index': 0, 'keys': ['AC']}, {'index': 1, 'keys': []}]))
+    assert [json.loads(line) for line in lines] == [{'index': 0, 'keys': ['AC']}, \
+                                                    {'index': 1, 'keys': []}]
+    assert all([line.endswith('\n') and line.count('\n') == 1 for line in lines])
+
+def test_iter_gzip_is_one_gzip_stream():
+    chunks = [str(i) + ',ACGT\n' for i in range(100)]
+    data = b''.join(mw.iter_gzip(iter(chunks)))
+    assert gzip.decompress(data).decode() == ''.join(chunks)
+
+def test_iter_gzip_flushes_every_chunk():
+    compressed = mw.iter_gzip(iter(['ACGT\n', 'TTGA\n']))
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert decompressor.decompress(next(compressed)) == b'ACGT\n'
@@ -0,0 +1,50 @@
+import pytest
+import numpy as np
+from ..dna_language_specification import packed_sequence as ps
+from ..dna_language_specification.language import converse
+
+def random_seq(rng, size):
+    return ''.join(rng.choice(['A', 'T', 'C', 'G'], size=size))
+
+def test_packed_sequence_round_trip():
+    rng = np.random.default_rng(0)
+    for size in range(0, 13):
+        seq = random_seq(rng, size)
+        packed = ps.PackedSequence(seq)
+        assert len(packed) == size
+        assert str(packed) == seq
+        assert [packed[i] for i in range(size)] == list(seq)
+
+def test_packed_sequence_is_4_bases_per_byte():
+    assert ps.PackedSequence('A' * 60).nbytes == 15
+    assert ps.PackedSequence('A' * 61).nbytes == 16
+
+def test_packed_sequence_index_out_of_range():
+    with pytest.raises(IndexError):
+        ps.PackedSequence('ACG')[3]
+    assert ps.PackedSequence('ACG')[-1] == 'G'
+
+def test_packed_sequence_equality():
+    assert ps.PackedSequence('ACGT') == ps.PackedSequence('ACGT')
+    assert ps.PackedSequence('ACGT') != ps.PackedSequence('ACGA')
+    # Padding with the code of 'A' does not make sequences of different lengths equal
+    assert ps.PackedSequence('ACG') != ps.PackedSequence('ACGA')
+
+def test_word():
+    rng = np.random.default_rng(2)
+    seq = random_seq(rng, 23)
+    packed = ps.PackedSequence(seq)
+    for start in range(len(seq)):
+        for size in range(0, len(seq) - start + 1):
+            assert packed.word(start, size) == ps.pack_word(seq[start:start + size])
+
+def test_pairing_codes_follow_converse():
+    # Stems of a hairpin are the reverse complement of each other
+    stem = 'AACGT'
+    paired_stem = ''.join([ps.nucleotides[ps.pairing_codes[b]] for b in stem[::-1]])
+    assert paired_stem == ''.join([converse[b] for b in stem[::-1]])
+    assert ps.pack_word(paired_stem) == ps.PackedSequence('TTTAACGTT').word(4, 5)
+
+def test_kmer_word_differs_by_length():
+    assert ps.pack_word('A') == ps.pack_word('AA')
+    assert ps.kmer_word('A') != ps.kmer_word('AA')
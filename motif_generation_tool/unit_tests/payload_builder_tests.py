@@ -0,0 +1,71 @@
+import pytest
+import numpy as np
+from ..payload import payload_builder as pb
+from ..constraints import constraints as c
+from ..hyperparameters import hyperparameters as h
+
+def get_constraints(payloadSize=6, payloadNum=4, maxHom=1, maxHairpin=1, minGC=0, maxGC=100, keySize=1, keyNum=1):
+    return c.Constraints(payload_size=payloadSize, payload_num=payloadNum, max_hom=maxHom, \
+                         max_hairpin=maxHairpin, min_gc=minGC, max_gc=maxGC, key_size=keySize, \
+                         key_num=keyNum)
+
+def get_hyperparameters():
+    return h.Hyperparameters({'hom': 5, 'gcContent': 5, 'hairpin': 5, 'similarity': 5})
+
+@pytest.mark.asyncio
+async def test_dead_end_without_backtracking_returns_false():
+    constraints = get_constraints(payloadSize=4)
+    payload_builder = pb.PayloadBuilder(constraints, get_hyperparameters(), np.random.default_rng(0))
+    await payload_builder.add_keys(['A'])
+    payload_builder.payload_log_score.score_all_bases = \
+        lambda prefix_state, with_constraints: np.full(4, -np.inf) if len(prefix_state) == 2 \
+                                               else np.zeros(4)
+    payload = await payload_builder.build_payload({'hom'})
+    assert payload == False
+    assert payload_builder.payload_log_score.payloads == set()
+
+@pytest.mark.asyncio
+async def test_backtracking_masks_dead_branch():
+    constraints = get_constraints(payloadSize=8, maxHom=2)
+    payload_builder = pb.PayloadBuilder(constraints, get_hyperparameters(), np.random.default_rng(0))
+    await payload_builder.add_keys(['A'])
+
+    # Every payload has to end with 'CC', which is a dead end if the previous base is 'C'
+    score_all_bases = payload_builder.payload_log_score.score_all_bases
+    def score_all_bases_ending_with_cc(prefix_state, with_constraints):
+        log_scores = score_all_bases(prefix_state, with_constraints)
+        if len(prefix_state) >= 6:
+            log_scores[[0, 1, 3]] = -np.inf
+        return log_scores
+    payload_builder.payload_log_score.score_all_bases = score_all_bases_ending_with_cc
+
+    for _ in range(5):
+        payload = await payload_builder.build_payload({'hom'}, backtrack_size=2, \
+                                                      max_backtracks=100)
+        assert payload
+        assert len(payload) == 8
+        assert payload.endswith('CC')
+        assert 'CCC' not in 'A' + payload + 'A'
+
+@pytest.mark.asyncio
+async def test_backtracking_budget_is_bounded():
+    constraints = get_constraints(payloadSize=4)
+    payload_builder = pb.PayloadBuilder(constraints, get_hyperparameters(), np.random.default_rng(0))
+    await payload_builder.add_keys(['A'])
+    payload_builder.payload_log_score.score_all_bases = \
+        lambda prefix_state, with_constraints: np.full(4, -np.inf) if len(prefix_state) == 3 \
+                                               else np.zeros(4)
+    payload = await payload_builder.build_payload({'hom'}, backtrack_size=1, max_backtracks=3)
+    assert payload == False
+
+@pytest.mark.asyncio
+async def test_build_all_payloads_retries_until_payload_num():
+    constraints = get_constraints(payloadSize=3, payloadNum=6, maxHom=1)
+    with_constraints = {'hom'}
+    for seed in range(5):
+        payload_builder = pb.PayloadBuilder(constraints, get_hyperparameters(), \
+                                           np.random.default_rng(seed))
+        await payload_builder.add_keys(['A'])
+        payloads = await payload_builder.build_all_payloads(with_constraints, backtrack_size=1, \
+                                                            max_backtracks=10, max_retries=50)
+        assert len(payloads) == 6
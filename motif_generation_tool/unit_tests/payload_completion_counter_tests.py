@@ -0,0 +1,89 @@
+import pytest
+import itertools
+import numpy as np
+from ..payload import payload_builder as pb
+from ..payload import payload_completion_counter as pcc
+from ..payload import payload_log_score as ls
+from ..constraints import constraints as c
+from ..hyperparameters import hyperparameters as h
+from .. import generation_stats as gs
+
+def get_constraints(payloadSize=5, maxHom=2, minGC=40, maxGC=60, keySize=2, payloadNum=4):
+    return c.Constraints(payload_size=payloadSize, payload_num=payloadNum, max_hom=maxHom, \
+                         max_hairpin=2, min_gc=minGC, max_gc=maxGC, key_size=keySize, key_num=3)
+
+def get_hyperparameters():
+    return h.Hyperparameters({'hom': 5, 'gcContent': 5, 'hairpin': 5, 'similarity': 5})
+
+def is_feasible(payload_log_score, payload, with_constraints):
+    # True if no base of `payload` scores -inf for `with_constraints`
+    prefix_state = payload_log_score.new_prefix_state()
+    for base in payload:
+        for constraint in with_constraints:
+            if payload_log_score.scorers[constraint](prefix_state, base) == -np.inf:
+                return False
+        prefix_state.push(base)
+    return True
+
+def count_feasible(payload_log_score, prefix, with_constraints):
+    completions = itertools.product('ATCG', repeat=payload_log_score.payload_size - len(prefix))
+    return len([completion for completion in completions \
+                if is_feasible(payload_log_score, prefix + ''.join(completion), \
+                               with_constraints)])
+
+@pytest.mark.asyncio
+async def test_completion_counts_match_enumeration():
+    for keys in [['AT', 'GC'], ['AA', 'CG']]:
+        payload_log_score = ls.PayloadLogScore(get_constraints(), get_hyperparameters())
+        await payload_log_score.add_keys(keys)
+        for with_constraints in [{'hom'}, {'gcContent'}, {'hom', 'gcContent'}]:
+            counter = pcc.PayloadCompletionCounter(payload_log_score, with_constraints)
+            for prefix in ['', 'A', 'GC', 'CCA', 'ATGC']:
+                if not is_feasible(payload_log_score, prefix, with_constraints):
+                    continue
+                state = counter.get_state(payload_log_score.new_prefix_state(prefix))
+                assert counter.count_completions(len(prefix), state) == \
+                       count_feasible(payload_log_score, prefix, with_constraints)
+
+@pytest.mark.asyncio
+async def test_completion_counts_follow_new_payloads():
+    payload_log_score = ls.PayloadLogScore(get_constraints(maxHom=3), get_hyperparameters())
+    await payload_log_score.add_keys(['AA', 'CG'])
+    counter = pcc.PayloadCompletionCounter(payload_log_score, {'hom'})
+    state = counter.get_state(payload_log_score.new_prefix_state('C'))
+    count = counter.count_completions(1, state)
+    assert count == count_feasible(payload_log_score, 'C', {'hom'})
+
+    # Once a payload starts with 'AA', ending with 'A' runs through the key 'AA' into it
+    await payload_log_score.add_payload('AACGT')
+    assert counter.count_completions(1, state) == count_feasible(payload_log_score, 'C', {'hom'})
+    assert counter.count_completions(1, state) < count
+
+@pytest.mark.asyncio
+async def test_completion_weights_rule_out_dead_ends():
+    payload_log_score = ls.PayloadLogScore(get_constraints(payloadSize=4, minGC=50, maxGC=50, \
+                                                           keySize=1), get_hyperparameters())
+    await payload_log_score.add_keys(['A', 'T'])
+    counter = pcc.PayloadCompletionCounter(payload_log_score, {'gcContent'})
+
+    # Half of the motif has to be G or C, so the payload needs a third one
+    weights = counter.get_completion_weights(payload_log_score.new_prefix_state('GCA'))
+    assert list(weights) == [0, 0, 1, 1]
+
+@pytest.mark.asyncio
+async def test_counting_sampler_has_no_dead_ends():
+    constraints = get_constraints(payloadSize=30, maxHom=1, minGC=50, maxGC=50, keySize=4, \
+                                  payloadNum=20)
+    for counting_sampler in [False, True]:
+        stats = gs.GenerationStats()
+        payload_builder = pb.PayloadBuilder(constraints, get_hyperparameters(), \
+                                            np.random.default_rng(0), stats, counting_sampler)
+        await payload_builder.add_keys(['ACGT', 'TGCA', 'CATG'])
+        payloads = await payload_builder.build_all_payloads({'hom', 'gcContent'})
+        if counting_sampler:
+            assert len(payloads) == 20
+            assert stats.dead_ends == {}
+        else:
+            assert stats.dead_ends
+        for payload in payloads:
+            assert is_feasible(payload_builder.payload_log_score, payload, {'hom', 'gcContent'})
@@ -1,6 +1,7 @@
 import pytest
 import numpy as np
 from ..payload import payload_log_score as ls
+from ..payload import payload_prefix_state as ps
 from ..constraints import constraints as c
 from ..hyperparameters import hyperparameters as h
 
@@ -85,10 +86,13 @@ async def test_gc_empty_returns_keys_gc_max():
     keys = ['AAGC', 'GGCC']
     payload_log_score = ls.PayloadLogScore(constraints, hyperparams)
     await payload_log_score.add_keys(keys)
+
+    # Motifs between the GGCC keys are over the maximum whatever the payload, so no
+    # payload is started
+    assert payload_log_score.final_gc_count_range is None
     curPayload = ''
     gc_log_score = payload_log_score.motif_gc_content_log_score(curPayload)
-    result = get_log_score_gc_content(8, 8, minGC, maxGC, motifSize, gcHyperparam)
-    assert result == gc_log_score
+    assert gc_log_score == -np.inf
 
 @pytest.mark.asyncio
 async def test_gc_empty_returns_keys_gc_within_bounds():
@@ -208,10 +212,37 @@ async def test_gc_min_and_max():
     keys = ['GGGG', 'AAAA']
     payload_log_score = ls.PayloadLogScore(constraints, hyperparams)
     await payload_log_score.add_keys(keys)
+
+    # No payload suits both the GGGG and the AAAA motifs
+    assert payload_log_score.final_gc_count_range is None
     curPayload = 'AAAAGG'
     gc_log_score = payload_log_score.motif_gc_content_log_score(curPayload)
-    result = get_log_score_gc_content(2, 14, minGC, maxGC, motifSize, gcHyperparam)
-    assert result == gc_log_score
+    assert gc_log_score == -np.inf
+
+@pytest.mark.asyncio
+async def test_gc_lookahead_cuts_prefix_under_min():
+    constraints = get_constraints(minGC=40, maxGC=60, keySize=2, payloadSize=6)
+    hyperparams = get_hyperparameters(gcHyperparam=5)
+    payload_log_score = ls.PayloadLogScore(constraints, hyperparams)
+    await payload_log_score.add_keys(['AT', 'TA'])
+
+    # Motifs of 10 bases need 4 to 6 G or C, all from the payload
+    assert payload_log_score.final_gc_count_range == (4, 6)
+    assert payload_log_score.motif_gc_content_log_score('AAG') != -np.inf
+    assert payload_log_score.motif_gc_content_log_score('AAA') == -np.inf
+    assert payload_log_score.motif_gc_content_log_score('AGAA') == -np.inf
+
+@pytest.mark.asyncio
+async def test_gc_lookahead_cuts_prefix_over_max():
+    constraints = get_constraints(minGC=0, maxGC=50, keySize=2, payloadSize=6)
+    hyperparams = get_hyperparameters(gcHyperparam=5)
+    payload_log_score = ls.PayloadLogScore(constraints, hyperparams)
+    await payload_log_score.add_keys(['GC', 'AT'])
+
+    # With the GC key on both sides, the payload can have at most one G or C
+    assert payload_log_score.final_gc_count_range == (0, 1)
+    assert payload_log_score.motif_gc_content_log_score('AC') != -np.inf
+    assert payload_log_score.motif_gc_content_log_score('GC') == -np.inf
 
 ###### Homopolymer tests ######
 
@@ -763,3 +794,118 @@ async def test_forward_stem1_in_payload1_stem2_in_payload12_and_payload2():
     hairpinScore = payload_log_score.hairpin_log_score(curPayload)
     result = -np.inf
     assert result == hairpinScore
+
+###### Log score table tests ######
+
+def test_log_score_tables_match_formula():
+    constraints = get_constraints(maxHairpin=3, keySize=4, maxHom=2)
+    hyperparams = h.Hyperparameters({'hom': 5, 'gcContent': 7, 'similarity': 3, \
+                                     'noKeyInPayload': 6})
+    payload_log_score = ls.PayloadLogScore(constraints, hyperparams)
+    for hom_length in range(3):
+        assert payload_log_score.hom_log_scores[hom_length] == get_score(hom_length, 5, 2)
+    assert payload_log_score.calculate_hom_log_score(3) == -np.inf
+    for window_size in range(4):
+        assert payload_log_score.similarity_log_scores[window_size] == \
+               get_score(window_size, 3, 3)
+    for window_size in range(5):
+        assert payload_log_score.no_key_in_payload_log_scores[window_size] == \
+               get_score(window_size, 6, 4)
+    for motif_size in range(constraints.motif_size + 1):
+        assert payload_log_score.gc_weights[motif_size] == \
+               7**(motif_size / constraints.motif_size) - 1
+
+###### Score all bases tests ######
+
+@pytest.mark.asyncio
+async def test_score_all_bases_matches_single_base_scores():
+    keySize = 2
+    payloadSize = 6
+    maxHom = 3
+    constraints = get_constraints(keySize=keySize, payloadSize=payloadSize, maxHom=maxHom)
+    hyperparams = get_hyperparameters()
+    keys = ['AC', 'GG']
+    payloads = {'TGAATA', 'CGATCA'}
+    payload_log_score = ls.PayloadLogScore(constraints, hyperparams)
+    await payload_log_score.add_keys(keys)
+    await payload_log_score.add_payloads(payloads)
+    withConstraints = {'hom', 'gcContent', 'hairpin', 'noKeyInPayload'}
+    for curPayload in ['', 'A', 'TTC', 'AAAAA', 'GCATC']:
+        prefixState = payload_log_score.new_prefix_state(curPayload)
+        logScores = payload_log_score.score_all_bases(prefixState, withConstraints)
+        for i, b in enumerate(['A', 'T', 'C', 'G']):
+            result = payload_log_score.get_all_log_score(curPayload, b)
+            assert result == pytest.approx(logScores[i])
+
+###### Payload prefix state tests ######
+
+def test_prefix_state_push():
+    usedBases = np.zeros(6, dtype=np.uint8)
+    prefixState = ps.PayloadPrefixState(usedBases, 'AAGCC')
+    assert prefixState.payload == 'AAGCC'
+    assert prefixState.bases == ['A', 'A', 'G', 'C', 'C']
+    assert len(prefixState) == 5
+    assert prefixState.gc_count == 3
+    assert prefixState.end_hom == 2
+    assert prefixState.start_hom == 2
+    assert prefixState.similarity_window == 0
+
+def test_prefix_state_pop_restores_stats():
+    usedBases = np.zeros(6, dtype=np.uint8)
+    prefixState = ps.PayloadPrefixState(usedBases, 'GGG')
+    prefixState.push('C')
+    base = prefixState.pop()
+    assert base == 'C'
+    assert prefixState.payload == 'GGG'
+    assert prefixState.bases == ['G', 'G', 'G']
+    assert prefixState.gc_count == 3
+    assert prefixState.end_hom == 3
+    assert prefixState.start_hom == 3
+    prefixState.pop()
+    assert prefixState.start_hom == 2
+
+@pytest.mark.asyncio
+async def test_prefix_state_similarity_window():
+    payloadSize = 4
+    maxHairpin = 2
+    constraints = get_constraints(payloadSize=payloadSize, maxHairpin=maxHairpin)
+    hyperparams = get_hyperparameters()
+    payload_log_score = ls.PayloadLogScore(constraints, hyperparams)
+    await payload_log_score.add_payloads(['AAAA', 'TTTT', 'CCCC'])
+    prefixState = payload_log_score.new_prefix_state('GG')
+    assert prefixState.similarity_window == 1
+    for b in ['A', 'G']:
+        result = payload_log_score.similarity_log_score('GG' + b)
+        assert result == payload_log_score.prefix_similarity_log_score(prefixState, b)
+
+###### Remove payload tests ######
+
+@pytest.mark.asyncio
+async def test_remove_payload_restores_stats():
+    constraints = get_constraints(payloadSize=6, maxHom=3)
+    hyperparams = get_hyperparameters()
+    payload_log_score = ls.PayloadLogScore(constraints, hyperparams)
+    await payload_log_score.add_payloads(['ACGTAC', 'TTGCAA'])
+    used_bases = payload_log_score.used_bases.copy()
+    max_start_payload_hom = dict(payload_log_score.max_start_payload_hom)
+    max_end_payload_hom = dict(payload_log_score.max_end_payload_hom)
+
+    await payload_log_score.add_payload('GGGCTA')
+    assert await payload_log_score.remove_payload('GGGCTA')
+    assert payload_log_score.payloads == {'ACGTAC', 'TTGCAA'}
+    assert (payload_log_score.used_bases == used_bases).all()
+    assert payload_log_score.max_start_payload_hom == max_start_payload_hom
+    assert payload_log_score.max_end_payload_hom == max_end_payload_hom
+    assert payload_log_score.payloads_index.get_elems_with_kmer(0, 'G') == []
+
+@pytest.mark.asyncio
+async def test_remove_payload_keeps_bases_used_by_other_payloads():
+    constraints = get_constraints(payloadSize=4)
+    hyperparams = get_hyperparameters()
+    payload_log_score = ls.PayloadLogScore(constraints, hyperparams)
+    await payload_log_score.add_payloads(['ACGT', 'TCGA'])
+    assert await payload_log_score.remove_payload('TCGA')
+    assert not await payload_log_score.remove_payload('TCGA')
+    # Bit i of a position stands for nucleotides[i], A, T, C and G
+    assert list(payload_log_score.used_bases[1:]) == [4, 8, 2]
+    assert payload_log_score.payloads_index.get_elems_with_kmer(1, 'CG') == ['ACGT']
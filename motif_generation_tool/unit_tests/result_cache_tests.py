@@ -0,0 +1,44 @@
+from .. import result_cache as rc
+from ..constraints import constraints as c
+from ..hyperparameters import hyperparameters as h
+
+def get_key(seed=0, payload_size=10, with_constraints=('hom', 'hairpin'), shapes={}):
+    constraints = c.Constraints(payload_size=payload_size, payload_num=3, key_size=4, key_num=2)
+    return rc.get_cache_key(constraints, h.Hyperparameters(shapes), set(with_constraints), seed)
+
+def test_cache_key_is_normalised():
+    assert get_key() == get_key(with_constraints=('hairpin', 'hom'))
+    assert get_key(shapes={'hom': 2}) == get_key()
+    assert get_key(seed=1) != get_key()
+    assert get_key(payload_size=11) != get_key()
+    assert get_key(with_constraints=('hom',)) != get_key()
+    assert get_key(shapes={'hom': 3}) != get_key()
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = rc.LRUResultCache(max_entries=2)
+    cache.put('a', {'keys': ['A']})
+    cache.put('b', {'keys': ['T']})
+    assert cache.get('a') == {'keys': ['A']}
+    cache.put('c', {'keys': ['C']})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'keys': ['A']}
+    assert cache.get('c') == {'keys': ['C']}
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+def test_sqlite_cache_persists(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = rc.SQLiteResultCache(path)
+    cache.put('a', {'keys': ['AC'], 'payloads': ['GGT']})
+    assert rc.SQLiteResultCache(path).get('a') == {'keys': ['AC'], 'payloads': ['GGT']}
+    assert cache.get('b') is None
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+    cache = rc.SQLiteResultCache(str(tmp_path / 'cache.db'), max_entries=2)
+    cache.put('a', {'keys': ['A']})
+    cache.put('b', {'keys': ['T']})
+    cache.get('a')
+    cache.put('c', {'keys': ['C']})
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == {'keys': ['A']}
@@ -0,0 +1,65 @@
+import pytest
+from ..hyperparameters import result_store as rs
+from ..constraints import constraints as c
+
+def test_add_result_and_has_result(tmp_path):
+    store = rs.HyperparameterResultStore(str(tmp_path / 'results.sqlite'))
+    shapes = {'hom': 10, 'hairpin': 20}
+    weights = {'hom': 1}
+    assert not store.has_result(shapes, weights)
+    store.add_result(shapes, weights, 50, 40, 1.5)
+    assert store.has_result(shapes, weights)
+    assert not store.has_result({'hom': 20, 'hairpin': 20}, weights)
+
+def test_add_result_replaces_previous_result(tmp_path):
+    store = rs.HyperparameterResultStore(str(tmp_path / 'results.sqlite'))
+    shapes = {'hom': 10}
+    store.add_result(shapes, {}, 50, 40, 1.5)
+    store.add_result(shapes, {}, 50, 45, 1.5)
+    results = store.get_results()
+    assert len(results) == 1
+    assert results[0]['totalSuccesses'] == 45
+    assert results[0]['shapes']['gcContent'] == 1
+
+def test_results_persist_across_stores(tmp_path):
+    path = str(tmp_path / 'results.sqlite')
+    rs.HyperparameterResultStore(path).add_result({'hom': 10}, {}, 50, 40, 1.5)
+    store = rs.HyperparameterResultStore(path)
+    assert store.get_completed_keys() == {store.get_key({'hom': 10}, {})}
+
+def test_get_success_grid(tmp_path):
+    store = rs.HyperparameterResultStore(str(tmp_path / 'results.sqlite'))
+    store.add_result({'hom': 10, 'gcContent': 5}, {}, 50, 40, 1.5)
+    store.add_result({'hom': 10, 'gcContent': 7}, {}, 50, 30, 1.5)
+    store.add_result({'hom': 20, 'gcContent': 5}, {'hom': 2}, 50, 10, 1.5)
+    store.add_result({'hom': 20, 'gcContent': 5}, {'hom': 3}, 50, 15, 1.5)
+    rowValues, columnValues, data = store.get_success_grid('hom', 'gcContent')
+    assert rowValues == [10, 20]
+    assert columnValues == [5, 7]
+    assert data == [[40, 30], [25, 0]]
+
+def test_run_id_is_normalised():
+    constraints = c.Constraints(payload_size=10, payload_num=3, key_size=4, key_num=2)
+    run_id = rs.get_run_id(constraints, {'hom', 'hairpin'}, 50)
+    assert run_id == rs.get_run_id(constraints, {'hairpin', 'hom'}, 50)
+    assert run_id != rs.get_run_id(constraints, {'hom'}, 50)
+    assert run_id != rs.get_run_id(constraints, {'hom', 'hairpin'}, 100)
+    other_constraints = c.Constraints(payload_size=11, payload_num=3, key_size=4, key_num=2)
+    assert run_id != rs.get_run_id(other_constraints, {'hom', 'hairpin'}, 50)
+
+def test_results_are_kept_per_run(tmp_path):
+    path = str(tmp_path / 'results.sqlite')
+    store = rs.HyperparameterResultStore(path, 'run1')
+    store.add_result({'hom': 10}, {}, 50, 40, 1.5)
+
+    # A run with other constraints or number of runs resumes none of the combinations
+    otherStore = rs.HyperparameterResultStore(path, 'run2')
+    assert not otherStore.has_result({'hom': 10}, {})
+    otherStore.add_result({'hom': 10}, {}, 100, 70, 3.0)
+    assert store.get_results()[0]['totalSuccesses'] == 40
+    assert otherStore.get_results()[0]['totalSuccesses'] == 70
+
+    # Without a run id, results of all runs are read
+    rowValues, columnValues, data = rs.HyperparameterResultStore(path).get_success_grid('hom', \
+                                                                                      'hairpin')
+    assert data == [[110]]
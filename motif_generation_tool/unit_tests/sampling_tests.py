@@ -0,0 +1,26 @@
+import pytest
+import numpy as np
+from ..dna_language_specification import sampling as s
+
+def test_sample_nucleotide_never_draws_zero_weight():
+    rng = np.random.default_rng(0)
+    for _ in range(1000):
+        assert s.sample_nucleotide(rng, np.array([0, 0.3, 0, 0.7])) in ['T', 'G']
+
+def test_sample_nucleotide_single_weight():
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        assert s.sample_nucleotide(rng, [0, 0, 1e-300, 0]) == 'C'
+
+def test_sample_nucleotide_follows_weights():
+    rng = np.random.default_rng(0)
+    draws = [s.sample_nucleotide(rng, [1, 2, 3, 4]) for _ in range(20000)]
+    for nucleotide, p in zip(['A', 'T', 'C', 'G'], [0.1, 0.2, 0.3, 0.4]):
+        assert draws.count(nucleotide) / len(draws) == pytest.approx(p, abs=0.02)
+
+def test_sample_nucleotide_same_seed_same_draws():
+    p = [0.1, 0.2, 0.3, 0.4]
+    rng1 = np.random.default_rng(42)
+    rng2 = np.random.default_rng(42)
+    assert [s.sample_nucleotide(rng1, p) for _ in range(50)] == \
+           [s.sample_nucleotide(rng2, p) for _ in range(50)]
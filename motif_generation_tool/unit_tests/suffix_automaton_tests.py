@@ -0,0 +1,69 @@
+import pytest
+import numpy as np
+from ..constraints import suffix_automaton as sa
+from ..payload import payload_log_score as ls
+from ..payload import payload_prefix_state as ps
+from ..constraints import constraints as c
+from ..hyperparameters import hyperparameters as h
+
+def random_seq(rng, size):
+    return ''.join(rng.choice(['A', 'T', 'C', 'G'], size=size))
+
+def longest_suffix_in_elems(seq, elems):
+    for length in range(len(seq), 0, -1):
+        if any([seq[len(seq) - length:] in elem for elem in elems]):
+            return length
+    return 0
+
+def test_longest_suffix_match():
+    automaton = sa.SuffixAutomaton(['ACGT', 'GGA'])
+    assert automaton.longest_suffix_match('') == 0
+    assert automaton.longest_suffix_match('TTACG') == 3
+    assert automaton.longest_suffix_match('ACGTT') == 1
+    assert automaton.longest_suffix_match('CGGA') == 3
+    assert automaton.longest_suffix_match('GGAC') == 2
+    assert sa.SuffixAutomaton().longest_suffix_match('ACGT') == 0
+
+def test_longest_suffix_match_against_substring_search():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        elem_size = int(rng.integers(1, 8))
+        elems = [random_seq(rng, elem_size) for _ in range(int(rng.integers(1, 6)))]
+        automaton = sa.SuffixAutomaton(elems)
+        seq = random_seq(rng, int(rng.integers(0, 16)))
+        for end in range(len(seq) + 1):
+            assert automaton.longest_suffix_match(seq[:end]) == \
+                   longest_suffix_in_elems(seq[:end], elems)
+
+def test_automaton_size_is_linear():
+    rng = np.random.default_rng(1)
+    elems = [random_seq(rng, 20) for _ in range(8)]
+    assert len(sa.SuffixAutomaton(elems)) < 2 * 20 * 8
+
+def test_prefix_state_tracks_key_matches():
+    automaton = sa.SuffixAutomaton(['ACGT'])
+    prefix_state = ps.PayloadPrefixState(np.zeros(6, dtype=np.uint8), 'TAC', automaton)
+    assert prefix_state.key_match_length('G') == 3
+    assert prefix_state.key_match_length('A') == 1
+    prefix_state.push('G')
+    assert prefix_state.key_match_length('T') == 4
+    prefix_state.pop()
+    prefix_state.pop()
+    assert prefix_state.key_match_length('C') == 2
+
+@pytest.mark.asyncio
+async def test_no_key_in_payload_log_score_with_prefix_state():
+    constraints = c.Constraints(payload_size=10, payload_num=2, max_hom=3, max_hairpin=2, \
+                                key_size=5, key_num=2)
+    payload_log_score = ls.PayloadLogScore(constraints, h.Hyperparameters({'noKeyInPayload': 4}))
+    await payload_log_score.add_keys(['ACGTA', 'GGCAT'])
+    rng = np.random.default_rng(2)
+    for _ in range(20):
+        payload = random_seq(rng, 9)
+        prefix_state = payload_log_score.new_prefix_state(payload)
+        for base in ['A', 'T', 'C', 'G']:
+            window_size = max(longest_suffix_in_elems(payload + base, ['ACGTA', 'GGCAT']) - 1, 0)
+            log_score = - 4**(window_size / 5) + 1
+            assert payload_log_score.no_key_in_payload_log_score(payload + base) == log_score
+            assert payload_log_score.prefix_no_key_in_payload_log_score(prefix_state, base) == \
+                   log_score
@@ -0,0 +1,167 @@
+from concurrent.futures import ProcessPoolExecutor
+import analyse_input
+import collections
+import json
+import secrets
+import threading
+
+
+# Constraints fields which only matter when their constraint is selected
+constraint_fields = {'hom': ['max_hom'],
+                     'hairpin': ['max_hairpin', 'loop_size_min', 'loop_size_max'],
+                     'gcContent': ['min_gc', 'max_gc']
+                     }
+
+
+def get_preset_key(constraints, with_constraints):
+    # Form values are ints or floats depending on where they come from, and the fields of
+    # unselected constraints take different defaults in the form and in the specs
+    constraints = analyse_input.get_constraints(constraints)
+    if not constraints:
+        return None
+    ignored = [field for constraint in constraint_fields if constraint not in with_constraints \
+               for field in constraint_fields[constraint]]
+    return json.dumps({'constraints': {k: float(v) for k, v in vars(constraints).items() \
+                                       if k not in ignored},
+                       'withConstraints': sorted(with_constraints)
+                       }, sort_keys=True)
+
+
+class PresetPool:
+    def __init__(self, presets, pool_size=4, workers=1, max_failures=20, max_served=64):
+        self.pool_size = pool_size
+        self.workers = workers
+        self.max_failures = max_failures
+        self.max_served = max_served
+
+        # Preset key -> constraints and constraints to conform to of the preset
+        self.presets = {}
+        for constraints, with_constraints in presets:
+            key = get_preset_key(constraints, with_constraints)
+            if key is not None:
+                self.presets[key] = (constraints, set(with_constraints))
+
+        # For each preset, the ready motif sets, the generations running and the number of
+        # failed generations in a row
+        self.ready = {key: collections.deque() for key in self.presets}
+        self.running = {key: 0 for key in self.presets}
+        self.failures = {key: 0 for key in self.presets}
+
+        # Seed -> preset key and motif set of the most recently served sets, oldest first, so
+        # that downloads send the set which was served instead of generating it again
+        self.served = collections.OrderedDict()
+
+        # The pool is only started by the first request, like the job queue's
+        self.executor = None
+
+        # Reentrant, a generation finishing straight away calls back into fill
+        self.lock = threading.RLock()
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    ### Take Motif Sets ###
+
+    def take(self, constraints, with_constraints):
+        """This function returns a ready motif set for the preset matching `constraints`
+        and `with_constraints`, and generates another one in the background to replace it.
+        The first call starts filling the pools of all presets.
+
+        Parameters
+        ----------
+        constraints: dict
+            Constraints, in the format of the website form.
+        with_constraints: set of str
+            Constraints the keys and payloads have to conform to.
+
+        Returns
+        ----------
+        motif_set: dict or None
+            Motif set in the format of `analyse_input.generate_motif_set`, with the 'seed'
+            it was generated from. None if no preset matches, or none of its motif sets
+            is ready yet.
+        """
+        key = get_preset_key(constraints, with_constraints)
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+                for other_key in self.presets:
+                    self.fill(other_key)
+            if key not in self.presets:
+                return None
+            motif_set = self.ready[key].popleft() if self.ready[key] else None
+            if motif_set is not None:
+                self.served[motif_set['seed']] = (key, motif_set)
+                while len(self.served) > self.max_served:
+                    self.served.popitem(last=False)
+
+            # Demand for the preset gives it another chance if its generations kept failing
+            self.failures[key] = 0
+            self.fill(key)
+        return motif_set
+
+    def get_served(self, constraints, with_constraints, seed):
+        """This function returns the motif set served by `take` for `constraints` and
+        `with_constraints` with the seed `seed`, if it is still kept.
+
+        Parameters
+        ----------
+        constraints: dict
+            Constraints, in the format of the website form.
+        with_constraints: set of str
+            Constraints the keys and payloads have to conform to.
+        seed: int
+            Seed of the served motif set.
+
+        Returns
+        ----------
+        motif_set: dict or None
+            Motif set, as returned by `take`. None if no such set was served, or it is no
+            longer kept.
+        """
+        with self.lock:
+            served = self.served.get(seed)
+        if served is None or served[0] != get_preset_key(constraints, with_constraints):
+            return None
+        return served[1]
+
+    def get_ready_counts(self):
+        with self.lock:
+            return [{'constraints': self.presets[key][0],
+                     'withConstraints': sorted(self.presets[key][1]),
+                     'ready': len(self.ready[key]),
+                     'running': self.running[key]
+                     } for key in self.presets]
+
+    ### Fill Pools ###
+
+    def fill(self, key):
+        # Called with the lock held
+        if self.executor is None:
+            return
+        constraints, with_constraints = self.presets[key]
+        while len(self.ready[key]) + self.running[key] < self.pool_size and \
+              self.failures[key] < self.max_failures:
+            seed = secrets.randbits(32)
+            future = self.executor.submit(analyse_input.generate_motif_set_task, constraints, \
+                                          with_constraints, seed, \
+                                          analyse_input.generation_stats is not None)
+            self.running[key] += 1
+            future.add_done_callback(lambda future, seed=seed: self.add(key, seed, future))
+
+    def add(self, key, seed, future):
+        with self.lock:
+            self.running[key] -= 1
+            motif_set = None
+            if not future.cancelled() and future.exception() is None:
+                # Failed generations have statistics too
+                motif_set = analyse_input.collect_result(future.result())
+            if motif_set is None or not motif_set['isValid']:
+                self.failures[key] += 1
+            else:
+                self.failures[key] = 0
+                self.ready[key].append(dict(motif_set, seed=seed))
+            self.fill(key)
@@ -0,0 +1,77 @@
+import pytest
+from .. import analyse_input as ai
+from motif_generation_tool.result_cache import LRUResultCache, SQLiteResultCache
+
+constraints = {'payloadSize': 5, 'payloadNum': 2, 'keySize': 2, 'keyNum': 2, \
+               'maxHomopolymer': 3}
+
+@pytest.fixture
+def result_cache(monkeypatch):
+    result_cache = LRUResultCache(8)
+    monkeypatch.setattr(ai, 'result_cache', result_cache)
+    return result_cache
+
+def fail_to_build(monkeypatch):
+    # Any generation from now on has to come from the cache
+    async def build_keys_and_payloads(self, with_constraints):
+        raise AssertionError('generated instead of cached')
+    monkeypatch.setattr(ai.KeyPayloadBuilder, 'build_keys_and_payloads', build_keys_and_payloads)
+
+###### Result Cache ######
+
+@pytest.mark.asyncio
+async def test_seeded_generation_is_stored_and_looked_up(result_cache, monkeypatch):
+    _, keys, payloads = await ai.build_keys_and_payloads(constraints, {'hom'}, seed=3)
+    assert keys and payloads
+    cache_key = ai.get_result_cache_key(constraints, {'hom'}, 3)
+    assert result_cache.get(cache_key) == {'keys': list(keys), 'payloads': sorted(payloads)}
+
+    fail_to_build(monkeypatch)
+    _, cached_keys, cached_payloads = await ai.build_keys_and_payloads(constraints, {'hom'}, \
+                                                                       seed=3)
+    assert cached_keys == list(keys)
+    assert cached_payloads == set(payloads)
+    assert result_cache.hits == 2
+
+@pytest.mark.asyncio
+async def test_unseeded_generation_is_not_cached(result_cache):
+    await ai.build_keys_and_payloads(constraints, {'hom'})
+    assert len(result_cache) == 0
+    assert ai.get_result_cache_key(constraints, {'hom'}, None) is None
+
+@pytest.mark.asyncio
+async def test_cached_failure(result_cache, monkeypatch):
+    result_cache.put(ai.get_result_cache_key(constraints, {'hom'}, 3), \
+                     {'keys': [], 'payloads': []})
+    fail_to_build(monkeypatch)
+    _, keys, payloads = await ai.build_keys_and_payloads(constraints, {'hom'}, seed=3)
+    assert keys is False
+    assert payloads is False
+    motif_set = await ai.generate_motif_set(constraints, {'hom'}, seed=3)
+    assert motif_set == {'keys': [], 'payloads': [], 'motifs': [], 'isValid': False}
+
+def test_worker_result_is_cached_by_the_server(result_cache, monkeypatch):
+    # The worker leaves a cache of its own process to the server
+    motif_set = ai.generate_motif_set_task(constraints, {'hom'}, 3)
+    assert len(result_cache) == 0
+    cache_key = motif_set['cacheKey']
+    assert cache_key == ai.get_result_cache_key(constraints, {'hom'}, 3)
+
+    motif_set = ai.collect_result(motif_set)
+    assert 'cacheKey' not in motif_set
+    assert result_cache.get(cache_key) == {'keys': motif_set['keys'], \
+                                           'payloads': motif_set['payloads']}
+
+    # Generations of the server then find it
+    fail_to_build(monkeypatch)
+    assert ai.asyncio.run(ai.generate_motif_set(constraints, {'hom'}, 3)) == motif_set
+
+def test_worker_uses_shared_cache(tmp_path, monkeypatch):
+    result_cache = SQLiteResultCache(str(tmp_path / 'cache.sqlite'))
+    monkeypatch.setattr(ai, 'result_cache', result_cache)
+    motif_set = ai.generate_motif_set_task(constraints, {'hom'}, 3)
+    assert 'cacheKey' not in motif_set
+    assert len(result_cache) == 1
+
+    fail_to_build(monkeypatch)
+    assert ai.collect_result(ai.generate_motif_set_task(constraints, {'hom'}, 3)) == motif_set
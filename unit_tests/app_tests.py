@@ -0,0 +1,237 @@
+import pytest
+import gzip
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .. import app as ap
+
+spec = {'payloadSize': 5, 'payloadNum': 2, 'keySize': 2, 'keyNum': 2, 'maxHomopolymer': 3, \
+        'withConstraints': ['hom'], 'seed': 1}
+
+def get_job_queue(task, max_queued=1):
+    # Jobs run on a thread, so that tests can hold them with events
+    job_queue = ap.JobQueue(task, 1, max_queued, on_result=ap.analyse_input.collect_result)
+    job_queue.executor = ThreadPoolExecutor(max_workers=1)
+    return job_queue
+
+@pytest.fixture
+def client():
+    return ap.app.test_client()
+
+@pytest.fixture
+def job_queue(monkeypatch):
+    job_queue = get_job_queue(ap.analyse_input.generate_motif_set_task)
+    monkeypatch.setattr(ap, 'job_queue', job_queue)
+    yield job_queue
+    job_queue.shutdown()
+
+def read_events(response):
+    # (event, data) of every server-sent event
+    events = []
+    for message in response.get_data(as_text=True).split('\n\n'):
+        if message:
+            event, data = message.split('\n')
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+###### Specs ######
+
+def test_read_spec_defaults():
+    form, constraints, seed = ap.read_spec({'payloadSize': 6})
+    assert form['payloadSize'] == 6
+    assert form['keySize'] == ap.default_form['keySize']
+    assert constraints == {'hom', 'hairpin', 'gcContent'}
+    assert seed is None
+
+@pytest.mark.parametrize('bad_spec', [[1], {'payloadSize': 'a'}, {'payloadSize': True}, \
+                                      {'withConstraints': 5}, {'withConstraints': 'hom'}, \
+                                      {'withConstraints': ['hom', 1]}, \
+                                      {'withConstraints': ['similarity']}, {'seed': -1}, \
+                                      {'payloadSize': 0}])
+def test_read_spec_rejects_malformed_specs(bad_spec):
+    with pytest.raises(ValueError):
+        ap.read_spec(bad_spec)
+
+@pytest.mark.parametrize('with_constraints', [5, 'hom', {'hom': True}])
+def test_submit_job_rejects_constraints_which_are_not_a_list(client, job_queue, \
+                                                              with_constraints):
+    response = client.post('/api/jobs', json=dict(spec, withConstraints=with_constraints))
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'withConstraints must be a list of strings'}
+
+###### Jobs ######
+
+def test_job_runs_to_result(client, job_queue):
+    response = client.post('/api/jobs', json=spec)
+    assert response.status_code == 202
+    job_id = response.get_json()['id']
+    assert response.headers['Location'] == '/api/jobs/' + job_id
+
+    response = client.get('/api/jobs/' + job_id + '/events')
+    assert response.mimetype == 'text/event-stream'
+    events = read_events(response)
+    assert events[-1][0] == 'done'
+    assert events[-1][1]['id'] == job_id
+
+    assert client.get('/api/jobs/' + job_id).get_json()['status'] == 'done'
+    result = client.get('/api/jobs/' + job_id + '/result').get_json()
+    assert result['isValid']
+    assert len(result['keys']) == 2
+    assert len(result['payloads']) == 2
+    assert len(result['motifs']) == 8
+
+def test_unknown_job(client, job_queue):
+    for path in ['', '/events', '/result']:
+        response = client.get('/api/jobs/unknown' + path)
+        assert response.status_code == 404
+        assert response.get_json() == {'error': 'Unknown job'}
+
+def test_full_queue_and_pending_result(client, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+    def task(*args):
+        started.set()
+        release.wait(5)
+        return {'keys': [], 'payloads': [], 'motifs': [], 'isValid': False}
+    job_queue = get_job_queue(task)
+    monkeypatch.setattr(ap, 'job_queue', job_queue)
+
+    running_id = client.post('/api/jobs', json=spec).get_json()['id']
+    started.wait(5)
+    queued_id = client.post('/api/jobs', json=spec).get_json()['id']
+    response = client.post('/api/jobs', json=spec)
+    assert response.status_code == 503
+    assert 'error' in response.get_json()
+
+    # A pending job has no result yet
+    response = client.get('/api/jobs/' + queued_id + '/result')
+    assert response.status_code == 202
+    assert response.get_json()['status'] == 'queued'
+    assert response.get_json()['position'] == 0
+
+    release.set()
+    assert read_events(client.get('/api/jobs/' + queued_id + '/events'))[-1][0] == 'done'
+    assert client.get('/api/jobs/' + running_id + '/result').status_code == 200
+    job_queue.shutdown()
+
+def test_failed_job_result(client, monkeypatch):
+    def task(*args):
+        raise RuntimeError('worker died')
+    job_queue = get_job_queue(task)
+    monkeypatch.setattr(ap, 'job_queue', job_queue)
+
+    job_id = client.post('/api/jobs', json=spec).get_json()['id']
+    assert read_events(client.get('/api/jobs/' + job_id + '/events'))[-1][0] == 'failed'
+    response = client.get('/api/jobs/' + job_id + '/result')
+    assert response.status_code == 500
+    assert 'worker died' in response.get_json()['error']
+    job_queue.shutdown()
+
+###### Presets ######
+
+def test_download_sends_the_served_preset(client, monkeypatch):
+    # The served set is not what a generation from its seed would build
+    def task(constraints, with_constraints, seed, record_stats):
+        return {'keys': ['AC'], 'payloads': ['GATTC'], 'motifs': ['ACGATTCAC'], 'isValid': True}
+    monkeypatch.setattr(ap.analyse_input, 'generate_motif_set_task', task)
+    preset_pool = ap.PresetPool([ap.read_spec(dict(spec, withConstraints=['hom']))[:2]], \
+                                pool_size=1)
+    preset_pool.executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(ap, 'preset_pool', preset_pool)
+
+    form = {'payloadSize': 5, 'payloadNum': 2, 'keySize': 2, 'keyNum': 2, 'maxHomopolymer': 3, \
+            'homVisible': 'True', 'hairpinVisible': 'False', 'gcVisible': 'False'}
+    with preset_pool.lock:
+        preset_pool.fill(list(preset_pool.presets)[0])
+    preset_pool.executor.shutdown()
+    assert preset_pool.get_ready_counts()[0]['ready'] == 1
+    preset_pool.executor = ThreadPoolExecutor(max_workers=1)
+
+    page = client.post('/', data=dict(form, analyseSeqSubmission='')).get_data(as_text=True)
+    assert 'ACGATTCAC' in page
+    seed = re.search('name="seed" value="([0-9]+)"', page).group(1)
+
+    response = client.post('/download/fasta', data=dict(form, seed=seed))
+    assert response.get_data(as_text=True) == '>motif_1\nACGATTCAC\n'
+
+    # Any other seed is generated again
+    response = client.post('/download/fasta', data=dict(form, seed=int(seed) + 1))
+    assert 'ACGATTCAC' not in response.get_data(as_text=True)
+    preset_pool.shutdown()
+
+###### Batches ######
+
+def get_batch():
+    return [dict(spec, seed=seed) for seed in range(4)]
+
+def test_generate_batch_as_json(client, job_queue):
+    response = client.post('/api/generate', json={'specs': get_batch()})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['index'] for result in results] == [0, 1, 2, 3]
+    assert all([result['isValid'] for result in results])
+
+    # Every result is the generation of its spec
+    for i in range(len(results)):
+        expected = ap.analyse_input.collect_result(
+            ap.analyse_input.generate_motif_set_task(*ap.read_spec(get_batch()[i])))
+        assert dict(results[i], index=None) == dict(expected, index=None)
+
+    # The batch took its jobs back from the queue
+    assert job_queue.jobs == {}
+
+def test_generate_batch_as_ndjson(client, job_queue):
+    response = client.post('/api/generate?format=ndjson', json=get_batch())
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert sorted([json.loads(line)['index'] for line in lines]) == [0, 1, 2, 3]
+
+    response = client.post('/api/generate', json=get_batch(), \
+                           headers={'Accept': 'application/x-ndjson', \
+                                    'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    gzip_lines = gzip.decompress(response.get_data()).decode().splitlines()
+    assert sorted(gzip_lines) == sorted(lines)
+
+def test_generate_batch_rejects_malformed_batches(client, job_queue, monkeypatch):
+    assert client.post('/api/generate', json=[]).status_code == 400
+    assert client.post('/api/generate', json={'specs': 5}).status_code == 400
+    response = client.post('/api/generate', json=[spec, dict(spec, withConstraints=5)])
+    assert response.status_code == 400
+    assert response.get_json()['index'] == 1
+
+    monkeypatch.setattr(ap, 'max_batch_size', 2)
+    assert client.post('/api/generate', json=get_batch()).status_code == 413
+
+def test_generate_batch_when_queue_is_full(client, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+    def task(*args):
+        started.set()
+        release.wait(5)
+        return {'keys': [], 'payloads': [], 'motifs': [], 'isValid': False}
+    job_queue = get_job_queue(task)
+    monkeypatch.setattr(ap, 'job_queue', job_queue)
+
+    client.post('/api/jobs', json=spec)
+    started.wait(5)
+    client.post('/api/jobs', json=spec)
+    response = client.post('/api/generate', json=get_batch())
+    assert response.status_code == 503
+    assert 'error' in response.get_json()
+    release.set()
+    job_queue.shutdown()
+
+def test_failed_generation_in_batch(client, monkeypatch):
+    def task(constraints, with_constraints, seed, record_stats):
+        if seed == 2:
+            raise RuntimeError('worker died')
+        return {'keys': ['AC'], 'payloads': [], 'motifs': [], 'isValid': True}
+    job_queue = get_job_queue(task)
+    monkeypatch.setattr(ap, 'job_queue', job_queue)
+
+    results = client.post('/api/generate', json=get_batch()).get_json()['results']
+    assert [result['isValid'] for result in results] == [True, True, False, True]
+    assert 'worker died' in results[2]['error']
+    job_queue.shutdown()
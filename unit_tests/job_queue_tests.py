@@ -0,0 +1,154 @@
+import pytest
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .. import job_queue as jq
+
+def get_job_queue(task, max_queued=1, max_finished=4, on_result=None):
+    # Jobs run on a thread, so that tests can hold them with events
+    job_queue = jq.JobQueue(task, 1, max_queued, max_finished, on_result)
+    job_queue.executor = ThreadPoolExecutor(max_workers=1)
+    return job_queue
+
+def get_blocking_task():
+    started = threading.Event()
+    release = threading.Event()
+    def task(*args):
+        started.set()
+        release.wait(5)
+        return 'done'
+    return task, started, release
+
+def wait(job_queue, job_id):
+    # Last status of the job
+    return list(job_queue.iter_info(job_id, interval=0.05))[-1]
+
+def test_submit_raises_when_queue_is_full():
+    task, started, release = get_blocking_task()
+    job_queue = get_job_queue(task)
+    running_id = job_queue.submit()
+    started.wait(5)
+    queued_id = job_queue.submit()
+    with pytest.raises(jq.QueueFullError):
+        job_queue.submit()
+    assert job_queue.get_info(running_id)['status'] == 'running'
+    assert job_queue.get_info(queued_id)['status'] == 'queued'
+    assert job_queue.get_info(queued_id)['position'] == 0
+    assert job_queue.counts()['queued'] == 1
+
+    # Finished jobs give their places back
+    release.set()
+    assert wait(job_queue, running_id)['status'] == 'done'
+    assert wait(job_queue, queued_id)['status'] == 'done'
+    assert wait(job_queue, job_queue.submit())['status'] == 'done'
+    job_queue.shutdown()
+
+def test_finished_jobs_are_evicted_oldest_first():
+    job_queue = get_job_queue(lambda x: x * 2, max_finished=2, on_result=lambda result: result + 1)
+    job_ids = []
+    for x in range(3):
+        job_ids.append(job_queue.submit(x))
+        assert wait(job_queue, job_ids[-1])['status'] == 'done'
+    assert job_queue.get_info(job_ids[0]) is None
+    assert job_queue.get_result(job_ids[0]) is None
+    assert [job_queue.get_result(job_id) for job_id in job_ids[1:]] == [3, 5]
+    assert job_queue.counts() == {'queued': 0, 'running': 0, 'done': 2, 'failed': 0}
+    job_queue.shutdown()
+
+def test_failed_job_reports_error():
+    def task():
+        raise ValueError('no motifs')
+    job_queue = get_job_queue(task)
+    job_id = job_queue.submit()
+    info = wait(job_queue, job_id)
+    assert info['status'] == 'failed'
+    assert 'no motifs' in info['error']
+    assert job_queue.get_result(job_id) is None
+    job_queue.shutdown()
+
+def test_shutdown_cancels_queued_jobs():
+    task, started, release = get_blocking_task()
+    job_queue = get_job_queue(task)
+    running_id = job_queue.submit()
+    started.wait(5)
+    queued_id = job_queue.submit()
+
+    # Shutting down waits for the running job
+    shutdown = threading.Thread(target=job_queue.shutdown)
+    shutdown.start()
+    release.set()
+    shutdown.join(5)
+    assert job_queue.get_info(running_id)['status'] == 'done'
+    assert job_queue.get_info(queued_id)['status'] == 'failed'
+    assert job_queue.get_info(queued_id)['error'] == 'cancelled'
+
+def test_iter_info_yields_status_changes():
+    task, started, release = get_blocking_task()
+    job_queue = get_job_queue(task)
+    job_id = job_queue.submit()
+    statuses = []
+    for info in job_queue.iter_info(job_id, interval=0.05):
+        statuses.append(info['status'])
+        if info['status'] == 'running':
+            release.set()
+    assert statuses in [['running', 'done'], ['queued', 'running', 'done']]
+    assert list(job_queue.iter_info('unknown')) == [None]
+    job_queue.shutdown()
+
+###### Batches ######
+
+def test_batch_is_submitted_as_places_free_up():
+    job_queue = None
+    max_pending = []
+    def task(x):
+        counts = job_queue.counts()
+        max_pending.append(counts['queued'] + counts['running'])
+        if x == 3:
+            raise ValueError('bad spec')
+        return x * 2
+    job_queue = get_job_queue(task, max_queued=1, on_result=lambda result: result + 1)
+    results = sorted(job_queue.submit_batch([(x,) for x in range(6)], interval=0.05))
+    assert results[:3] == [(0, 1, None), (1, 3, None), (2, 5, None)]
+    assert results[3][:2] == (3, None)
+    assert 'bad spec' in results[3][2]
+    assert results[4:] == [(4, 9, None), (5, 11, None)]
+    assert max(max_pending) <= 2
+
+    # The batch takes its jobs back
+    assert job_queue.jobs == {}
+    job_queue.shutdown()
+
+def test_batch_raises_when_queue_is_full():
+    task, started, release = get_blocking_task()
+    job_queue = get_job_queue(task)
+    job_queue.submit()
+    started.wait(5)
+    job_queue.submit()
+    with pytest.raises(jq.QueueFullError):
+        job_queue.submit_batch([(), ()])
+    release.set()
+    job_queue.shutdown()
+
+def test_closed_batch_cancels_queued_calls():
+    started = threading.Event()
+    release = threading.Event()
+    def task(x):
+        if x > 0:
+            started.set()
+            release.wait(5)
+        return x
+    job_queue = get_job_queue(task, max_queued=2)
+
+    # Nothing is submitted before the results are iterated
+    job_queue.submit_batch([(x,) for x in range(5)]).close()
+    assert job_queue.jobs == {}
+
+    results = job_queue.submit_batch([(x,) for x in range(5)], interval=0.05)
+    assert next(results) == (0, 0, None)
+    started.wait(5)
+    results.close()
+    assert job_queue.counts() == {'queued': 0, 'running': 1, 'done': 0, 'failed': 2}
+
+    # The running call is left to finish as an ordinary job
+    release.set()
+    job_queue.shutdown()
+    assert job_queue.counts() == {'queued': 0, 'running': 0, 'done': 1, 'failed': 2}
@@ -0,0 +1,131 @@
+import pytest
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from .. import preset_pool as pp
+
+preset = {'payloadSize': 5, 'payloadNum': 2, 'keySize': 2, 'keyNum': 2, 'maxHomopolymer': 3, \
+          'maxHairpin': 1, 'loopMin': 6, 'loopMax': 7, 'gcContentMinPercentage': 25, \
+          'gcContentMaxPercentage': 65}
+other_preset = dict(preset, payloadNum=3)
+
+def get_motif_set(seed):
+    return {'keys': ['AC', 'GT'], 'payloads': [], 'motifs': [str(seed)], 'isValid': True}
+
+def get_preset_pool(monkeypatch, task, presets, **kwargs):
+    # Generations run on threads, so that tests can hold them with events
+    monkeypatch.setattr(pp, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(pp.analyse_input, 'generate_motif_set_task', task)
+    return pp.PresetPool(presets, **kwargs)
+
+def wait_until(condition):
+    deadline = time.time() + 5
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+def get_key(constraints, with_constraints):
+    return pp.get_preset_key(constraints, with_constraints)
+
+###### Preset Keys ######
+
+def test_preset_key_ignores_fields_of_unselected_constraints():
+    assert get_key(preset, {'hom'}) == get_key(dict(preset, maxHairpin=3, loopMin=1, \
+                                                    gcContentMinPercentage=10.0), {'hom'})
+    assert get_key(preset, {'hom'}) != get_key(dict(preset, maxHomopolymer=2), {'hom'})
+    assert get_key(preset, set()) == get_key(dict(preset, maxHomopolymer=1), set())
+    assert get_key(preset, {'gcContent'}) != \
+           get_key(dict(preset, gcContentMinPercentage=10), {'gcContent'})
+    assert get_key(preset, {'hom'}) != get_key(preset, {'hom', 'hairpin'})
+    assert get_key(dict(preset, payloadSize=0), {'hom'}) is None
+
+###### Take Motif Sets ######
+
+def test_take_fills_the_pools(monkeypatch):
+    release = threading.Event()
+    def task(constraints, with_constraints, seed, record_stats):
+        release.wait(5)
+        return get_motif_set(seed)
+    presets = [(preset, ['hom']), (other_preset, ['hom'])]
+    preset_pool = get_preset_pool(monkeypatch, task, presets, pool_size=2, workers=2)
+
+    # The first request starts filling every pool
+    assert preset_pool.take(preset, {'hom'}) is None
+    assert [count['running'] for count in preset_pool.get_ready_counts()] == [2, 2]
+    release.set()
+    wait_until(lambda: [count['ready'] for count in preset_pool.get_ready_counts()] == [2, 2])
+
+    # A ready set is served with its seed, and another one generated to replace it
+    motif_set = preset_pool.take(dict(preset, maxHairpin=4), {'hom'})
+    assert motif_set['motifs'] == [str(motif_set['seed'])]
+    wait_until(lambda: preset_pool.get_ready_counts()[0]['ready'] == 2)
+    assert preset_pool.take(preset, {'hairpin'}) is None
+    preset_pool.shutdown()
+
+def test_failing_preset_backs_off(monkeypatch):
+    calls = []
+    def task(constraints, with_constraints, seed, record_stats):
+        calls.append(seed)
+        return {'keys': [], 'payloads': [], 'motifs': [], 'isValid': False}
+    preset_pool = get_preset_pool(monkeypatch, task, [(preset, ['hom'])], pool_size=2, \
+                                  max_failures=3)
+
+    assert preset_pool.take(preset, {'hom'}) is None
+    wait_until(lambda: preset_pool.get_ready_counts()[0]['running'] == 0)
+    key = get_key(preset, {'hom'})
+    assert preset_pool.failures[key] >= 3
+    assert preset_pool.get_ready_counts()[0]['ready'] == 0
+
+    # No generation is started once the preset failed too often
+    with preset_pool.lock:
+        preset_pool.fill(key)
+    assert preset_pool.get_ready_counts()[0]['running'] == 0
+
+    # Demand for the preset gives it another chance
+    failed_calls = len(calls)
+    assert preset_pool.take(preset, {'hom'}) is None
+    wait_until(lambda: preset_pool.get_ready_counts()[0]['running'] == 0)
+    assert len(calls) > failed_calls
+    preset_pool.shutdown()
+
+def test_add_cancelled_or_failed_generation():
+    # Without a pool, add leaves the preset to be filled by the next request
+    preset_pool = pp.PresetPool([(preset, ['hom'])], max_failures=5)
+    key = get_key(preset, {'hom'})
+
+    cancelled = Future()
+    cancelled.cancel()
+    failed = Future()
+    failed.set_exception(RuntimeError('worker died'))
+    done = Future()
+    done.set_result(get_motif_set(7))
+    preset_pool.running[key] = 3
+
+    preset_pool.add(key, 5, cancelled)
+    preset_pool.add(key, 6, failed)
+    assert preset_pool.failures[key] == 2
+    assert preset_pool.get_ready_counts()[0]['ready'] == 0
+
+    preset_pool.add(key, 7, done)
+    assert preset_pool.failures[key] == 0
+    assert preset_pool.running[key] == 0
+    assert list(preset_pool.ready[key]) == [dict(get_motif_set(7), seed=7)]
+
+###### Served Motif Sets ######
+
+def test_served_sets_are_kept(monkeypatch):
+    preset_pool = get_preset_pool(monkeypatch, lambda *args: get_motif_set(args[2]), \
+                                  [(preset, ['hom'])], pool_size=3, max_served=2)
+    preset_pool.take(preset, {'hom'})
+    wait_until(lambda: preset_pool.get_ready_counts()[0]['ready'] == 3)
+
+    served = [preset_pool.take(preset, {'hom'}) for _ in range(3)]
+    assert preset_pool.get_served(preset, {'hom'}, served[2]['seed']) is served[2]
+    assert preset_pool.get_served(dict(preset, loopMin=1), {'hom'}, served[1]['seed']) \
+           is served[1]
+
+    # Only the most recent sets are kept, and only for their own preset
+    assert preset_pool.get_served(preset, {'hom'}, served[0]['seed']) is None
+    assert preset_pool.get_served(other_preset, {'hom'}, served[2]['seed']) is None
+    assert preset_pool.get_served(preset, {'hom', 'gcContent'}, served[2]['seed']) is None
+    preset_pool.shutdown()